@@ -0,0 +1,193 @@
+"""
+Benchmark de backends de predicción: latencia, throughput y error.
+
+Uso:
+    python benchmark_predictores.py [--csv datos_sudi_limpio.csv]
+        [--consultas 100000] [--repeticiones 500] [--max-loo 150]
+        [--objetivo-mae 2.0] [--json]
+
+Para cada backend registrado en services.predictores reporta:
+- ajuste_ms: tiempo de construcción/ajuste sobre el dataset completo
+- latencia_us: mediana por consulta individual (escalar)
+- throughput_qps: consultas por segundo en un lote vectorizado
+- loo_mae / loo_rmse: error leave-one-out (reajustando sin cada fila)
+- holdout_grilla_mae: error al ajustar sobre el sub-lattice de índices
+  pares y evaluar en los nodos restantes (solo datasets en grilla)
+
+Los backends que requieren lattice no admiten leave-one-out (quitar un
+nodo rompe la grilla); para ellos solo se reporta el holdout de grilla.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.dataset import DatasetSnapshot, cargar_snapshot_csv
+from services.predictores import PREDICTORES
+
+
+def _subconjunto(ds: DatasetSnapshot, mascara: np.ndarray) -> DatasetSnapshot:
+    return DatasetSnapshot.from_arrays(
+        ds.csv_path, ds.area_vidrio[mascara], ds.tv[mascara], ds.yhat[mascara]
+    )
+
+
+def _latencia_us(predictor, consultas: np.ndarray, repeticiones: int) -> float:
+    tiempos = []
+    for area, tv in consultas[:repeticiones]:
+        t0 = time.perf_counter()
+        predictor.predecir(area, tv)
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos) * 1e6
+
+
+def _throughput_qps(predictor, consultas: np.ndarray) -> float:
+    t0 = time.perf_counter()
+    predictor.predecir(consultas[:, 0], consultas[:, 1])
+    return consultas.shape[0] / (time.perf_counter() - t0)
+
+
+def _leave_one_out(cls, ds: DatasetSnapshot, filas: np.ndarray) -> Optional[Dict[str, float]]:
+    errores = []
+    for i in filas:
+        mascara = np.ones(len(ds), dtype=bool)
+        mascara[i] = False
+        sub = _subconjunto(ds, mascara)
+        if not cls.soporta(sub):
+            return None
+        pred = cls(sub).predict(ds.area_vidrio[i], ds.tv[i])
+        errores.append(float(pred) - ds.yhat[i])
+
+    errores = np.asarray(errores)
+    return {
+        "mae": float(np.abs(errores).mean()),
+        "rmse": float(np.sqrt((errores ** 2).mean()))
+    }
+
+
+def _holdout_grilla(cls, ds: DatasetSnapshot) -> Optional[float]:
+    lattice = ds.lattice
+    if lattice is None or lattice.nx < 3 or lattice.ny < 3:
+        return None
+
+    ix = np.searchsorted(lattice.x_coords, ds.area_vidrio)
+    iy = np.searchsorted(lattice.y_coords, ds.tv)
+    # Se conserva también el último nodo para no extrapolar en los bordes
+    pares = ((ix % 2 == 0) | (ix == lattice.nx - 1)) & ((iy % 2 == 0) | (iy == lattice.ny - 1))
+
+    sub = _subconjunto(ds, pares)
+    if not cls.soporta(sub):
+        return None
+
+    pred = cls(sub).predict(ds.area_vidrio[~pares], ds.tv[~pares])
+    return float(np.abs(pred - ds.yhat[~pares]).mean())
+
+
+def ejecutar_benchmark(csv_path: str, n_consultas: int, repeticiones: int,
+                       max_loo: int, semilla: int = 0) -> List[Dict[str, object]]:
+    ds = cargar_snapshot_csv(csv_path)
+    rng = np.random.default_rng(semilla)
+
+    x_min, x_max = float(np.nanmin(ds.area_vidrio)), float(np.nanmax(ds.area_vidrio))
+    y_min, y_max = float(np.nanmin(ds.tv)), float(np.nanmax(ds.tv))
+    consultas = np.column_stack((
+        rng.uniform(x_min, x_max, n_consultas),
+        rng.uniform(y_min, y_max, n_consultas),
+    ))
+
+    filas_loo = np.arange(len(ds))
+    if 0 < max_loo < len(ds):
+        filas_loo = np.sort(rng.choice(len(ds), size=max_loo, replace=False))
+
+    resultados = []
+    for nombre, cls in PREDICTORES.items():
+        fila: Dict[str, object] = {"backend": nombre}
+        if not cls.soporta(ds):
+            fila["error"] = "No soporta este dataset"
+            resultados.append(fila)
+            continue
+
+        t0 = time.perf_counter()
+        predictor = cls(ds)
+        fila["ajuste_ms"] = (time.perf_counter() - t0) * 1e3
+        fila["latencia_us"] = _latencia_us(predictor, consultas, repeticiones)
+        fila["throughput_qps"] = _throughput_qps(predictor, consultas)
+
+        loo = _leave_one_out(cls, ds, filas_loo)
+        fila["loo_mae"] = loo["mae"] if loo else None
+        fila["loo_rmse"] = loo["rmse"] if loo else None
+        fila["holdout_grilla_mae"] = _holdout_grilla(cls, ds)
+        resultados.append(fila)
+
+    return resultados
+
+
+def elegir_backend(resultados: List[Dict[str, object]], objetivo_mae: float) -> Optional[str]:
+    """Backend con mayor throughput cuyo error cumple el objetivo"""
+    candidatos = []
+    for fila in resultados:
+        errores = [fila.get(k) for k in ("loo_mae", "holdout_grilla_mae") if fila.get(k) is not None]
+        if errores and max(errores) <= objetivo_mae:
+            candidatos.append(fila)
+
+    if not candidatos:
+        return None
+    return max(candidatos, key=lambda f: f["throughput_qps"])["backend"]
+
+
+def _formato(valor, decimales: int = 3) -> str:
+    if valor is None:
+        return "-"
+    if isinstance(valor, float):
+        return f"{valor:.{decimales}f}"
+    return str(valor)
+
+
+def imprimir_tabla(resultados: List[Dict[str, object]]) -> None:
+    columnas = ["backend", "ajuste_ms", "latencia_us", "throughput_qps",
+                "loo_mae", "loo_rmse", "holdout_grilla_mae"]
+    filas = [[_formato(f.get(c, f.get("error"))) for c in columnas] for f in resultados]
+    anchos = [max(len(c), *(len(r[i]) for r in filas)) for i, c in enumerate(columnas)]
+
+    print("  ".join(c.ljust(a) for c, a in zip(columnas, anchos)))
+    for r in filas:
+        print("  ".join(v.ljust(a) for v, a in zip(r, anchos)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de predicción")
+    parser.add_argument("--csv", default=os.path.join(os.getcwd(), "datos_sudi_limpio.csv"))
+    parser.add_argument("--consultas", type=int, default=100_000,
+                        help="Tamaño del lote para medir throughput")
+    parser.add_argument("--repeticiones", type=int, default=500,
+                        help="Consultas individuales para medir latencia")
+    parser.add_argument("--max-loo", type=int, default=150,
+                        help="Filas evaluadas en leave-one-out (0 = todas)")
+    parser.add_argument("--objetivo-mae", type=float, default=None,
+                        help="Error máximo aceptable para recomendar un backend")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    resultados = ejecutar_benchmark(args.csv, args.consultas, args.repeticiones, args.max_loo)
+    recomendado = (
+        elegir_backend(resultados, args.objetivo_mae)
+        if args.objetivo_mae is not None else None
+    )
+
+    if args.json:
+        print(json.dumps({"resultados": resultados, "recomendado": recomendado}, indent=2))
+        return
+
+    imprimir_tabla(resultados)
+    if args.objetivo_mae is not None:
+        print()
+        print(f"Backend recomendado (MAE <= {args.objetivo_mae}): {recomendado or 'ninguno'}")
+
+
+if __name__ == "__main__":
+    main()
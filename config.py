@@ -33,6 +33,76 @@ class Settings:
     csv_filename: str = "datos_sudi_limpio.csv"
     images_folder: str = "images"
 
+    # Prefijo de los routers de la API (se usa para armar URLs absolutas al path)
+    api_prefix: str = os.getenv("API_PREFIX", "/api/v1")
+
+    # Model sheets: por defecto se referencian por URL + hash; en base64 solo si se pide
+    sheets_inline: bool = os.getenv("SHEETS_INLINE", "false").lower() == "true"
+    sheets_max_age_s: int = int(os.getenv("SHEETS_MAX_AGE_S", "86400"))
+    # Cache en memoria de las sheets (bytes + base64 + variantes reducidas "nombre:ancho")
+    memoria_max_sheets_mb: float = float(os.getenv("MEMORIA_MAX_SHEETS_MB", "32"))
+    sheets_variantes: str = os.getenv("SHEETS_VARIANTES", "miniatura:160,vista_previa:480")
+    # Si falta el PNG de una sheet se genera desde sus zonas poligonales (ancho x alto)
+    sheets_generadas: bool = os.getenv("SHEETS_GENERADAS", "true").lower() == "true"
+    sheets_generadas_ancho: int = int(os.getenv("SHEETS_GENERADAS_ANCHO", "960"))
+    sheets_generadas_alto: int = int(os.getenv("SHEETS_GENERADAS_ALTO", "640"))
+
+    # Dataset compilado (.luzbin junto al CSV, ver services/dataset_binario.py)
+    usar_dataset_binario: bool = os.getenv("USAR_DATASET_BINARIO", "true").lower() == "true"
+    verificar_dataset_binario: bool = os.getenv("VERIFICAR_DATASET_BINARIO", "false").lower() == "true"
+
+    # Backend de almacenamiento: "memoria" (CSV/.luzbin) o "sqlite" (ver services/almacen_sqlite.py)
+    backend_datos: str = os.getenv("BACKEND_DATOS", "memoria")
+    sqlite_path: str = os.getenv("SQLITE_PATH", "datos_luz.sqlite")
+
+    # Datasets por (orientación, ubicación) y presupuesto de memoria para tenerlos cargados
+    datasets_manifest: str = os.getenv("DATASETS_MANIFEST", "datasets.json")
+    memoria_max_datasets_mb: float = float(os.getenv("MEMORIA_MAX_DATASETS_MB", "512"))
+
+    # Modo escalado para datasets grandes: "auto" (según umbral), "siempre" o "nunca".
+    # Agrega el heatmap por celda y diezma el scatter a max_puntos_scatter.
+    modo_escalado: str = os.getenv("MODO_ESCALADO", "auto")
+    umbral_escalado_puntos: int = int(os.getenv("UMBRAL_ESCALADO_PUNTOS", "50000"))
+    max_puntos_scatter: int = int(os.getenv("MAX_PUNTOS_SCATTER", "5000"))
+    tamano_bloque_agregacion: int = int(os.getenv("TAMANO_BLOQUE_AGREGACION", "1000000"))
+
+    # Heatmaps a resolución elegida por el cliente: máximo por eje, resoluciones en cache
+    # y memoria máxima de ese cache (grillas y JSON serializados)
+    max_resolucion_heatmap: int = int(os.getenv("MAX_RESOLUCION_HEATMAP", "1024"))
+    cache_resoluciones_heatmap: int = int(os.getenv("CACHE_RESOLUCIONES_HEATMAP", "16"))
+    cache_resoluciones_heatmap_mb: float = float(os.getenv("CACHE_RESOLUCIONES_HEATMAP_MB", "64"))
+
+    # Tiles de heatmap (zoom, x, y): celdas por lado, zoom máximo, tiles en cache y Cache-Control
+    tamano_tile_heatmap: int = int(os.getenv("TAMANO_TILE_HEATMAP", "32"))
+    max_zoom_heatmap: int = int(os.getenv("MAX_ZOOM_HEATMAP", "8"))
+    cache_tiles_heatmap: int = int(os.getenv("CACHE_TILES_HEATMAP", "512"))
+    tiles_max_age_s: int = int(os.getenv("TILES_MAX_AGE_S", "300"))
+
+    # Heatmaps y zonas renderizados en el servidor (PNG/SVG): tamaño máximo, imágenes en cache
+    max_tamano_render: int = int(os.getenv("MAX_TAMANO_RENDER", "4096"))
+    cache_render: int = int(os.getenv("CACHE_RENDER", "64"))
+    render_max_age_s: int = int(os.getenv("RENDER_MAX_AGE_S", "300"))
+
+    # Recarga en caliente: cada cuántos segundos se revisa si cambió el CSV (0 = nunca)
+    intervalo_verificacion_dataset_s: float = float(os.getenv("INTERVALO_VERIFICACION_DATASET_S", "5"))
+
+    # Token para los endpoints /admin (vacío = deshabilitados)
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+
+    # Backend de predicción: nearest, bilinear, idw, polinomial, rbf
+    modo_prediccion: str = os.getenv("MODO_PREDICCION", "nearest")
+
+    # Máximo de ventanas por request en /calcular_luz/batch
+    max_ventanas_lote: int = int(os.getenv("MAX_VENTANAS_LOTE", "10000"))
+
+    # Streaming NDJSON/CSV: ventanas por bloque vectorizado y tamaño máximo de línea
+    tamano_bloque_stream: int = int(os.getenv("TAMANO_BLOQUE_STREAM", "2000"))
+    max_bytes_linea_stream: int = 64 * 1024
+
+    # Vecindario k-NN reportado en punto_usado
+    knn_k: int = int(os.getenv("KNN_K", "4"))
+    knn_escala: str = os.getenv("KNN_ESCALA", "rango")  # rango, std, ninguna
+
 
 @lru_cache()
 def get_settings() -> Settings:
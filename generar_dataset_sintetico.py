@@ -0,0 +1,110 @@
+"""
+Generador de datasets de simulación sintéticos para probar el modo escalado.
+
+Toma el lattice del dataset real e interpola yhat (bilineal) en puntos
+aleatorios o en una grilla más fina, con ruido gaussiano opcional. El
+CSV se escribe por bloques, así que se pueden generar millones de filas
+con memoria acotada; opcionalmente se compila también a .luzbin.
+
+Uso:
+    python generar_dataset_sintetico.py salida.csv [--puntos 1000000]
+        [--ruido 0.3] [--semilla 0] [--grilla] [--base datos.csv] [--luzbin]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from config import get_settings
+from services.data_service import DataService
+from services.dataset import cargar_snapshot_csv
+from services.dataset_binario import compilar_csv
+
+BLOQUE = 250_000
+
+
+def generar(salida: str, puntos: int, ruido: float = 0.0, semilla: int = 0,
+            grilla: bool = False, base_csv: str = None) -> int:
+    """
+    Escribe un CSV sintético con columnas area_vidrio, tv, yhat
+
+    Args:
+        salida: CSV a generar
+        puntos: Cantidad de filas (con grilla=True se redondea a un lattice cuadrado)
+        ruido: Desvío estándar del ruido sumado a yhat (en puntos de sUDI)
+        semilla: Semilla del generador aleatorio
+        grilla: Si True, los puntos forman un lattice regular en lugar de ser aleatorios
+        base_csv: Dataset real del que se toma la superficie (por defecto el configurado)
+
+    Returns:
+        Cantidad de filas escritas
+
+    Raises:
+        ValueError: Si el dataset base no es un lattice regular
+    """
+    base = cargar_snapshot_csv(base_csv or DataService().csv_path)
+    lattice = base.lattice
+    if lattice is None:
+        raise ValueError("El dataset base debe ser una grilla regular para interpolar")
+
+    x_min, x_max = float(lattice.x_coords[0]), float(lattice.x_coords[-1])
+    y_min, y_max = float(lattice.y_coords[0]), float(lattice.y_coords[-1])
+    rng = np.random.default_rng(semilla)
+
+    if grilla:
+        lado = max(2, int(round(np.sqrt(puntos))))
+        xs = np.linspace(x_min, x_max, lado)
+        ys = np.linspace(y_min, y_max, lado)
+        puntos = lado * lado
+
+    escritas = 0
+    with open(salida, "w", encoding="utf-8", newline="") as f:
+        f.write("area_vidrio,tv,yhat\n")
+        while escritas < puntos:
+            n = min(BLOQUE, puntos - escritas)
+            if grilla:
+                idx = np.arange(escritas, escritas + n)
+                x, y = xs[idx // lado], ys[idx % lado]
+            else:
+                x = rng.uniform(x_min, x_max, n)
+                y = rng.uniform(y_min, y_max, n)
+
+            yhat, _, _ = lattice.bilinear(x, y)
+            if ruido > 0:
+                yhat = yhat + rng.normal(0.0, ruido, n)
+            yhat = np.clip(yhat, 0.0, 100.0)
+
+            np.savetxt(f, np.column_stack((x, y, yhat)), fmt="%.6f", delimiter=",")
+            escritas += n
+
+    return escritas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un dataset de simulación sintético")
+    parser.add_argument("salida", help="CSV a generar")
+    parser.add_argument("--puntos", type=int, default=1_000_000)
+    parser.add_argument("--ruido", type=float, default=0.0,
+                        help="Desvío estándar del ruido sobre yhat")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--grilla", action="store_true",
+                        help="Puntos en lattice regular en lugar de aleatorios")
+    parser.add_argument("--base", default=None,
+                        help="CSV real del que se interpola yhat (por defecto el configurado)")
+    parser.add_argument("--luzbin", action="store_true",
+                        help="Compilar además el .luzbin (con KD-tree) junto al CSV")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    filas = generar(args.salida, args.puntos, args.ruido, args.semilla, args.grilla, args.base)
+    print(f"{args.salida}: {filas} filas en {time.perf_counter() - inicio:.1f}s")
+
+    if args.luzbin:
+        # Con el KD-tree incluido, los workers no lo construyen al predecir
+        header = compilar_csv(args.salida, escalas_kdtree=(get_settings().knn_escala,))
+        print(f"luzbin: {header['filas']} filas, lattice={header['lattice'] is not None}")
+
+
+if __name__ == "__main__":
+    main()
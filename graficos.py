@@ -1,4 +1,3 @@
-import pandas as pd
 import os
 
 # Detectar automáticamente el nombre correcto del CSV
@@ -22,13 +21,20 @@ def get_csv_path():
 CSV_PATH = get_csv_path()
 
 
+def _leer_csv():
+    """Lee el CSV con pandas, importándolo recién cuando hace falta"""
+    import pandas as pd
+
+    return pd.read_csv(CSV_PATH)
+
+
 def get_heatmap_data():
     """Obtiene datos del heatmap desde el CSV"""
     if not os.path.exists(CSV_PATH):
         raise FileNotFoundError(
             f"No se encontró el archivo CSV en: {CSV_PATH}")
 
-    df = pd.read_csv(CSV_PATH)
+    df = _leer_csv()
 
     # Verificar columnas necesarias
     required_cols = ["area_vidrio", "tv", "yhat"]
@@ -54,7 +60,7 @@ def predict_yhat_nearest(area_vidrio: float, tv: float) -> tuple[float, float, f
         raise FileNotFoundError(
             f"No se encontró el archivo CSV en: {CSV_PATH}")
 
-    df = pd.read_csv(CSV_PATH)
+    df = _leer_csv()
 
     # Verificar que el dataframe no está vacío
     if df.empty:
@@ -81,7 +87,7 @@ def get_data_stats():
         raise FileNotFoundError(
             f"No se encontró el archivo CSV en: {CSV_PATH}")
 
-    df = pd.read_csv(CSV_PATH)
+    df = _leer_csv()
 
     return {
         "total_records": len(df),
@@ -0,0 +1,27 @@
+"""
+Configuración de gunicorn con workers uvicorn.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+El proceso padre prepara los datasets una sola vez antes de crear los
+workers (ver services/compartido.py); cada worker los abre con memmap y
+comparte las páginas con los demás en lugar de cargar su propia copia.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Cada worker importa la app por su cuenta; lo compartido son los archivos mapeados
+# (los heatmaps y payloads precalculados son privados de cada worker)
+preload_app = False
+
+
+def on_starting(server):
+    from services.compartido import preparar_datasets_compartidos
+
+    for ruta, estado in preparar_datasets_compartidos().items():
+        server.log.info("Dataset %s: %s", ruta, estado)
@@ -1,10 +1,12 @@
 import os
-import uvicorn
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import get_settings
 from routers import luz_router
+from services import dataset as dataset_store
+from services.data_service import DataService
 
 # Configuración
 settings = get_settings()
@@ -35,7 +37,35 @@ app.add_middleware(
 )
 
 # Incluir routers
-app.include_router(luz_router.router, prefix="/api/v1")
+app.include_router(luz_router.router, prefix=settings.api_prefix)
+
+# Carga del dataset al arrancar
+
+
+@app.on_event("startup")
+def precargar_dataset():
+    try:
+        luz_router.data_service.precargar()
+    except (FileNotFoundError, ValueError) as e:
+        # La API arranca igual; los endpoints reportarán el error al usarse
+        logging.getLogger(__name__).warning(
+            "No se pudo precargar el dataset: %s", e)
+
+    # Heatmaps de cada dataset conocido; las versiones nuevas se preparan al recargar
+    dataset_store.registrar_preparacion(luz_router.luz_service.preparar_snapshot)
+    rutas = {luz_router.data_service.csv_path, *luz_router.data_service.registro_datasets().values()}
+    for csv_path in sorted(rutas):
+        try:
+            luz_router.luz_service.precalcular_heatmaps(DataService(csv_path))
+        except (FileNotFoundError, ValueError) as e:
+            logging.getLogger(__name__).warning(
+                "No se pudieron precalcular los heatmaps de %s: %s", csv_path, e)
+
+    try:
+        luz_router.data_service.precargar_model_sheets()
+    except (OSError, ValueError) as e:
+        logging.getLogger(__name__).warning(
+            "No se pudieron precargar las model sheets: %s", e)
 
 # Endpoint raíz
 
@@ -58,6 +88,9 @@ def health_check():
 
 
 if __name__ == "__main__":
+    # Solo al ejecutar directamente: en producción el servidor ya está importado
+    import uvicorn
+
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(
         "main:app",
@@ -0,0 +1,119 @@
+"""
+Presupuesto de tiempo de arranque de la API (import de main:app).
+
+Importa main en procesos nuevos (en frío, sin caché de módulos del
+intérprete), mide el tiempo de import y el de la precarga del dataset, y
+falla si se supera el presupuesto o si se importan módulos que no deben
+estar en el camino de arranque (pandas por defecto).
+
+Uso:
+    python presupuesto_arranque.py [--presupuesto-ms 1500] [--repeticiones 3]
+        [--prohibidos pandas,matplotlib] [--top 15] [--json]
+
+Código de salida 0 si se cumple el presupuesto, 1 si no.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+_HIJO = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+main.precargar_dataset()
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1e3,
+    "precarga_ms": (t2 - t1) * 1e3,
+    "modulos": sorted(sys.modules),
+}))
+"""
+
+
+def _medir_una_vez() -> Dict[str, object]:
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _HIJO],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True,
+    )
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    resultado["importtime"] = proceso.stderr
+    return resultado
+
+
+def _mas_costosos(importtime: str, top: int) -> List[Dict[str, object]]:
+    """Módulos con mayor tiempo acumulado según -X importtime"""
+    filas = []
+    for linea in importtime.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        # "import time:  <propio us> | <acumulado us> | <módulo con sangría>"
+        cabecera, acumulado, modulo = linea.split("|", 2)
+        propio = cabecera.split(":", 1)[1]
+        filas.append({
+            "modulo": modulo.strip(),
+            "propio_ms": int(propio) / 1e3,
+            "acumulado_ms": int(acumulado) / 1e3
+        })
+    return sorted(filas, key=lambda f: f["acumulado_ms"], reverse=True)[:top]
+
+
+def medir(repeticiones: int, prohibidos: List[str], top: int) -> Dict[str, object]:
+    mediciones = [_medir_una_vez() for _ in range(max(1, repeticiones))]
+    modulos = set(mediciones[-1]["modulos"])
+
+    return {
+        "import_ms": statistics.median(m["import_ms"] for m in mediciones),
+        "precarga_ms": statistics.median(m["precarga_ms"] for m in mediciones),
+        "prohibidos_importados": [
+            p for p in prohibidos if any(m == p or m.startswith(p + ".") for m in modulos)
+        ],
+        "mas_costosos": _mas_costosos(mediciones[-1]["importtime"], top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de arranque de main:app")
+    parser.add_argument("--presupuesto-ms", type=float,
+                        default=float(os.getenv("PRESUPUESTO_ARRANQUE_MS", "1500")),
+                        help="Máximo para import + precarga del dataset")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--prohibidos", default="pandas",
+                        help="Módulos que no deben importarse al arrancar (separados por coma)")
+    parser.add_argument("--top", type=int, default=15, help="Módulos más costosos a listar")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    prohibidos = [p.strip() for p in args.prohibidos.split(",") if p.strip()]
+    resultado = medir(args.repeticiones, prohibidos, args.top)
+    total = resultado["import_ms"] + resultado["precarga_ms"]
+    resultado["total_ms"] = total
+    resultado["presupuesto_ms"] = args.presupuesto_ms
+    resultado["ok"] = total <= args.presupuesto_ms and not resultado["prohibidos_importados"]
+
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+    else:
+        print(f"import main:      {resultado['import_ms']:8.1f} ms")
+        print(f"precarga dataset: {resultado['precarga_ms']:8.1f} ms")
+        print(f"total:            {total:8.1f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+        if resultado["prohibidos_importados"]:
+            print(f"módulos prohibidos importados: {', '.join(resultado['prohibidos_importados'])}")
+        print()
+        print("Módulos más costosos (acumulado):")
+        for fila in resultado["mas_costosos"]:
+            print(f"  {fila['acumulado_ms']:8.1f} ms  {fila['modulo']}")
+        print()
+        print("OK" if resultado["ok"] else "PRESUPUESTO EXCEDIDO")
+
+    sys.exit(0 if resultado["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Puntuación offline de ventanas por lotes, sin pasar por la API HTTP.
+
+Usa DataService y LuzNaturalService directamente (mismo código de
+predicción y métricas que la API) y reparte bloques del archivo de
+entrada entre un pool de procesos. Los resultados se escriben en CSV a
+medida que cada bloque termina, en el mismo orden que la entrada.
+
+Uso:
+    python puntuar_lote.py entrada.csv salida.csv [--procesos 8]
+        [--bloque 5000] [--modo-prediccion bilinear] [--dataset datos.csv]
+
+Formatos de entrada (por extensión):
+    .csv               columnas nombre_espacio, alto, ancho, tv, orientation, ubicacion
+    .ndjson / .jsonl   un objeto JSON por línea con los mismos campos
+    .parquet           requiere pyarrow instalado
+"""
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.data_service import DataService
+from services.luz_service import LuzNaturalService
+
+Bloque = List[Tuple[int, Dict[str, Any]]]
+
+# Servicio por proceso worker, creado en _inicializar_worker
+_servicio: Optional[LuzNaturalService] = None
+
+# Bloques enviados al pool y todavía no escritos, por proceso worker
+_BLOQUES_EN_VUELO_POR_PROCESO = 2
+
+
+def _inicializar_worker(csv_path: Optional[str]) -> None:
+    global _servicio
+    _servicio = LuzNaturalService(DataService(csv_path))
+    _servicio.data_service.precargar()
+
+
+def _procesar_bloque(args: Tuple[Bloque, Optional[str]]) -> Tuple[int, str]:
+    bloque, modo = args
+    return len(bloque), _servicio.procesar_bloque_csv(bloque, modo)
+
+
+def _leer_filas(ruta: str) -> Iterator[Dict[str, Any]]:
+    """Itera las filas del archivo de entrada sin cargarlo completo"""
+    extension = os.path.splitext(ruta)[1].lower()
+
+    if extension in (".ndjson", ".jsonl"):
+        with open(ruta, encoding="utf-8") as f:
+            for linea in f:
+                if linea.strip():
+                    yield json.loads(linea)
+        return
+
+    if extension == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Leer Parquet requiere pyarrow: pip install pyarrow")
+
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=65536):
+            yield from lote.to_pylist()
+        return
+
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def _bloques(filas: Iterator[Dict[str, Any]], tamano: int, modo: Optional[str]
+             ) -> Iterator[Tuple[Bloque, Optional[str]]]:
+    numeradas = enumerate(filas)
+    while True:
+        bloque = list(islice(numeradas, tamano))
+        if not bloque:
+            return
+        yield bloque, modo
+
+
+def _en_orden(pool: "multiprocessing.pool.Pool", bloques: Iterator[Tuple[Bloque, Optional[str]]],
+              en_vuelo: int) -> Iterator[Tuple[int, str]]:
+    """
+    Resultados de los bloques en el orden de la entrada, con a lo sumo
+    en_vuelo bloques leídos y sin escribir
+
+    Pool.imap no sirve: su hilo alimentador lee la entrada por adelantado
+    sin límite y un archivo grande termina entero en memoria.
+    """
+    pendientes = deque()
+    for bloque in bloques:
+        if len(pendientes) >= en_vuelo:
+            yield pendientes.popleft().get()
+        pendientes.append(pool.apply_async(_procesar_bloque, (bloque,)))
+    while pendientes:
+        yield pendientes.popleft().get()
+
+
+def _reportar(filas: int, inicio: float, final: bool = False) -> None:
+    transcurrido = max(time.perf_counter() - inicio, 1e-9)
+    sys.stderr.write(
+        f"\r{filas} filas | {filas / transcurrido:,.0f} filas/s | {transcurrido:.1f}s"
+        + ("\n" if final else "")
+    )
+    sys.stderr.flush()
+
+
+def puntuar(entrada: str, salida: str, procesos: int, tamano_bloque: int,
+            modo: Optional[str] = None, csv_path: Optional[str] = None) -> int:
+    """
+    Puntúa el archivo de entrada y escribe el CSV de resultados
+
+    Returns:
+        Cantidad de filas procesadas
+    """
+    bloques = _bloques(_leer_filas(entrada), tamano_bloque, modo)
+    inicio = time.perf_counter()
+    total = 0
+
+    with open(salida, "w", encoding="utf-8", newline="") as f:
+        encabezado = io.StringIO()
+        csv.writer(encabezado).writerow(LuzNaturalService.COLUMNAS_CSV_SALIDA)
+        f.write(encabezado.getvalue())
+
+        if procesos <= 1:
+            _inicializar_worker(csv_path)
+            resultados = map(_procesar_bloque, bloques)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(procesos, _inicializar_worker, (csv_path,))
+            # Conserva el orden y lee la entrada a medida que se escriben resultados
+            resultados = _en_orden(pool, bloques, procesos * _BLOQUES_EN_VUELO_POR_PROCESO)
+
+        try:
+            ultimo_reporte = 0.0
+            for n, texto in resultados:
+                f.write(texto)
+                total += n
+                if time.perf_counter() - ultimo_reporte >= 0.5:
+                    _reportar(total, inicio)
+                    ultimo_reporte = time.perf_counter()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    _reportar(total, inicio, final=True)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Puntuación offline de ventanas por lotes")
+    parser.add_argument("entrada", help="Archivo de ventanas (.csv, .ndjson, .jsonl, .parquet)")
+    parser.add_argument("salida", help="CSV de resultados")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="Procesos worker (1 = sin pool)")
+    parser.add_argument("--bloque", type=int, default=5000,
+                        help="Filas por bloque vectorizado")
+    parser.add_argument("--modo-prediccion", default=None,
+                        help="Backend de predicción (por defecto el configurado)")
+    parser.add_argument("--dataset", default=None,
+                        help="CSV de simulación (por defecto el de la configuración)")
+    args = parser.parse_args()
+
+    puntuar(args.entrada, args.salida, args.procesos, args.bloque,
+            args.modo_prediccion, args.dataset)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
 import os
-from typing import Literal
-from fastapi import APIRouter, HTTPException, Query
+import io
+import csv
+import hmac
+import json
+from typing import Literal, Optional, Tuple
+from fastapi import APIRouter, File, Header, HTTPException, Path, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from schemas.luz_schemas import (
     VentanaInput,
     LuzNaturalResponse,
+    LoteVentanasInput,
+    LoteResponse,
+    IngestaFilasInput,
     ModelSheetResponse,
     DebugResponse
 )
 from services.luz_service import LuzNaturalService
 from services.data_service import DataService
+from services.predictores import listar_predictores
 from utils.orientacion import obtener_orientaciones_disponibles
 from utils.colores import get_color_legend
+from utils.streaming import StreamingBodyResponse, iterar_lineas
+from utils.archivos import ArchivoResponse
+from config import get_settings
+
+settings = get_settings()
 
 # Crear router
 router = APIRouter(tags=["Cálculo de Luz Natural"])
@@ -20,9 +35,19 @@ luz_service = LuzNaturalService()
 data_service = DataService()
 
 
+def _resolucion(x_grid_size: Optional[int], y_grid_size: Optional[int]) -> Optional[Tuple[int, int]]:
+    """Resolución pedida del heatmap; el eje no indicado conserva la grilla base"""
+    if x_grid_size is None and y_grid_size is None:
+        return None
+    return (x_grid_size or LuzNaturalService.EJE_AREA.n,
+            y_grid_size or LuzNaturalService.EJE_TV.n)
+
+
 @router.post(
     "/calcular_luz",
     response_model=LuzNaturalResponse,
+    # formato y scatter solo aparecen si se pidió el formato compacto
+    response_model_exclude_unset=True,
     summary="Calcular métricas de luz natural",
     description="""
     Calcula las métricas de iluminación natural para una ventana específica.
@@ -35,14 +60,39 @@ data_service = DataService()
     - **DAv_zone**: DA combinada con superficie y zona
     
     También genera datos para heatmap compatible con ECharts.
+
+    Cada métrica referencia su gráfico por URL + hash (ver
+    /model_sheet/{metric}/imagen); con `sheets_inline=true` se incluye en base64.
+
+    Con `formato=compacto` el heatmap y el scatter se envían como arreglos
+    binarios en base64 (Uint8/Uint16/Float32, fila-mayor) con una paleta de
+    colores, en lugar de listas de celdas y colores hex por punto.
     """
 )
-def calcular_luz(data: VentanaInput):
+def calcular_luz(
+    data: VentanaInput,
+    sheets_inline: Optional[bool] = Query(
+        None, description="Incluir las imágenes de las métricas en base64"),
+    sheets_variante: Optional[str] = Query(
+        None, description="Variante reducida de las imágenes (p.ej. miniatura)"),
+    x_grid_size: Optional[int] = Query(
+        None, ge=2, le=settings.max_resolucion_heatmap,
+        description="Celdas del heatmap en área (por defecto la grilla base)"),
+    y_grid_size: Optional[int] = Query(
+        None, ge=2, le=settings.max_resolucion_heatmap,
+        description="Celdas del heatmap en TV (por defecto la grilla base)"),
+    remuestreo: Literal["cercano", "bilineal", "bicubico"] = Query(
+        "bilineal", description="Remuestreo de la grilla base a la resolución pedida"),
+    formato: Literal["json", "compacto"] = Query(
+        "json", description="compacto: grilla y scatter como arreglos base64 con paleta de colores")
+):
     """
     Endpoint principal para cálculo de luz natural
     """
     try:
-        resultado = luz_service.procesar_calculo_luz(data)
+        resultado = luz_service.procesar_calculo_luz(
+            data, sheets_inline, sheets_variante,
+            _resolucion(x_grid_size, y_grid_size), remuestreo, formato)
         return LuzNaturalResponse(**resultado)
 
     except ValueError as e:
@@ -54,23 +104,160 @@ def calcular_luz(data: VentanaInput):
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
+@router.post(
+    "/calcular_luz/batch",
+    response_model=LoteResponse,
+    summary="Calcular métricas de luz natural para un lote de ventanas",
+    description="""
+    Calcula yhat y métricas para muchas ventanas en una sola pasada vectorizada.
+
+    A diferencia de /calcular_luz no devuelve el heatmap: cada resultado
+    incluye solo yhat_pred, punto_usado, metrics y energia_pct.
+    """
+)
+def calcular_luz_batch(data: LoteVentanasInput):
+    """
+    Endpoint de cálculo por lotes
+    """
+    try:
+        resultado = luz_service.procesar_lote(data.ventanas, data.modo_prediccion)
+        return LoteResponse(**resultado)
+
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error cargando datos: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+@router.post(
+    "/calcular_luz/stream",
+    summary="Calcular métricas en streaming NDJSON",
+    description="""
+    Lee ventanas en formato NDJSON (un VentanaInput JSON por línea) desde el
+    body de forma incremental y devuelve un resultado NDJSON por línea a medida
+    que se procesa cada bloque.
+
+    La memoria usada es acotada por el tamaño de bloque, sin importar el
+    tamaño de la entrada. Las líneas inválidas producen un registro con
+    "error" en lugar de abortar el stream.
+    """
+)
+async def calcular_luz_stream(
+    request: Request,
+    modo_prediccion: Optional[str] = Query(
+        default=None,
+        description="Backend de predicción para las ventanas que no indiquen uno"
+    )
+):
+    """
+    Endpoint de cálculo en streaming NDJSON
+    """
+    async def generar():
+        bloque = []
+        num = 0
+        try:
+            async for linea in iterar_lineas(request.stream(), settings.max_bytes_linea_stream):
+                bloque.append((num, linea))
+                num += 1
+                if len(bloque) >= settings.tamano_bloque_stream:
+                    yield await run_in_threadpool(
+                        luz_service.procesar_chunk_ndjson, bloque, modo_prediccion)
+                    bloque = []
+        except ValueError as e:
+            if bloque:
+                yield await run_in_threadpool(
+                    luz_service.procesar_chunk_ndjson, bloque, modo_prediccion)
+            yield json.dumps({"indice": num, "error": str(e)}, ensure_ascii=False) + "\n"
+            return
+
+        if bloque:
+            yield await run_in_threadpool(
+                luz_service.procesar_chunk_ndjson, bloque, modo_prediccion)
+
+    return StreamingBodyResponse(generar(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/calcular_luz/csv",
+    summary="Calcular métricas para un CSV de ventanas",
+    description="""
+    Recibe un CSV (multipart) con columnas alto, ancho, tv, orientation,
+    ubicacion y nombre_espacio, y devuelve en streaming un CSV con la predicción y las
+    cinco métricas de cada fila.
+
+    El archivo se procesa por bloques vectorizados; las filas inválidas se
+    reportan en la columna "error" sin interrumpir el resto.
+    """
+)
+def calcular_luz_csv(
+    archivo: UploadFile = File(..., description="CSV de ventanas"),
+    modo_prediccion: Optional[str] = Query(
+        default=None,
+        description="Backend de predicción para todas las filas"
+    )
+):
+    """
+    Endpoint de cálculo por archivo CSV
+    """
+    texto = io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline="")
+    lector = csv.DictReader(texto)
+
+    try:
+        columnas = lector.fieldnames or []
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="El archivo debe estar codificado en UTF-8")
+
+    if "tv" not in columnas:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Columnas faltantes en CSV: ['tv']. Columnas recibidas: {columnas}"
+        )
+
+    def generar():
+        encabezado = io.StringIO()
+        csv.writer(encabezado).writerow(LuzNaturalService.COLUMNAS_CSV_SALIDA)
+        yield encabezado.getvalue()
+
+        bloque = []
+        for num, fila in enumerate(lector):
+            bloque.append((num, fila))
+            if len(bloque) >= settings.tamano_bloque_stream:
+                yield luz_service.procesar_bloque_csv(bloque, modo_prediccion)
+                bloque = []
+
+        if bloque:
+            yield luz_service.procesar_bloque_csv(bloque, modo_prediccion)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="resultados_luz.csv"'}
+    )
+
+
 @router.get(
     "/model_sheet",
     response_model=ModelSheetResponse,
     summary="Obtener gráfico de métrica",
-    description="Devuelve la imagen del gráfico correspondiente a una métrica específica en formato base64."
+    description="Devuelve la URL y el hash del gráfico de una métrica; con `inline=true`, también la imagen en base64."
 )
 def get_model_sheet(
     metric: Literal["DA", "UDI", "sDA", "sUDI", "DAv_zone"] = Query(
         ...,
         description="Métrica de la cual obtener el gráfico"
-    )
+    ),
+    inline: Optional[bool] = Query(None, description="Incluir la imagen en base64"),
+    variante: Optional[str] = Query(
+        None, description="Variante reducida (p.ej. miniatura, vista_previa)")
 ):
     """
     Obtiene el gráfico de una métrica específica
     """
     try:
-        sheet_data = data_service.get_model_sheet(metric)
+        sheet_data = data_service.get_model_sheet(metric, inline, variante)
         return ModelSheetResponse(**sheet_data)
 
     except ValueError as e:
@@ -79,6 +266,63 @@ def get_model_sheet(
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+@router.api_route(
+    "/model_sheet/{metric}/imagen",
+    methods=["GET", "HEAD"],
+    summary="Imagen del gráfico de una métrica",
+    description="""
+    Envía el PNG del gráfico sin codificar, con ETag (SHA-256 del contenido),
+    Cache-Control y soporte de Range. Responde 304 si `If-None-Match` coincide.
+    Con `variante` se envía la versión reducida generada al cargar la imagen.
+    """,
+    response_class=ArchivoResponse
+)
+def get_model_sheet_imagen(
+    request: Request,
+    metric: Literal["DA", "UDI", "sDA", "sUDI", "DAv_zone"],
+    variante: Optional[str] = Query(
+        None, description="Variante reducida (p.ej. miniatura, vista_previa)")
+):
+    """
+    Sirve la imagen del gráfico de una métrica
+    """
+    try:
+        cacheada = data_service.model_sheet_cacheada(metric)
+        if variante is not None:
+            if variante not in cacheada.variantes:
+                raise FileNotFoundError(f"Variante no disponible: {variante}")
+            imagen = cacheada.variantes[variante]
+            return ArchivoResponse(
+                None,
+                request.headers,
+                media_type="image/png",
+                etag=imagen.hash,
+                max_age=settings.sheets_max_age_s,
+                method=request.method,
+                contenido=imagen.contenido
+            )
+
+        # El original se envía desde el archivo (zero-copy si el servidor lo
+        # soporta); si la sheet se generó, desde memoria
+        return ArchivoResponse(
+            None if cacheada.generada else cacheada.ruta,
+            request.headers,
+            media_type="image/png",
+            etag=cacheada.original.hash,
+            max_age=settings.sheets_max_age_s,
+            filename=os.path.basename(cacheada.ruta),
+            method=request.method,
+            contenido=cacheada.original.contenido if cacheada.generada else None
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
 @router.get(
     "/orientaciones",
     summary="Obtener orientaciones disponibles",
@@ -94,6 +338,109 @@ def get_orientaciones():
     }
 
 
+@router.get(
+    "/predictores",
+    summary="Obtener backends de predicción disponibles",
+    description="Lista los backends de predicción registrados y el configurado por defecto."
+)
+def get_predictores():
+    """
+    Obtiene lista de backends de predicción
+    """
+    return {
+        "predictores": listar_predictores(),
+        "por_defecto": settings.modo_prediccion,
+        "descripcion": "Backends seleccionables con el campo modo_prediccion"
+    }
+
+
+@router.get(
+    "/datasets",
+    summary="Obtener datasets de simulación registrados",
+    description="Lista los datasets por orientación y ubicación, y los cargados en memoria."
+)
+def get_datasets():
+    """
+    Obtiene el registro de datasets
+    """
+    try:
+        return data_service.listar_datasets()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/admin/dataset/filas",
+    status_code=202,
+    summary="Agregar filas de simulación a un dataset",
+    description="""
+    Agrega filas al CSV del dataset (el principal o el registrado para
+    orientation/ubicacion) y publica una versión nueva en segundo plano.
+    Los requests en curso terminan con la versión anterior.
+
+    Requiere el header X-Admin-Token con el valor de ADMIN_TOKEN.
+    """
+)
+def agregar_filas_dataset(
+    data: IngestaFilasInput,
+    esperar: bool = Query(
+        default=False,
+        description="Esperar a que la versión nueva quede publicada"
+    ),
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    """
+    Endpoint de ingesta de filas
+    """
+    # Comparación en tiempo constante, para no filtrar el token por tiempos de respuesta
+    if not settings.admin_token or not hmac.compare_digest(
+            (x_admin_token or "").encode("utf-8"), settings.admin_token.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+    try:
+        servicio = data_service.para(data.orientation, data.ubicacion)
+        resultado = servicio.agregar_filas([fila.model_dump() for fila in data.filas])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error cargando datos: {str(e)}")
+
+    recarga = resultado.pop("recarga")
+    if esperar:
+        recarga.join()
+        resultado["version_vigente"] = servicio.dataset.version
+    resultado["recarga_en_curso"] = recarga.is_alive()
+    return resultado
+
+
+@router.get(
+    "/puntos",
+    summary="Puntos del dataset en un rango",
+    description="Devuelve los puntos [area_vidrio, tv, yhat] dentro de una caja de área de vidrio y transmitancia."
+)
+def get_puntos(
+    area_min: float = Query(default=0.0, description="Área de vidrio mínima (m²)"),
+    area_max: float = Query(default=settings.max_area_vidrio, description="Área de vidrio máxima (m²)"),
+    tv_min: float = Query(default=0.0, description="Transmitancia visible mínima"),
+    tv_max: float = Query(default=1.0, description="Transmitancia visible máxima"),
+    orientation: Optional[str] = Query(default=None, description="Orientación del dataset"),
+    ubicacion: Optional[str] = Query(default=None, description="Ubicación del dataset")
+):
+    """
+    Obtiene puntos del dataset por rango
+    """
+    try:
+        puntos = data_service.para(orientation, ubicacion).puntos_en_rango(
+            area_min, area_max, tv_min, tv_max)
+        return {"total": len(puntos), "puntos": puntos}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error cargando datos: {str(e)}")
+
+
 @router.get(
     "/estadisticas",
     summary="Estadísticas del dataset",
@@ -168,14 +515,29 @@ def get_metrica_heatmap(
     metrica: Literal["DA", "UDI", "sDA", "sUDI", "DAv_zone"] = Query(
         ...,
         description="Métrica para la cual generar el heatmap con colores violeta-magenta"
-    )
+    ),
+    x_grid_size: Optional[int] = Query(
+        None, ge=2, le=settings.max_resolucion_heatmap,
+        description="Celdas del heatmap en área (por defecto la grilla base)"),
+    y_grid_size: Optional[int] = Query(
+        None, ge=2, le=settings.max_resolucion_heatmap,
+        description="Celdas del heatmap en TV (por defecto la grilla base)"),
+    remuestreo: Literal["cercano", "bilineal", "bicubico"] = Query(
+        "bilineal", description="Remuestreo de la grilla base a la resolución pedida"),
+    formato: Literal["json", "compacto"] = Query(
+        "json", description="compacto: grilla y scatter como arreglos base64 con paleta de colores")
 ):
     """
     Obtiene datos de heatmap para una métrica individual con colores del degradé violeta-magenta
     """
     try:
-        datos_metrica = luz_service.generar_datos_metrica_individual(metrica)
-        return datos_metrica
+        # Payload precalculado (o de una resolución reciente), ya serializado
+        return Response(
+            content=luz_service.datos_metrica_individual_json(
+                metrica, resolucion=_resolucion(x_grid_size, y_grid_size),
+                remuestreo=remuestreo, formato=formato),
+            media_type="application/json"
+        )
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -183,6 +545,97 @@ def get_metrica_heatmap(
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
+@router.api_route(
+    "/heatmap_tiles/{metrica}/{zoom}/{x}/{y}",
+    methods=["GET", "HEAD"],
+    summary="Tile de heatmap para una métrica",
+    description="""
+    Devuelve un tile de heatmap de tamaño fijo (TAMANO_TILE_HEATMAP celdas por lado).
+    Con zoom z el dominio (área, TV) se divide en 2^z x 2^z tiles; x crece con el área
+    e y con la TV. Los tiles se generan al pedirlos, se cachean y se envían con ETag.
+    """,
+    response_class=ArchivoResponse
+)
+def get_heatmap_tile(
+    request: Request,
+    metrica: Literal["DA", "UDI", "sDA", "sUDI", "DAv_zone"],
+    zoom: int = Path(..., ge=0, le=settings.max_zoom_heatmap),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    formato: Literal["json", "compacto"] = Query(
+        "json", description="compacto: grilla y scatter como arreglos base64 con paleta de colores")
+):
+    """
+    Sirve un tile del heatmap de una métrica
+    """
+    try:
+        contenido, hash_tile = luz_service.tile_heatmap_json(metrica, zoom, x, y, formato=formato)
+        return ArchivoResponse(
+            None,
+            request.headers,
+            media_type="application/json",
+            etag=hash_tile,
+            max_age=settings.tiles_max_age_s,
+            method=request.method,
+            contenido=contenido
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+@router.api_route(
+    "/render/{metrica}",
+    methods=["GET", "HEAD"],
+    summary="Imagen PNG/SVG del heatmap o de las zonas de una métrica",
+    description="""
+    Renderiza en el servidor el heatmap de una métrica (`tipo=heatmap`, desde el dataset)
+    o sus zonas poligonales (`tipo=zonas`), con los colores de los rangos de la métrica.
+    Las imágenes se cachean por métrica, tamaño y versión del dataset y se envían con ETag.
+    """,
+    response_class=ArchivoResponse
+)
+def get_render(
+    request: Request,
+    metrica: Literal["DA", "UDI", "sDA", "sUDI", "DAv_zone"],
+    tipo: Literal["heatmap", "zonas"] = Query("heatmap", description="Qué dibujar"),
+    formato: Literal["png", "svg"] = Query("png", description="Formato de la imagen"),
+    ancho: int = Query(960, ge=1, le=settings.max_tamano_render, description="Ancho en px"),
+    alto: int = Query(640, ge=1, le=settings.max_tamano_render, description="Alto en px"),
+    remuestreo: Literal["cercano", "bilineal", "bicubico"] = Query(
+        "cercano", description="heatmap PNG: celdas como bloques (cercano) o interpoladas por píxel")
+):
+    """
+    Sirve la imagen renderizada de una métrica
+    """
+    try:
+        if tipo == "zonas":
+            contenido, hash_imagen = luz_service.imagen_zonas(metrica, formato, ancho, alto)
+        else:
+            contenido, hash_imagen = luz_service.imagen_heatmap(metrica, formato, ancho, alto, remuestreo)
+        return ArchivoResponse(
+            None,
+            request.headers,
+            media_type="image/png" if formato == "png" else "image/svg+xml",
+            etag=hash_imagen,
+            max_age=settings.render_max_age_s,
+            filename=f"{metrica}_{tipo}.{formato}",
+            method=request.method,
+            contenido=contenido
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
 @router.get(
     "/metrica_poligonal",
     summary="Obtener zonas poligonales para métrica",
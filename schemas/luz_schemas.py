@@ -38,6 +38,11 @@ class VentanaInput(BaseModel):
         default=None,
         description="Nombre del espacio o habitación"
     )
+    modo_prediccion: Optional[str] = Field(
+        default=None,
+        description="Backend de predicción (nearest, bilinear, idw, polinomial, rbf); "
+                    "por defecto el configurado en el servidor"
+    )
 
     @field_validator("tv")
     @classmethod
@@ -64,11 +69,24 @@ class MetricaOutput(BaseModel):
         description="Información de la imagen/gráfico")
 
 
+class VecinoUsado(BaseModel):
+    """Punto del vecindario k-NN de la consulta"""
+
+    area_vidrio: float = Field(description="Área de vidrio del vecino (m²)")
+    tv: float = Field(description="Transmitancia visible del vecino")
+    yhat: float = Field(description="Valor yhat del vecino")
+    distancia: float = Field(description="Distancia en ejes normalizados")
+
+
 class PuntoUsado(BaseModel):
     """Punto del dataset utilizado para la predicción"""
 
     area_vidrio: float = Field(description="Área de vidrio utilizada (m²)")
     tv: float = Field(description="Transmitancia visible utilizada")
+    vecinos: Optional[List[VecinoUsado]] = Field(
+        default=None, description="Vecindario k-NN de la consulta")
+    dispersion_yhat: Optional[float] = Field(
+        default=None, description="Desvío estándar de yhat en el vecindario")
 
 
 class LuzNaturalResponse(BaseModel):
@@ -87,6 +105,10 @@ class LuzNaturalResponse(BaseModel):
         description="Datos pre-formateados para ECharts con colores integrados")
     echarts_heatmap: Dict[str, Any] = Field(
         description="Datos optimizados para ECharts heatmap con grilla interpolada")
+    formato: str = Field(
+        default="json", description="json o compacto (arreglos en base64, ver utils.codificacion)")
+    scatter: Optional[Dict[str, Any]] = Field(
+        default=None, description="Scatter codificado (solo con formato compacto)")
     metrics: List[MetricaOutput] = Field(
         description="Lista de métricas calculadas")
     energia_pct: Optional[int] = Field(
@@ -99,14 +121,94 @@ class LuzNaturalResponse(BaseModel):
     nombre_espacio: Optional[str] = Field(description="Nombre del espacio")
 
 
+class LoteVentanasInput(BaseModel):
+    """Esquema para un lote de ventanas a calcular en una sola pasada"""
+
+    ventanas: List[VentanaInput] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.max_ventanas_lote,
+        description="Ventanas a calcular"
+    )
+    modo_prediccion: Optional[str] = Field(
+        default=None,
+        description="Backend de predicción para las ventanas que no indiquen uno"
+    )
+
+
+class ResultadoVentana(BaseModel):
+    """Resultado compacto de una ventana del lote"""
+
+    indice: int = Field(description="Posición de la ventana en el lote")
+    yhat_pred: Optional[float] = Field(description="Predicción yhat calculada")
+    punto_usado: Optional[Dict[str, float]] = Field(
+        description="Punto (area_vidrio, tv) usado para la predicción")
+    metrics: Optional[Dict[str, int]] = Field(
+        description="Porcentaje por métrica (DA, UDI, sDA, sUDI, DAv_zone)")
+    energia_pct: Optional[int] = Field(
+        description="Porcentaje de energía calculado")
+    nombre_espacio: Optional[str] = Field(description="Nombre del espacio")
+
+
+class LoteResponse(BaseModel):
+    """Esquema de respuesta del cálculo por lotes"""
+
+    ok: bool = Field(description="Indica si el cálculo fue exitoso")
+    total: int = Field(description="Cantidad de ventanas procesadas")
+    resultados: List[ResultadoVentana] = Field(
+        description="Resultados en el mismo orden que las ventanas de entrada")
+
+
+class FilaSimulacion(BaseModel):
+    """Fila de simulación (punto del dataset) a agregar en caliente"""
+
+    area_vidrio: float = Field(..., ge=0, description="Área de vidrio en m²")
+    tv: float = Field(..., ge=0, le=1, description="Transmitancia visible")
+    yhat: float = Field(..., description="Valor simulado")
+
+
+class IngestaFilasInput(BaseModel):
+    """Esquema para agregar filas a un dataset sin reiniciar el servicio"""
+
+    filas: List[FilaSimulacion] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.max_ventanas_lote,
+        description="Filas a agregar al final del CSV"
+    )
+    orientation: Optional[str] = Field(
+        default=None,
+        description="Orientación del dataset destino (por defecto el principal)"
+    )
+    ubicacion: Optional[str] = Field(
+        default=None,
+        description="Ubicación del dataset destino"
+    )
+
+
 class ModelSheetResponse(BaseModel):
     """Esquema para respuesta de model sheet"""
 
     metric: str = Field(description="Nombre de la métrica")
-    image_base64: Optional[str] = Field(description="Imagen en base64")
+    url: Optional[str] = Field(
+        default=None, description="URL de la imagen (incluye el hash como versión)")
+    hash: Optional[str] = Field(
+        default=None, description="SHA-256 del contenido de la imagen")
+    bytes: Optional[int] = Field(default=None, description="Tamaño de la imagen")
+    content_type: Optional[str] = Field(default=None, description="Tipo MIME de la imagen")
+    ancho: Optional[int] = Field(default=None, description="Ancho de la imagen en px")
+    alto: Optional[int] = Field(default=None, description="Alto de la imagen en px")
+    variante: Optional[str] = Field(
+        default=None, description="Variante referenciada (None = original)")
+    variantes: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict, description="Variantes reducidas disponibles (url, hash, tamaño)")
+    image_base64: Optional[str] = Field(
+        default=None, description="Imagen en base64 (solo en modo inline)")
     filename: str = Field(description="Nombre del archivo")
+    generada: bool = Field(
+        default=False, description="La imagen se generó desde las zonas poligonales (sin PNG)")
     description: str = Field(description="Descripción de la métrica")
-    error: Optional[str] = Field(description="Error si no se pudo cargar")
+    error: Optional[str] = Field(default=None, description="Error si no se pudo cargar")
 
 
 class DebugResponse(BaseModel):
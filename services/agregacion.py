@@ -0,0 +1,176 @@
+"""
+Agregación y diezmado vectorizados para datasets de millones de puntos.
+
+Todas las funciones recorren las columnas por bloques de tamaño fijo, de
+modo que la memoria temporal no depende del tamaño del dataset (las
+columnas pueden ser memmaps de un .luzbin).
+
+- agregar_en_grilla: media/mínimo/máximo/conteo de los puntos por celda
+- diezmar_por_densidad: subconjunto de puntos acotado a un presupuesto,
+  que conserva las zonas poco densas y submuestrea las densas
+- estadisticas_columna: mínimo, máximo y media ignorando NaN
+"""
+
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+from utils.grilla import Eje, indices_cercanos
+
+TAMANO_BLOQUE = 1_000_000
+
+
+def _bloques(n: int, tamano: int) -> Iterator[slice]:
+    tamano = max(1, int(tamano))
+    for inicio in range(0, n, tamano):
+        yield slice(inicio, min(inicio + tamano, n))
+
+
+def indices_celda(valores: np.ndarray, minimo: float, maximo: float, n: int) -> np.ndarray:
+    """
+    Índice del centro de celda más cercano en un eje de n centros equiespaciados
+    entre minimo y maximo (mismo criterio que utils.grilla; fuera del rango van al borde)
+    """
+    return indices_cercanos(valores, Eje(minimo, maximo, n).coords)
+
+
+def agregar_en_grilla(x: np.ndarray, y: np.ndarray, z: np.ndarray,
+                      x_rango: Tuple[float, float, int], y_rango: Tuple[float, float, int],
+                      tamano_bloque: int = TAMANO_BLOQUE) -> Dict[str, np.ndarray]:
+    """
+    Agrega z por celda de una grilla regular
+
+    Args:
+        x, y, z: Columnas del dataset (mismo largo)
+        x_rango: (mínimo, máximo, cantidad de centros) del eje x
+        y_rango: (mínimo, máximo, cantidad de centros) del eje y
+        tamano_bloque: Puntos procesados por pasada
+
+    Returns:
+        Dict con arrays (nx, ny): media, minimo, maximo (NaN en celdas
+        vacías) y conteo. Los puntos con algún valor NaN se ignoran.
+    """
+    nx, ny = int(x_rango[2]), int(y_rango[2])
+    celdas = nx * ny
+    suma = np.zeros(celdas)
+    conteo = np.zeros(celdas, dtype=np.int64)
+    minimo = np.full(celdas, np.inf)
+    maximo = np.full(celdas, -np.inf)
+
+    for bloque in _bloques(len(z), tamano_bloque):
+        bx = np.asarray(x[bloque], dtype=np.float64)
+        by = np.asarray(y[bloque], dtype=np.float64)
+        bz = np.asarray(z[bloque], dtype=np.float64)
+        validos = np.isfinite(bx) & np.isfinite(by) & np.isfinite(bz)
+        if not validos.all():
+            bx, by, bz = bx[validos], by[validos], bz[validos]
+
+        celda = indices_celda(bx, *x_rango) * ny + indices_celda(by, *y_rango)
+        suma += np.bincount(celda, weights=bz, minlength=celdas)
+        conteo += np.bincount(celda, minlength=celdas)
+        np.minimum.at(minimo, celda, bz)
+        np.maximum.at(maximo, celda, bz)
+
+    vacias = conteo == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.where(vacias, np.nan, suma / conteo)
+    minimo[vacias] = np.nan
+    maximo[vacias] = np.nan
+
+    return {
+        "media": media.reshape(nx, ny),
+        "minimo": minimo.reshape(nx, ny),
+        "maximo": maximo.reshape(nx, ny),
+        "conteo": conteo.reshape(nx, ny),
+    }
+
+
+def cuota_por_celda(conteo: np.ndarray, presupuesto: int) -> int:
+    """
+    Máximo de puntos por celda q tal que sum(min(conteo, q)) <= presupuesto
+
+    Las celdas con menos de q puntos se conservan completas; el resto del
+    presupuesto se reparte por igual entre las densas.
+    """
+    ordenados = np.sort(conteo[conteo > 0])
+    if ordenados.size == 0 or ordenados.sum() <= presupuesto:
+        return int(ordenados[-1]) if ordenados.size else 0
+
+    # Con q = ordenados[i], las celdas i.. aportan q cada una
+    acumulado = np.concatenate(([0], np.cumsum(ordenados)[:-1]))
+    restantes = ordenados.size - np.arange(ordenados.size)
+    total = acumulado + ordenados * restantes
+    i = int(np.searchsorted(total, presupuesto, side="right")) - 1
+    if i < 0:
+        return max(1, presupuesto // ordenados.size)
+    # Entre ordenados[i] y ordenados[i + 1] el total crece de a restantes[i + 1]
+    extra = (presupuesto - total[i]) // restantes[i + 1] if i + 1 < ordenados.size else 0
+    return int(ordenados[i] + extra)
+
+
+def diezmar_por_densidad(x: np.ndarray, y: np.ndarray, presupuesto: int,
+                         x_rango: Tuple[float, float, int], y_rango: Tuple[float, float, int],
+                         tamano_bloque: int = TAMANO_BLOQUE) -> np.ndarray:
+    """
+    Elige a lo sumo presupuesto puntos repartidos según la densidad
+
+    Se cuentan los puntos por celda, se calcula la cuota por celda
+    (cuota_por_celda) y dentro de cada celda se toman puntos espaciados
+    de forma uniforme en el orden del dataset. Es determinístico y se
+    hace en dos pasadas por bloques.
+
+    Returns:
+        Índices (ordenados) de los puntos conservados
+    """
+    nx, ny = int(x_rango[2]), int(y_rango[2])
+    n = len(x)
+    if n <= presupuesto:
+        return np.arange(n)
+
+    def celdas(bloque: slice) -> np.ndarray:
+        return (indices_celda(x[bloque], *x_rango) * ny
+                + indices_celda(y[bloque], *y_rango))
+
+    conteo = np.zeros(nx * ny, dtype=np.int64)
+    for bloque in _bloques(n, tamano_bloque):
+        conteo += np.bincount(celdas(bloque), minlength=nx * ny)
+
+    q = cuota_por_celda(conteo, presupuesto)
+    vistos = np.zeros(nx * ny, dtype=np.int64)
+    elegidos = []
+
+    for bloque in _bloques(n, tamano_bloque):
+        c = celdas(bloque)
+        # Rango de cada punto dentro de su celda, continuando desde bloques previos
+        orden = np.argsort(c, kind="stable")
+        c_ord = c[orden]
+        inicio_grupo = np.searchsorted(c_ord, c_ord, side="left")
+        rango = np.empty_like(c)
+        rango[orden] = np.arange(c.size) - inicio_grupo + vistos[c_ord]
+        vistos += np.bincount(c, minlength=nx * ny)
+
+        # Se toma el punto si cruza un múltiplo de conteo/q: q puntos equiespaciados
+        total = conteo[c]
+        cuota = np.minimum(total, q)
+        toma = (rango + 1) * cuota // total > rango * cuota // total
+        elegidos.append(np.flatnonzero(toma) + bloque.start)
+
+    return np.concatenate(elegidos) if elegidos else np.empty(0, dtype=np.intp)
+
+
+def estadisticas_columna(valores: np.ndarray,
+                         tamano_bloque: int = TAMANO_BLOQUE) -> Dict[str, float]:
+    """Mínimo, máximo y media ignorando NaN (NaN si no hay valores válidos)"""
+    minimo, maximo, suma, conteo = np.inf, -np.inf, 0.0, 0
+    for bloque in _bloques(len(valores), tamano_bloque):
+        b = np.asarray(valores[bloque], dtype=np.float64)
+        b = b[~np.isnan(b)]
+        if b.size:
+            minimo = min(minimo, float(b.min()))
+            maximo = max(maximo, float(b.max()))
+            suma += float(b.sum())
+            conteo += b.size
+
+    if conteo == 0:
+        return {"min": float("nan"), "max": float("nan"), "mean": float("nan")}
+    return {"min": minimo, "max": maximo, "mean": suma / conteo}
@@ -0,0 +1,740 @@
+"""
+Almacén de puntos de simulación en SQLite con índice espacial R*Tree.
+
+Alternativa al CSV para servir datasets grandes con memoria acotada: los
+puntos viven en un único archivo (varios escenarios en la misma base,
+diferenciados por la columna dataset) y las búsquedas de vecino más
+cercano y por rango usan el índice en lugar de recorrer todas las filas.
+
+Los agregados de los heatmaps (por celda), el scatter diezmado y las
+estadísticas por columna también se calculan en SQL, sin traer las filas.
+
+El CSV sigue siendo la fuente de importación:
+    python -m services.almacen_sqlite importar datos_sudi_limpio.csv [--db datos_luz.sqlite] [--dataset nombre]
+    python -m services.almacen_sqlite listar [--db datos_luz.sqlite]
+
+Esquema:
+    datasets(id, nombre, csv_origen, filas, estadísticas por eje)
+    puntos(id, dataset_id, area_vidrio, tv, yhat)   -- id conserva el orden del CSV
+    puntos_rtree(id, area, tv, dataset)              -- R*Tree 3D; dataset como eje fijo
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.agregacion import cuota_por_celda, indices_celda
+from utils.grilla import Eje
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL UNIQUE,
+    csv_origen TEXT,
+    filas INTEGER NOT NULL,
+    area_min REAL, area_max REAL, area_media REAL, area_std REAL,
+    tv_min REAL, tv_max REAL, tv_media REAL, tv_std REAL
+);
+CREATE TABLE IF NOT EXISTS puntos (
+    id INTEGER PRIMARY KEY,
+    dataset_id INTEGER NOT NULL REFERENCES datasets(id),
+    area_vidrio REAL,
+    tv REAL,
+    yhat REAL
+);
+CREATE INDEX IF NOT EXISTS puntos_dataset ON puntos(dataset_id, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS puntos_rtree USING rtree(
+    id, area_min, area_max, tv_min, tv_max, ds_min, ds_max
+);
+"""
+
+# Puntos esperados en la primera caja de búsqueda del vecino más cercano
+_PUNTOS_CAJA_INICIAL = 16
+
+# Puntos esperados por lado de bloque en las búsquedas nearest en lote
+# (una consulta R*Tree por bloque de consultas, ~_PUNTOS_LADO_BLOQUE² puntos)
+_PUNTOS_LADO_BLOQUE = 32
+# Consultas mínimas para resolver un bloque con una sola búsqueda: con menos,
+# buscar cada consulta por separado lee menos filas (~64 por consulta contra
+# ~1600 por bloque) y es más rápido (medido con 1M de puntos)
+_MIN_CONSULTAS_BLOQUE = 16
+# Consultas x candidatos evaluados a la vez al buscar el mínimo de un bloque
+_MAX_PARES_BLOQUE = 4_000_000
+# Puntos por celda al ordenar las inserciones en el R*Tree
+_PUNTOS_CELDA_RTREE = 64
+# Filas por fetchmany al leer las columnas completas de un dataset
+_FILAS_LECTURA = 65536
+
+_COLUMNAS = ("area_vidrio", "tv", "yhat")
+# Filas que agregacion.agregar_en_grilla no ignora (NULL es el NaN del CSV; 9e999 es infinito)
+_FILAS_FINITAS = " AND ".join(f"abs({c}) < 9e999" for c in _COLUMNAS)
+
+
+def nombre_dataset(csv_path: str) -> str:
+    """Nombre con el que se importa un CSV (su nombre de archivo sin extensión)"""
+    return os.path.splitext(os.path.basename(csv_path))[0]
+
+
+class AlmacenSQLite:
+    """Acceso de solo lectura (salvo importar y agregar filas) a una base de puntos"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._datasets: Optional[Dict[str, Dict[str, float]]] = None
+        self._mtime: Optional[float] = None
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.ruta):
+                raise FileNotFoundError(
+                    f"No se encontró la base SQLite en: {self.ruta}"
+                )
+            conn = sqlite3.connect(f"file:{self.ruta}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def datasets(self) -> Dict[str, Dict[str, float]]:
+        """Datasets importados con sus estadísticas por eje (se relee si la base cambia)"""
+        conn = self._conexion()
+        mtime = os.path.getmtime(self.ruta)
+        if self._datasets is None or mtime != self._mtime:
+            conn.row_factory = sqlite3.Row
+            try:
+                filas = conn.execute("SELECT * FROM datasets ORDER BY id").fetchall()
+            finally:
+                conn.row_factory = None
+            self._datasets = {f["nombre"]: dict(f) for f in filas}
+            self._mtime = mtime
+        return self._datasets
+
+    def contiene(self, dataset: str) -> bool:
+        try:
+            return dataset in self.datasets()
+        except (FileNotFoundError, sqlite3.Error):
+            return False
+
+    def _info(self, dataset: str) -> Dict[str, float]:
+        info = self.datasets().get(dataset)
+        if info is None:
+            raise ValueError(
+                f"Dataset inexistente en {self.ruta}: {dataset}. "
+                f"Opciones válidas: {list(self.datasets().keys())}"
+            )
+        return info
+
+    def columnas(self, dataset: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (area_vidrio, tv, yhat) completos, en el orden de importación
+
+        Se leen de a _FILAS_LECTURA filas sobre arrays ya reservados: en
+        memoria quedan solo las columnas (24 bytes por fila), nunca una
+        tupla de Python por fila.
+        """
+        info = self._info(dataset)
+        conn = self._conexion()
+        # Conteo y lectura en la misma transacción: ven las mismas filas aunque se agreguen otras
+        conn.execute("BEGIN")
+        try:
+            n = conn.execute(
+                "SELECT COUNT(*) FROM puntos WHERE dataset_id = ?", (info["id"],)
+            ).fetchone()[0]
+            columnas = tuple(np.empty(n) for _ in _COLUMNAS)
+            cursor = conn.execute(
+                "SELECT area_vidrio, tv, yhat FROM puntos WHERE dataset_id = ? ORDER BY id",
+                (info["id"],)
+            )
+            inicio = 0
+            while True:
+                filas = cursor.fetchmany(_FILAS_LECTURA)
+                if not filas:
+                    break
+                # None (NULL) se convierte en NaN
+                bloque = np.array(filas, dtype=np.float64)
+                for destino, valores in zip(columnas, bloque.T):
+                    destino[inicio:inicio + len(filas)] = valores
+                inicio += len(filas)
+        finally:
+            conn.execute("COMMIT")
+        return columnas
+
+    def estadisticas_columnas(self, dataset: str) -> Dict[str, Dict[str, float]]:
+        """
+        Mínimo, máximo y media de cada columna ignorando NaN, calculados en SQL
+
+        Returns:
+            Dict columna -> {"min", "max", "mean"} (NaN si no hay valores),
+            igual que agregacion.estadisticas_columna salvo el último bit de
+            la media (orden de la suma)
+        """
+        info = self._info(dataset)
+        fila = self._conexion().execute(
+            "SELECT " + ", ".join(f"MIN({c}), MAX({c}), AVG({c})" for c in _COLUMNAS)
+            + " FROM puntos WHERE dataset_id = ?",
+            (info["id"],)
+        ).fetchone()
+        valores = [float("nan") if v is None else float(v) for v in fila]
+        return {
+            columna: dict(zip(("min", "max", "mean"), valores[3 * i:3 * i + 3]))
+            for i, columna in enumerate(_COLUMNAS)
+        }
+
+    def agregar_en_grilla(self, dataset: str, x_rango: Tuple[float, float, int],
+                          y_rango: Tuple[float, float, int]) -> Dict[str, np.ndarray]:
+        """
+        agregacion.agregar_en_grilla de area_vidrio × tv calculado en SQL
+
+        Un GROUP BY por celda: de la base sale una fila por celda ocupada y
+        no las columnas. Las celdas son las mismas que en memoria (ver
+        _expresion_celda); las medias pueden diferir en el último bit por
+        el orden de la suma.
+
+        Returns:
+            Dict con arrays (nx, ny): media, minimo, maximo (NaN en celdas
+            vacías) y conteo
+        """
+        info = self._info(dataset)
+        nx, ny = int(x_rango[2]), int(y_rango[2])
+        celda, parametros = _expresion_celdas(x_rango, y_rango)
+        filas = self._conexion().execute(
+            f"""
+            SELECT {celda} AS celda, COUNT(*), SUM(yhat), MIN(yhat), MAX(yhat)
+            FROM puntos
+            WHERE dataset_id = ? AND {_FILAS_FINITAS}
+            GROUP BY celda
+            """,
+            (*parametros, info["id"])
+        ).fetchall()
+
+        salida = {nombre: np.full(nx * ny, np.nan) for nombre in ("media", "minimo", "maximo")}
+        conteo = np.zeros(nx * ny, dtype=np.int64)
+        if filas:
+            celdas, n, suma, minimo, maximo = np.array(filas, dtype=np.float64).T
+            celdas = celdas.astype(np.intp)
+            conteo[celdas] = n
+            salida["media"][celdas] = suma / n
+            salida["minimo"][celdas] = minimo
+            salida["maximo"][celdas] = maximo
+        salida["conteo"] = conteo
+        return {nombre: arr.reshape(nx, ny) for nombre, arr in salida.items()}
+
+    def diezmar_por_densidad(self, dataset: str, presupuesto: int,
+                             x_rango: Tuple[float, float, int],
+                             y_rango: Tuple[float, float, int]) -> np.ndarray:
+        """
+        agregacion.diezmar_por_densidad calculado en SQL
+
+        Una consulta cuenta los puntos por celda (para la cuota) y otra
+        numera los puntos dentro de cada celda con ROW_NUMBER() y devuelve
+        solo los elegidos: a lo sumo presupuesto filas.
+
+        Returns:
+            Array (m, 3) de area_vidrio, tv, yhat en el orden de importación
+        """
+        info = self._info(dataset)
+        celda, parametros = _expresion_celdas(x_rango, y_rango)
+        conn = self._conexion()
+        if info["filas"] <= presupuesto:
+            filas = conn.execute(
+                "SELECT area_vidrio, tv, yhat FROM puntos WHERE dataset_id = ? ORDER BY id",
+                (info["id"],)
+            ).fetchall()
+            return np.array(filas, dtype=np.float64).reshape(-1, 3)
+
+        conteo = np.array(conn.execute(
+            f"SELECT COUNT(*) FROM puntos WHERE dataset_id = ? GROUP BY {celda}",
+            (info["id"], *parametros)
+        ).fetchall(), dtype=np.int64).ravel()
+        q = cuota_por_celda(conteo, presupuesto)
+
+        # Mismo criterio que en memoria: q puntos equiespaciados por celda, en el orden del dataset
+        filas = conn.execute(
+            f"""
+            WITH rangos AS (
+                SELECT id, area_vidrio, tv, yhat,
+                       ROW_NUMBER() OVER celdas - 1 AS rango,
+                       COUNT(*) OVER celdas AS total
+                FROM puntos
+                WHERE dataset_id = ?
+                WINDOW celdas AS (PARTITION BY {celda} ORDER BY id
+                                  RANGE BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+            )
+            SELECT area_vidrio, tv, yhat FROM rangos
+            WHERE (rango + 1) * MIN(total, ?) / total > rango * MIN(total, ?) / total
+            ORDER BY id
+            """,
+            (info["id"], *parametros, q, q)
+        ).fetchall()
+        return np.array(filas, dtype=np.float64).reshape(-1, 3)
+
+    def _escala(self, info: Dict[str, float], escala: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(offset, factor) por eje, con el mismo criterio que kdtree.escala_por_eje"""
+        if escala == "ninguna" or not info["filas"]:
+            return np.zeros(2), np.ones(2)
+        if escala == "rango":
+            offset = np.array([info["area_min"], info["tv_min"]])
+            ancho = np.array([info["area_max"] - info["area_min"], info["tv_max"] - info["tv_min"]])
+        else:
+            offset = np.array([info["area_media"], info["tv_media"]])
+            ancho = np.array([info["area_std"], info["tv_std"]])
+        ancho = np.where(ancho > 0, ancho, 1.0)
+        return offset, 1.0 / ancho
+
+    def _en_caja(self, dataset_id: int, area_min: float, area_max: float,
+                 tv_min: float, tv_max: float) -> List[Tuple[int, float, float, float]]:
+        return self._conexion().execute(
+            """
+            SELECT p.id, p.area_vidrio, p.tv, p.yhat
+            FROM puntos_rtree r JOIN puntos p ON p.id = r.id
+            WHERE r.area_max >= ? AND r.area_min <= ?
+              AND r.tv_max >= ? AND r.tv_min <= ?
+              AND r.ds_min <= ? AND r.ds_max >= ?
+            """,
+            (area_min, area_max, tv_min, tv_max, dataset_id, dataset_id)
+        ).fetchall()
+
+    def rango(self, dataset: str, area_min: float, area_max: float,
+              tv_min: float, tv_max: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Puntos dentro de la caja [area_min, area_max] × [tv_min, tv_max]
+
+        Returns:
+            Tuple (area_vidrio, tv, yhat) en el orden de importación
+        """
+        info = self._info(dataset)
+        filas = self._en_caja(info["id"], area_min, area_max, tv_min, tv_max)
+        # El R*Tree guarda float32 redondeando hacia afuera: se filtra exacto
+        filas = sorted(
+            f for f in filas
+            if area_min <= f[1] <= area_max and tv_min <= f[2] <= tv_max
+        )
+        arr = np.array([f[1:] for f in filas], dtype=np.float64).reshape(-1, 3)
+        return arr[:, 0], arr[:, 1], arr[:, 2]
+
+    def k_vecinos(self, dataset: str, area_vidrio: float, tv: float, k: int = 1,
+                  escala: str = "rango") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los k puntos más cercanos agrandando una caja alrededor de la consulta
+
+        Las distancias se miden en ejes normalizados (ver kdtree.escala_por_eje).
+        Una caja de semiancho r (normalizado) alcanza: cualquier punto fuera de
+        ella está a distancia mayor que r. A igual distancia gana el primero
+        importado; en puntos medios exactos entre dos niveles puede diferir
+        del lattice en memoria por redondeo de la normalización.
+
+        Returns:
+            Tuple (distancias (k,), filas (k, 3) con area_vidrio, tv, yhat)
+
+        Raises:
+            ValueError: Si el dataset no tiene puntos válidos
+        """
+        info = self._info(dataset)
+        if not info["filas"] or info["area_min"] is None:
+            raise ValueError("No se encontró un punto de predicción válido.")
+
+        k = max(1, min(int(k), int(info["filas"])))
+        offset, factor = self._escala(info, escala)
+        q = (np.array([area_vidrio, tv], dtype=np.float64) - offset) * factor
+
+        lo = (np.array([info["area_min"], info["tv_min"]]) - offset) * factor
+        hi = (np.array([info["area_max"], info["tv_max"]]) - offset) * factor
+        fuera = float(np.hypot(*np.maximum(0, np.maximum(lo - q, q - hi))))
+        diagonal = float(np.hypot(*(hi - lo)))
+        densidad = math.sqrt(max(float(np.prod(hi - lo)), 1e-12) / info["filas"])
+        r = fuera + densidad * math.sqrt(max(k, _PUNTOS_CAJA_INICIAL))
+
+        while True:
+            semi = r / factor
+            filas = self._en_caja(
+                info["id"],
+                area_vidrio - semi[0], area_vidrio + semi[0],
+                tv - semi[1], tv + semi[1]
+            )
+            if filas:
+                pts = np.array(filas, dtype=np.float64)
+                d = np.hypot(*((pts[:, 1:3] - offset) * factor - q).T)
+                orden = np.lexsort((pts[:, 0], d))[:k]
+                if orden.size == k and d[orden[-1]] <= r:
+                    return d[orden], pts[orden, 1:]
+            if r > fuera + diagonal:
+                # La caja ya cubre todo el dataset
+                if filas:
+                    return d[orden], pts[orden, 1:]
+                raise ValueError("No se encontró un punto de predicción válido.")
+            r *= 2
+
+    def nearest(self, dataset: str, area_vidrio, tv, escala: str = "rango"
+                ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vecino más cercano para una o muchas consultas
+
+        Las consultas se agrupan en bloques (cuadrados de ~_PUNTOS_LADO_BLOQUE
+        puntos de lado en ejes normalizados) y cada bloque con al menos
+        _MIN_CONSULTAS_BLOQUE consultas hace una sola búsqueda R*Tree: la caja
+        del bloque agrandada en r alcanza para toda consulta del bloque cuyo
+        vecino quede a distancia <= r. Las demás (bloques con pocas consultas,
+        consultas fuera del dominio o en zonas vacías) se resuelven una por
+        una con k_vecinos. El desempate es el mismo: el primero importado.
+
+        Returns:
+            Tuple de arrays (yhat, area_vidrio_usado, tv_usado)
+
+        Raises:
+            ValueError: Si el dataset no tiene puntos válidos
+        """
+        area_vidrio, tv = np.broadcast_arrays(
+            np.asarray(area_vidrio, dtype=np.float64), np.asarray(tv, dtype=np.float64)
+        )
+        forma = area_vidrio.shape
+        consultas = np.column_stack([area_vidrio.ravel(), tv.ravel()])
+        salida = np.full((consultas.shape[0], 3), np.nan)
+
+        info = self._info(dataset)
+        if not info["filas"] or info["area_min"] is None:
+            raise ValueError("No se encontró un punto de predicción válido.")
+
+        offset, factor = self._escala(info, escala)
+        q = (consultas - offset) * factor
+        lo = (np.array([info["area_min"], info["tv_min"]]) - offset) * factor
+        hi = (np.array([info["area_max"], info["tv_max"]]) - offset) * factor
+        densidad = math.sqrt(max(float(np.prod(hi - lo)), 1e-12) / info["filas"])
+        lado = densidad * _PUNTOS_LADO_BLOQUE
+        r = densidad * math.sqrt(_PUNTOS_CAJA_INICIAL)
+
+        finitas = np.isfinite(q).all(axis=1)
+        pendientes = np.flatnonzero(~finitas).tolist()
+        indices = np.flatnonzero(finitas)
+        bloques, inversa = np.unique(
+            np.floor(q[indices] / lado), axis=0, return_inverse=True
+        )
+        inversa = inversa.ravel()
+        orden = np.argsort(inversa, kind="stable")
+        cortes = np.cumsum(np.bincount(inversa, minlength=len(bloques)))[:-1]
+        for bloque, miembros in zip(bloques, np.split(indices[orden], cortes)):
+            if miembros.size < _MIN_CONSULTAS_BLOQUE:
+                pendientes.extend(miembros.tolist())
+                continue
+            caja_lo = (bloque * lado - r) / factor + offset
+            caja_hi = ((bloque + 1) * lado + r) / factor + offset
+            filas = self._en_caja(info["id"], caja_lo[0], caja_hi[0], caja_lo[1], caja_hi[1])
+            if not filas:
+                pendientes.extend(miembros.tolist())
+                continue
+            pts = np.array(filas, dtype=np.float64)
+            pts = pts[np.argsort(pts[:, 0], kind="stable")]
+            normalizados = (pts[:, 1:3] - offset) * factor
+            paso = max(1, _MAX_PARES_BLOQUE // pts.shape[0])
+            for inicio in range(0, miembros.size, paso):
+                grupo = miembros[inicio:inicio + paso]
+                d = np.hypot(
+                    normalizados[None, :, 0] - q[grupo, None, 0],
+                    normalizados[None, :, 1] - q[grupo, None, 1]
+                )
+                # argmin devuelve el primer mínimo: el de menor id
+                mejor = d.argmin(axis=1)
+                alcanza = d[np.arange(grupo.size), mejor] <= r
+                salida[grupo[alcanza]] = pts[mejor[alcanza], 1:]
+                pendientes.extend(grupo[~alcanza].tolist())
+
+        for pos in pendientes:
+            _, filas = self.k_vecinos(dataset, consultas[pos, 0], consultas[pos, 1], 1, escala)
+            salida[pos] = filas[0]
+
+        salida = salida.reshape(forma + (3,))
+        return salida[..., 2], salida[..., 0], salida[..., 1]
+
+    def agregar(self, dataset: str, area_vidrio: np.ndarray, tv: np.ndarray,
+                yhat: np.ndarray) -> int:
+        """
+        Agrega filas a un dataset ya importado (al final, en el orden recibido)
+
+        Actualiza el conteo de filas y las estadísticas por eje, así las
+        escalas de vecino más cercano quedan igual que al recargar el dataset.
+
+        Returns:
+            Cantidad de filas del dataset después de agregar
+
+        Raises:
+            ValueError: Si el dataset no está importado en la base
+        """
+        info = self._info(dataset)
+        dataset_id = info["id"]
+        area, tv, yhat = (np.asarray(c, dtype=np.float64).ravel() for c in (area_vidrio, tv, yhat))
+        validos = np.isfinite(area) & np.isfinite(tv)
+
+        conn = sqlite3.connect(self.ruta)
+        try:
+            with conn:
+                inicio = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM puntos").fetchone()[0]
+                ids = np.arange(inicio, inicio + area.size)
+                _insertar_puntos(conn, dataset_id, ids, area, tv, yhat, validos)
+                filas = _actualizar_estadisticas(conn, dataset_id)
+        finally:
+            conn.close()
+
+        # Las lecturas del hilo usan otra conexión: se fuerza a releer los datasets
+        self._datasets = None
+        return filas
+
+    def cerrar(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _a_orden(valores: np.ndarray) -> np.ndarray:
+    """float64 -> uint64 con el mismo orden (los float representables, consecutivos)"""
+    bits = valores.view(np.uint64)
+    return np.where(bits & _BIT_SIGNO, ~bits, bits | _BIT_SIGNO)
+
+
+def _desde_orden(orden: np.ndarray) -> np.ndarray:
+    return np.where(orden & _BIT_SIGNO, orden ^ _BIT_SIGNO, ~orden).view(np.float64)
+
+
+_BIT_SIGNO = np.uint64(1 << 63)
+
+
+def _umbrales_celda(minimo: float, maximo: float, n: int) -> np.ndarray:
+    """
+    Para cada celda i < n - 1, el mayor float con indices_celda <= i
+
+    Un valor cae en la primera celda cuyo umbral no supera. El umbral i
+    está entre los centros i e i + 1 y se encuentra bisecando sobre los
+    float representables de ese tramo, así los empates en el punto medio
+    se resuelven igual que en memoria.
+    """
+    coords = Eje(minimo, maximo, n).coords
+    if n < 2:
+        return np.empty(0)
+    if not coords[-1] > coords[0]:
+        # Centros iguales: indices_celda da 0 hasta el centro y n - 2 después
+        return np.array([coords[0]] * (n - 2) + [np.finfo(np.float64).max])
+
+    celdas = np.arange(n - 1)
+    abajo, arriba = _a_orden(coords[:-1]), _a_orden(coords[1:])
+    while np.any(arriba - abajo > 1):
+        medio = abajo + (arriba - abajo) // np.uint64(2)
+        adentro = indices_celda(_desde_orden(medio), minimo, maximo, n) <= celdas
+        abajo = np.where(adentro, medio, abajo)
+        arriba = np.where(adentro, arriba, medio)
+    return _desde_orden(abajo)
+
+
+def _expresion_celda(columna: str, rango: Tuple[float, float, int]) -> Tuple[str, List[float]]:
+    """
+    indices_celda de una columna como expresión SQL con parámetros
+
+    CASE anidados que hacen una búsqueda binaria sobre _umbrales_celda.
+    NULL (NaN) termina en la última celda, igual que en memoria; solo los
+    infinitos pueden caer en otra celda (la grilla agregada los ignora).
+    """
+    n = int(rango[2])
+    umbrales = _umbrales_celda(float(rango[0]), float(rango[1]), n).tolist()
+
+    def rama(inicio: int, fin: int) -> Tuple[str, List[float]]:
+        if inicio == fin:
+            return str(inicio), []
+        medio = (inicio + fin) // 2
+        izquierda, p_izquierda = rama(inicio, medio)
+        derecha, p_derecha = rama(medio + 1, fin)
+        return (f"CASE WHEN {columna} <= ? THEN {izquierda} ELSE {derecha} END",
+                [umbrales[medio], *p_izquierda, *p_derecha])
+
+    return rama(0, n - 1)
+
+
+def _expresion_celdas(x_rango: Tuple[float, float, int],
+                      y_rango: Tuple[float, float, int]) -> Tuple[str, List[float]]:
+    """Celda (i * ny + j) de cada punto sobre area_vidrio × tv, como en agregacion"""
+    x, p_x = _expresion_celda("area_vidrio", x_rango)
+    y, p_y = _expresion_celda("tv", y_rango)
+    return f"(({x}) * {int(y_rango[2])} + ({y}))", [*p_x, *p_y]
+
+
+def _orden_espacial(area: np.ndarray, tv: np.ndarray) -> np.ndarray:
+    """
+    Orden de inserción en el R*Tree: celdas de ~_PUNTOS_CELDA_RTREE puntos
+    recorridas en serpentina
+
+    El R*Tree de SQLite se arma inserción por inserción; con los puntos en
+    el orden del CSV (o al azar) los nodos quedan solapados y una búsqueda
+    chica recorre buena parte del árbol (~50 ms con 1M de puntos contra
+    ~0.1 ms insertando por celdas).
+    """
+    if area.size == 0:
+        return np.arange(0)
+    celdas = max(1, int(math.sqrt(area.size / _PUNTOS_CELDA_RTREE)))
+    ca, ct = (
+        np.minimum((eje - eje.min()) / (np.ptp(eje) or 1.0) * celdas, celdas - 1).astype(np.int64)
+        for eje in (area, tv)
+    )
+    return np.lexsort((np.where(ca % 2 == 1, celdas - 1 - ct, ct), ca))
+
+
+def _insertar_puntos(conn: sqlite3.Connection, dataset_id: int, ids: np.ndarray,
+                     area: np.ndarray, tv: np.ndarray, yhat: np.ndarray,
+                     validos: np.ndarray) -> None:
+    """Inserta puntos (NaN como NULL) y, los que tienen área y TV, en el R*Tree"""
+    conn.executemany(
+        "INSERT INTO puntos (id, dataset_id, area_vidrio, tv, yhat) VALUES (?, ?, ?, ?, ?)",
+        (
+            (int(i), dataset_id, *(None if math.isnan(v) else v for v in fila))
+            for i, fila in zip(ids, zip(area.tolist(), tv.tolist(), yhat.tolist()))
+        )
+    )
+    ids, area, tv = ids[validos], area[validos], tv[validos]
+    orden = _orden_espacial(area, tv)
+    conn.executemany(
+        "INSERT INTO puntos_rtree VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (int(i), a, a, t, t, dataset_id, dataset_id)
+            for i, a, t in zip(ids[orden].tolist(), area[orden].tolist(), tv[orden].tolist())
+        )
+    )
+
+
+def _actualizar_estadisticas(conn: sqlite3.Connection, dataset_id: int) -> int:
+    """
+    Recalcula en SQL filas y min/max/media/desvío (poblacional) por eje
+
+    El desvío se calcula en dos pasadas (media y luego desvíos cuadráticos)
+    para no perder precisión; no carga las columnas en memoria.
+
+    Returns:
+        Cantidad de filas del dataset
+    """
+    validos = "dataset_id = ? AND area_vidrio IS NOT NULL AND tv IS NOT NULL"
+    filas = conn.execute("SELECT COUNT(*) FROM puntos WHERE dataset_id = ?", (dataset_id,)).fetchone()[0]
+    area_min, area_max, area_media, tv_min, tv_max, tv_media = conn.execute(
+        f"SELECT MIN(area_vidrio), MAX(area_vidrio), AVG(area_vidrio), MIN(tv), MAX(tv), AVG(tv) "
+        f"FROM puntos WHERE {validos}", (dataset_id,)
+    ).fetchone()
+    area_std = tv_std = None
+    if area_media is not None:
+        area_var, tv_var = conn.execute(
+            f"SELECT AVG((area_vidrio - ?) * (area_vidrio - ?)), AVG((tv - ?) * (tv - ?)) "
+            f"FROM puntos WHERE {validos}",
+            (area_media, area_media, tv_media, tv_media, dataset_id)
+        ).fetchone()
+        area_std, tv_std = math.sqrt(area_var), math.sqrt(tv_var)
+    conn.execute(
+        """
+        UPDATE datasets SET filas = ?,
+            area_min = ?, area_max = ?, area_media = ?, area_std = ?,
+            tv_min = ?, tv_max = ?, tv_media = ?, tv_std = ?
+        WHERE id = ?
+        """,
+        (filas, area_min, area_max, area_media, area_std,
+         tv_min, tv_max, tv_media, tv_std, dataset_id)
+    )
+    return filas
+
+
+def importar_csv(csv_path: str, db_path: str, dataset: Optional[str] = None) -> Dict[str, object]:
+    """
+    Importa (o reemplaza) un dataset CSV en la base SQLite
+
+    Args:
+        csv_path: CSV de simulación con area_vidrio, tv, yhat
+        db_path: Base SQLite (se crea si no existe)
+        dataset: Nombre del escenario (por defecto el nombre del CSV)
+
+    Returns:
+        Dict con el nombre del dataset y la cantidad de filas importadas
+
+    Raises:
+        FileNotFoundError: Si no se encuentra el CSV
+        ValueError: Si hay errores de lectura o faltan columnas requeridas
+    """
+    # Import diferido: services.dataset usa este módulo como backend
+    from services.dataset import cargar_snapshot_csv
+
+    snapshot = cargar_snapshot_csv(csv_path)
+    dataset = dataset or nombre_dataset(csv_path)
+    area, tv, yhat = (np.asarray(c, dtype=np.float64) for c in (snapshot.area_vidrio, snapshot.tv, snapshot.yhat))
+
+    validos = np.isfinite(area) & np.isfinite(tv)
+    stats = []
+    for eje in (area[validos], tv[validos]):
+        if eje.size:
+            stats += [float(eje.min()), float(eje.max()), float(eje.mean()), float(eje.std())]
+        else:
+            stats += [None] * 4
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.executescript(ESQUEMA)
+            previo = conn.execute("SELECT id FROM datasets WHERE nombre = ?", (dataset,)).fetchone()
+            if previo is not None:
+                conn.execute("DELETE FROM puntos_rtree WHERE id IN (SELECT id FROM puntos WHERE dataset_id = ?)", previo)
+                conn.execute("DELETE FROM puntos WHERE dataset_id = ?", previo)
+                conn.execute("DELETE FROM datasets WHERE id = ?", previo)
+
+            cursor = conn.execute(
+                """
+                INSERT INTO datasets (nombre, csv_origen, filas,
+                    area_min, area_max, area_media, area_std,
+                    tv_min, tv_max, tv_media, tv_std)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (dataset, os.path.basename(csv_path), int(area.size), *stats)
+            )
+            dataset_id = cursor.lastrowid
+
+            inicio = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM puntos").fetchone()[0]
+            ids = np.arange(inicio, inicio + area.size)
+            _insertar_puntos(conn, dataset_id, ids, area, tv, yhat, validos)
+    finally:
+        conn.close()
+
+    return {"dataset": dataset, "filas": int(area.size)}
+
+
+# Almacenes abiertos por ruta, compartidos por el proceso
+_almacenes: Dict[str, AlmacenSQLite] = {}
+_lock = threading.Lock()
+
+
+def obtener_almacen(db_path: str) -> AlmacenSQLite:
+    """Devuelve el almacén del proceso para db_path"""
+    almacen = _almacenes.get(db_path)
+    if almacen is None:
+        with _lock:
+            almacen = _almacenes.setdefault(db_path, AlmacenSQLite(db_path))
+    return almacen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Almacén SQLite de puntos de simulación")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_importar = sub.add_parser("importar", help="Importa un CSV como dataset")
+    p_importar.add_argument("csv")
+    p_importar.add_argument("--db", default="datos_luz.sqlite")
+    p_importar.add_argument("--dataset", default=None)
+
+    p_listar = sub.add_parser("listar", help="Lista los datasets importados")
+    p_listar.add_argument("--db", default="datos_luz.sqlite")
+
+    args = parser.parse_args()
+
+    if args.comando == "importar":
+        resultado = importar_csv(args.csv, args.db, args.dataset)
+        print(f"{args.db}: dataset {resultado['dataset']} ({resultado['filas']} filas)")
+    else:
+        for nombre, info in AlmacenSQLite(args.db).datasets().items():
+            print(f"{nombre}: {info['filas']} filas (origen: {info['csv_origen']})")
+
+
+if __name__ == "__main__":
+    main()
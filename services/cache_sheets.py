@@ -0,0 +1,221 @@
+"""
+Cache en memoria de las imágenes de las model sheets.
+
+Cada imagen se lee y codifica en base64 una sola vez por versión del
+archivo (mtime + tamaño; el contenido se identifica por su SHA-256). Al
+cargarla se generan también las variantes reducidas configuradas en
+settings.sheets_variantes (miniaturas para listados y vistas previas).
+
+El cache es un LRU acotado por settings.memoria_max_sheets_mb, igual que
+los snapshots de dataset. Las variantes requieren Pillow; sin Pillow se
+sirven solo las imágenes originales.
+
+Las sheets sin archivo se pueden generar en memoria (obtener_sheet_generada):
+se cachean igual, con generada=True para servirlas desde los bytes.
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ImagenCacheada:
+    """Bytes de una imagen (original o variante) con su base64 y hash"""
+
+    contenido: bytes
+    base64: str
+    hash: str
+    ancho: int = 0
+    alto: int = 0
+
+    @classmethod
+    def desde_bytes(cls, contenido: bytes, ancho: int = 0, alto: int = 0) -> "ImagenCacheada":
+        return cls(
+            contenido=contenido,
+            base64=base64.b64encode(contenido).decode("ascii"),
+            hash=hashlib.sha256(contenido).hexdigest(),
+            ancho=ancho,
+            alto=alto,
+        )
+
+    def memoria_estimada(self) -> int:
+        return len(self.contenido) + len(self.base64)
+
+
+@dataclass(frozen=True)
+class SheetCacheada:
+    """Imagen original de una sheet y sus variantes, para una versión del archivo"""
+
+    ruta: str
+    mtime: float
+    tamano: int
+    original: ImagenCacheada
+    variantes: Dict[str, ImagenCacheada] = field(default_factory=dict)
+    generada: bool = False
+
+    def memoria_estimada(self) -> int:
+        return self.original.memoria_estimada() + sum(
+            v.memoria_estimada() for v in self.variantes.values())
+
+
+_sheets: "OrderedDict[str, SheetCacheada]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def variantes_configuradas() -> List[Tuple[str, int]]:
+    """
+    Variantes definidas en settings.sheets_variantes ("nombre:ancho,...")
+
+    Raises:
+        ValueError: Si la configuración no tiene el formato esperado
+    """
+    variantes = []
+    for item in settings.sheets_variantes.split(","):
+        if not item.strip():
+            continue
+        nombre, _, ancho = item.partition(":")
+        try:
+            variantes.append((nombre.strip(), int(ancho)))
+        except ValueError:
+            raise ValueError(f"Variante de sheet inválida: {item!r}. Formato: nombre:ancho")
+    return variantes
+
+
+def _generar_variantes(contenido: bytes) -> Tuple[int, int, Dict[str, ImagenCacheada]]:
+    """Ancho y alto del original y sus variantes reducidas (PNG)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow no está instalado: no se generan variantes de las sheets")
+        return 0, 0, {}
+
+    with Image.open(io.BytesIO(contenido)) as imagen:
+        imagen.load()
+        ancho, alto = imagen.size
+        variantes = {}
+        for nombre, ancho_variante in variantes_configuradas():
+            if ancho_variante >= ancho:
+                continue
+            alto_variante = max(1, round(alto * ancho_variante / ancho))
+            reducida = imagen.resize((ancho_variante, alto_variante), Image.LANCZOS)
+            salida = io.BytesIO()
+            reducida.save(salida, format="PNG", optimize=True)
+            variantes[nombre] = ImagenCacheada.desde_bytes(
+                salida.getvalue(), ancho_variante, alto_variante)
+
+    return ancho, alto, variantes
+
+
+def _cargar(ruta: str, mtime: float, tamano: int) -> SheetCacheada:
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    return _desde_contenido(ruta, mtime, tamano, contenido)
+
+
+def _desde_contenido(ruta: str, mtime: float, tamano: int, contenido: bytes,
+                     generada: bool = False) -> SheetCacheada:
+    try:
+        ancho, alto, variantes = _generar_variantes(contenido)
+    except Exception as e:
+        # Una imagen que Pillow no puede abrir se sirve igual, sin variantes
+        logger.warning("No se pudieron generar variantes de %s: %s", ruta, e)
+        ancho, alto, variantes = 0, 0, {}
+
+    return SheetCacheada(
+        ruta=ruta,
+        mtime=mtime,
+        tamano=tamano,
+        original=ImagenCacheada.desde_bytes(contenido, ancho, alto),
+        variantes=variantes,
+        generada=generada,
+    )
+
+
+def obtener_sheet(ruta: str) -> SheetCacheada:
+    """
+    Devuelve la imagen cacheada, recargándola si el archivo cambió
+
+    Raises:
+        FileNotFoundError: Si el archivo no existe
+    """
+    stat = os.stat(ruta)
+
+    with _lock:
+        sheet = _sheets.get(ruta)
+        if sheet is not None and (sheet.mtime, sheet.tamano) == (stat.st_mtime, stat.st_size):
+            _sheets.move_to_end(ruta)
+            return sheet
+
+    # La lectura y las variantes se hacen fuera del lock; si dos requests
+    # cargan la misma versión a la vez, queda la última (son equivalentes)
+    sheet = _cargar(ruta, stat.st_mtime, stat.st_size)
+
+    with _lock:
+        _sheets[ruta] = sheet
+        _sheets.move_to_end(ruta)
+        _liberar_memoria(conservar=ruta)
+
+    return sheet
+
+
+def obtener_sheet_generada(ruta: str, generar: Callable[[], bytes]) -> SheetCacheada:
+    """
+    Sheet generada en memoria para una ruta sin archivo
+
+    generar() se llama solo si la imagen no está en el cache (o fue
+    descartada por el LRU); el resultado se trata como una versión fija.
+    """
+    with _lock:
+        sheet = _sheets.get(ruta)
+        if sheet is not None and sheet.generada:
+            _sheets.move_to_end(ruta)
+            return sheet
+
+    contenido = generar()
+    sheet = _desde_contenido(ruta, 0.0, len(contenido), contenido, generada=True)
+
+    with _lock:
+        _sheets[ruta] = sheet
+        _sheets.move_to_end(ruta)
+        _liberar_memoria(conservar=ruta)
+
+    return sheet
+
+
+def _liberar_memoria(conservar: str) -> None:
+    # Se llama con _lock tomado
+    presupuesto = settings.memoria_max_sheets_mb * 1024 * 1024
+    total = sum(s.memoria_estimada() for s in _sheets.values())
+    for ruta in list(_sheets):
+        if total <= presupuesto:
+            break
+        if ruta == conservar:
+            continue
+        total -= _sheets.pop(ruta).memoria_estimada()
+
+
+def sheets_cacheadas() -> List[Dict[str, object]]:
+    """Imágenes en el cache, de la menos a la más usada"""
+    with _lock:
+        return [
+            {
+                "ruta": ruta,
+                "hash": s.original.hash,
+                "variantes": sorted(s.variantes),
+                "generada": s.generada,
+                "memoria_bytes": s.memoria_estimada()
+            }
+            for ruta, s in _sheets.items()
+        ]
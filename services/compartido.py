@@ -0,0 +1,82 @@
+"""
+Preparación de datasets compartidos entre procesos worker.
+
+El proceso padre (hook on_starting de gunicorn.conf.py, o el build de
+Docker/Render) compila cada dataset a .luzbin con su lattice y su KD-tree
+ya construidos. Los workers abren esos archivos con numpy.memmap: las
+columnas, la grilla y los arrays del árbol viven una sola vez en el page
+cache del sistema operativo y no cuentan como memoria privada de cada
+worker.
+
+Lo derivado de esos arrays no se comparte: las grillas de los heatmaps,
+los payloads serializados de /calcular_luz y /metrica_heatmap, los tiles
+y las imágenes se construyen en cada worker (en la precarga o en el
+primer request) y viven en sus cachés en memoria. Con el dataset por
+defecto son ~1.7 MB y ~0.3 s por worker.
+
+Uso:
+    python -m services.compartido
+"""
+
+import logging
+import os
+from typing import Dict, List
+
+from config import get_settings
+from services import dataset_binario
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def rutas_datasets() -> List[str]:
+    """CSV por defecto y los registrados en el manifiesto de datasets"""
+    # Import diferido: el hook de gunicorn corre antes de cargar la app
+    from services.data_service import DataService
+
+    servicio = DataService()
+    rutas = [servicio.csv_path]
+    for ruta in servicio.registro_datasets().values():
+        if ruta not in rutas:
+            rutas.append(ruta)
+    return rutas
+
+
+def _tiene_kdtree(bin_path: str, escala: str) -> bool:
+    nombres = {c["nombre"] for c in dataset_binario.leer_header(bin_path)["columnas"]}
+    return f"kdtree/{escala}/meta" in nombres
+
+
+def preparar_datasets_compartidos() -> Dict[str, str]:
+    """
+    Compila los .luzbin que falten o estén desactualizados y precarga sus páginas
+
+    Returns:
+        Dict ruta CSV -> estado ("compilado", "vigente", "sin CSV" o el error)
+    """
+    estados = {}
+    for csv_path in rutas_datasets():
+        bin_path = dataset_binario.ruta_binaria(csv_path)
+        try:
+            if not os.path.exists(csv_path):
+                estados[csv_path] = "vigente" if os.path.exists(bin_path) else "sin CSV"
+            elif (dataset_binario.binario_vigente(csv_path, bin_path)
+                  and _tiene_kdtree(bin_path, settings.knn_escala)):
+                estados[csv_path] = "vigente"
+            else:
+                dataset_binario.compilar_csv(csv_path, bin_path, escalas_kdtree=(settings.knn_escala,))
+                estados[csv_path] = "compilado"
+
+            if os.path.exists(bin_path):
+                # Verificar el checksum lee el archivo completo y lo deja en el page cache
+                dataset_binario.abrir_binario(bin_path, verificar=True)
+        except (FileNotFoundError, ValueError, OSError) as e:
+            estados[csv_path] = f"error: {e}"
+            logger.warning("No se pudo preparar el dataset %s: %s", csv_path, e)
+
+    return estados
+
+
+if __name__ == "__main__":
+    for ruta, estado in preparar_datasets_compartidos().items():
+        print(f"{ruta}: {estado}")
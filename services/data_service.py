@@ -1,11 +1,70 @@
 import os
-import base64
-from typing import List, Tuple, Dict, Any
-import pandas as pd
+import json
+from functools import lru_cache
+from typing import List, Optional, Tuple, Dict, Any
+import numpy as np
 from config import get_settings
+from services.dataset import DatasetSnapshot, obtener_snapshot, snapshots_cargados
+from services import dataset as dataset_store
+from services.predictores import obtener_predictor
+from services.almacen_sqlite import AlmacenSQLite, nombre_dataset, obtener_almacen
+from services import agregacion
+from services import cache_sheets
+from utils.orientacion import codificar_orientacion, obtener_orientaciones_disponibles
+from utils import render
 
 settings = get_settings()
 
+ClaveDataset = Tuple[Optional[str], Optional[str]]
+
+
+def normalizar_orientacion(orientacion: Optional[str]) -> Optional[str]:
+    """Código de orientación (N, NE, ...) a partir de un nombre o un código"""
+    if not orientacion or not orientacion.strip():
+        return None
+    codigo = codificar_orientacion(orientacion)
+    if codigo is None and orientacion.strip().upper() in obtener_orientaciones_disponibles():
+        codigo = orientacion.strip().upper()
+    return codigo
+
+
+def normalizar_ubicacion(ubicacion: Optional[str]) -> Optional[str]:
+    """Ubicación en minúsculas y sin espacios extremos, o None"""
+    if not ubicacion or not ubicacion.strip():
+        return None
+    return ubicacion.strip().lower()
+
+
+@lru_cache(maxsize=8)
+def _leer_manifiesto(ruta: str, mtime: float) -> Dict[ClaveDataset, str]:
+    """
+    Lee el manifiesto de datasets (se vuelve a leer si cambia su mtime)
+
+    Formato:
+        {"datasets": [{"orientacion": "N", "ubicacion": "Mendoza",
+                       "csv": "datasets/norte_mendoza.csv"}, ...]}
+
+    orientacion y ubicacion son opcionales: si faltan, la entrada aplica a
+    cualquier valor. Las rutas relativas se resuelven desde el manifiesto.
+    """
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            entradas = json.load(f).get("datasets", [])
+    except (OSError, ValueError, AttributeError) as e:
+        raise ValueError(f"Error leyendo el manifiesto de datasets: {str(e)}")
+
+    base = os.path.dirname(os.path.abspath(ruta))
+    registro = {}
+    for entrada in entradas:
+        orientacion = entrada.get("orientacion")
+        codigo = normalizar_orientacion(orientacion)
+        if orientacion and codigo is None:
+            raise ValueError(f"Orientación inválida en el manifiesto de datasets: {orientacion}")
+
+        clave = (codigo, normalizar_ubicacion(entrada.get("ubicacion")))
+        registro[clave] = os.path.join(base, entrada["csv"])
+    return registro
+
 
 class DataService:
     """Servicio para manejo de datos y archivos"""
@@ -19,8 +78,101 @@ class DataService:
         "DAv_zone": "Metricas-espaciales_temporales-Dav_zone (1).png"
     }
 
-    def __init__(self):
-        self.csv_path = self._get_csv_path()
+    def __init__(self, csv_path: Optional[str] = None,
+                 snapshot: Optional[DatasetSnapshot] = None):
+        self.csv_path = csv_path or self._get_csv_path()
+        self._snapshot = snapshot
+
+    def fijar(self) -> "DataService":
+        """
+        DataService atado a la versión actual del dataset.
+
+        Sirve para que todas las consultas de un mismo request vean el mismo
+        snapshot aunque en el medio se publique una versión nueva.
+        """
+        if self._snapshot is not None:
+            return self
+        return DataService(self.csv_path, snapshot=obtener_snapshot(self.csv_path))
+
+    def registro_datasets(self) -> Dict[ClaveDataset, str]:
+        """
+        Datasets registrados por (código de orientación, ubicación)
+
+        Returns:
+            Dict vacío si no hay manifiesto (settings.datasets_manifest)
+        """
+        ruta = os.path.join(os.getcwd(), settings.datasets_manifest)
+        if not os.path.exists(ruta):
+            return {}
+        return _leer_manifiesto(ruta, os.path.getmtime(ruta))
+
+    def resolver_csv(self, orientacion: Optional[str] = None,
+                     ubicacion: Optional[str] = None) -> str:
+        """
+        Ruta del dataset para una orientación y ubicación
+
+        Busca en orden (orientación, ubicación), (orientación, *),
+        (*, ubicación) y (*, *); si nada coincide usa self.csv_path.
+
+        Args:
+            orientacion: Nombre o código de orientación
+            ubicacion: Ubicación del proyecto
+        """
+        registro = self.registro_datasets()
+        if not registro:
+            return self.csv_path
+
+        o = normalizar_orientacion(orientacion)
+        u = normalizar_ubicacion(ubicacion)
+        for clave in ((o, u), (o, None), (None, u), (None, None)):
+            if clave in registro:
+                return registro[clave]
+        return self.csv_path
+
+    def para(self, orientacion: Optional[str] = None,
+             ubicacion: Optional[str] = None) -> "DataService":
+        """DataService sobre el dataset que corresponde a orientación y ubicación"""
+        csv_path = self.resolver_csv(orientacion, ubicacion)
+        return self if csv_path == self.csv_path else DataService(csv_path)
+
+    def agregar_filas(self, filas: List[Dict[str, float]]) -> Dict[str, Any]:
+        """
+        Agrega filas de simulación al dataset y programa la nueva versión
+
+        Args:
+            filas: Dicts con area_vidrio, tv e yhat
+
+        Returns:
+            Dict con la versión vigente y la cantidad de filas agregadas
+
+        Raises:
+            FileNotFoundError: Si no se encuentra el CSV
+            ValueError: Si las filas son inválidas
+        """
+        recarga = dataset_store.agregar_filas(
+            self.csv_path,
+            [f["area_vidrio"] for f in filas],
+            [f["tv"] for f in filas],
+            [f["yhat"] for f in filas],
+        )
+        return {
+            "csv_path": self.csv_path,
+            "filas_agregadas": len(filas),
+            "version_vigente": obtener_snapshot(self.csv_path).version,
+            "recarga": recarga
+        }
+
+    def listar_datasets(self) -> Dict[str, Any]:
+        """Datasets registrados y los cargados actualmente en el proceso"""
+        return {
+            "por_defecto": self.csv_path,
+            "registrados": [
+                {"orientacion": o, "ubicacion": u, "csv_path": ruta}
+                for (o, u), ruta in self.registro_datasets().items()
+            ],
+            "cargados": snapshots_cargados(),
+            "memoria_max_mb": settings.memoria_max_datasets_mb
+        }
 
     def _get_csv_path(self) -> str:
         """Detecta automáticamente la ruta del CSV"""
@@ -37,34 +189,130 @@ class DataService:
         # Ruta por defecto
         return os.path.join(os.getcwd(), settings.csv_filename)
 
+    @property
+    def dataset(self) -> DatasetSnapshot:
+        """Snapshot del dataset compartido por todo el proceso (o el fijado)"""
+        if self._snapshot is not None:
+            return self._snapshot
+        return obtener_snapshot(self.csv_path)
+
+    def precargar(self) -> DatasetSnapshot:
+        """Carga el dataset y sus índices (pensado para el arranque de la app)"""
+        ds = self.dataset
+        if self.almacen() is None:
+            # Con el almacén SQLite las búsquedas de vecinos usan su R*Tree
+            ds.kdtree(settings.knn_escala)
+        return ds
+
     def get_heatmap_data(self) -> List[List[float]]:
         """
-        Obtiene datos del heatmap desde el CSV
+        Obtiene datos del heatmap desde el snapshot en memoria
 
         Returns:
-            Lista de listas con [area_vidrio, tv, yhat]
+            Lista de listas con [area_vidrio, tv, yhat]. La lista es
+            compartida entre requests y no debe modificarse.
 
         Raises:
             FileNotFoundError: Si no se encuentra el CSV
             ValueError: Si faltan columnas requeridas
         """
-        if not os.path.exists(self.csv_path):
-            raise FileNotFoundError(
-                f"No se encontró el archivo CSV en: {self.csv_path}"
+        return self.dataset.heatmap_data
+
+    def usar_escalado(self) -> bool:
+        """Indica si el dataset se sirve agregado y diezmado (ver settings.modo_escalado)"""
+        return self.dataset.usar_escalado()
+
+    def get_scatter_data(self) -> List[List[float]]:
+        """
+        Puntos [area_vidrio, tv, yhat] para gráficos de dispersión
+
+        En modo escalado se diezman por densidad hasta settings.max_puntos_scatter;
+        si no, son todos los puntos (igual que get_heatmap_data).
+        """
+        if not self.usar_escalado():
+            return self.get_heatmap_data()
+
+        ds = self.dataset
+        presupuesto = settings.max_puntos_scatter
+
+        def diezmar() -> List[List[float]]:
+            almacen = self._almacen_agregados()
+            # Celdas de densidad: a lo sumo presupuesto celdas, con al menos un punto cada una
+            lado = max(1, int(np.sqrt(presupuesto)))
+            stats = self._estadisticas_columnas(almacen)
+            x_rango = self._rango_eje(stats["area_vidrio"], lado)
+            y_rango = self._rango_eje(stats["tv"], lado)
+            if almacen is not None:
+                return almacen.diezmar_por_densidad(
+                    nombre_dataset(self.csv_path), presupuesto, x_rango, y_rango).tolist()
+
+            idx = agregacion.diezmar_por_densidad(
+                ds.area_vidrio, ds.tv, presupuesto, x_rango, y_rango,
+                settings.tamano_bloque_agregacion
             )
+            return np.column_stack((ds.area_vidrio[idx], ds.tv[idx], ds.yhat[idx])).tolist()
 
-        try:
-            df = pd.read_csv(self.csv_path)
-        except Exception as e:
-            raise ValueError(f"Error leyendo el CSV: {str(e)}")
+        return ds.en_cache(("scatter", presupuesto), diezmar)
 
-        # Verificar columnas necesarias
-        required_cols = ["area_vidrio", "tv", "yhat"]
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            raise ValueError(f"Columnas faltantes en CSV: {missing_cols}")
+    def _almacen_agregados(self) -> Optional[AlmacenSQLite]:
+        """
+        Almacén SQLite del que salen los agregados (grilla por celda, scatter
+        diezmado y estadísticas), también con el snapshot fijado
+
+        Solo si la base tiene las mismas filas que el snapshot: durante
+        agregar_filas la base se adelanta a la versión publicada y los
+        agregados de esa versión se calculan sobre sus columnas.
+        """
+        if settings.backend_datos != "sqlite":
+            return None
+        almacen = obtener_almacen(settings.sqlite_path)
+        nombre = nombre_dataset(self.csv_path)
+        if not almacen.contiene(nombre) or almacen.datasets()[nombre]["filas"] != len(self.dataset):
+            return None
+        return almacen
+
+    def _estadisticas_columnas(self, almacen: Optional[AlmacenSQLite] = None
+                               ) -> Dict[str, Dict[str, float]]:
+        """Mínimo, máximo y media de area_vidrio, tv e yhat (en SQL si hay almacén)"""
+        if almacen is not None:
+            return almacen.estadisticas_columnas(nombre_dataset(self.csv_path))
+        ds = self.dataset
+        return {
+            col: agregacion.estadisticas_columna(getattr(ds, col), settings.tamano_bloque_agregacion)
+            for col in ("area_vidrio", "tv", "yhat")
+        }
 
-        return df[required_cols].values.tolist()
+    @staticmethod
+    def _rango_eje(stats: Dict[str, float], n: int) -> Tuple[float, float, int]:
+        minimo = stats["min"] if np.isfinite(stats["min"]) else 0.0
+        maximo = stats["max"] if np.isfinite(stats["max"]) else 0.0
+        return minimo, maximo, n
+
+    def get_grilla_agregada(self, x_rango: Tuple[float, float, int],
+                            y_rango: Tuple[float, float, int]) -> Dict[str, np.ndarray]:
+        """
+        yhat agregado por celda (media, minimo, maximo, conteo) sobre todos los puntos
+
+        Args:
+            x_rango: (mínimo, máximo, cantidad de centros) de area_vidrio
+            y_rango: (mínimo, máximo, cantidad de centros) de tv
+
+        Returns:
+            Dict de arrays (nx, ny), compartidos por la versión del dataset
+        """
+        ds = self.dataset
+
+        def agregar() -> Dict[str, np.ndarray]:
+            almacen = self._almacen_agregados()
+            if almacen is not None:
+                # GROUP BY celda en la base, sin recorrer las columnas
+                return almacen.agregar_en_grilla(nombre_dataset(self.csv_path), x_rango, y_rango)
+            return agregacion.agregar_en_grilla(
+                ds.area_vidrio, ds.tv, ds.yhat, x_rango, y_rango,
+                settings.tamano_bloque_agregacion
+            )
+
+        return ds.en_cache(("agregado", tuple(x_rango), tuple(y_rango)), agregar)
 
     def predict_yhat_nearest(self, area_vidrio: float, tv: float) -> Tuple[float, float, float]:
         """
@@ -81,49 +329,120 @@ class DataService:
             FileNotFoundError: Si no se encuentra el CSV
             ValueError: Si el dataset está vacío o hay errores
         """
-        if not os.path.exists(self.csv_path):
-            raise FileNotFoundError(
-                f"No se encontró el archivo CSV en: {self.csv_path}"
-            )
+        yhat, av_used, tv_used = self.predict_yhat(area_vidrio, tv, modo="nearest")
+        return float(yhat), float(av_used), float(tv_used)
 
-        try:
-            df = pd.read_csv(self.csv_path)
-        except Exception as e:
-            raise ValueError(f"Error leyendo el CSV: {str(e)}")
+    def predict_yhat(self, area_vidrio, tv, modo: Optional[str] = None
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Predice yhat para una o muchas consultas en una sola pasada vectorizada
+
+        Args:
+            area_vidrio: Área(s) de vidrio en m², escalar o array
+            tv: Transmitancia(s) visible(s), escalar o array
+            modo: Nombre del backend registrado en services.predictores
+                (por defecto settings.modo_prediccion)
 
-        # Verificar que el dataframe no esté vacío
-        if df.empty:
-            raise ValueError("El archivo CSV está vacío")
+        Returns:
+            Tuple de arrays: (yhat, area_vidrio_usado, tv_usado)
+
+        Raises:
+            FileNotFoundError: Si no se encuentra el CSV
+            ValueError: Si el modo es inválido, el dataset está vacío o
+                el modo no soporta el dataset
+        """
+        modo = modo or settings.modo_prediccion
+        almacen = self.almacen()
+        if almacen is not None and modo == "nearest":
+            return almacen.nearest(
+                nombre_dataset(self.csv_path), area_vidrio, tv, settings.knn_escala)
 
-        # Verificar columnas necesarias
-        required_cols = ["area_vidrio", "tv", "yhat"]
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            raise ValueError(f"Columnas faltantes en CSV: {missing_cols}")
+        predictor = obtener_predictor(modo, self.dataset)
+        return predictor.predecir(area_vidrio, tv)
 
-        # Calcular distancia euclidiana
-        df = df.copy()
-        df["dist"] = ((df["area_vidrio"] - area_vidrio) ** 2 +
-                      (df["tv"] - tv) ** 2) ** 0.5
+    def almacen(self) -> Optional[AlmacenSQLite]:
+        """
+        Almacén SQLite del dataset si BACKEND_DATOS=sqlite y fue importado.
 
-        # Ordenar por distancia y tomar el más cercano
-        df_sorted = df.sort_values("dist")
+        Las consultas nearest, k-NN y por rango usan su índice R*Tree sin
+        cargar el dataset completo en memoria.
+        """
+        if settings.backend_datos != "sqlite" or self._snapshot is not None:
+            return None
+        almacen = obtener_almacen(settings.sqlite_path)
+        return almacen if almacen.contiene(nombre_dataset(self.csv_path)) else None
 
-        if df_sorted.empty:
-            raise ValueError("No se encontró un punto de predicción válido.")
+    def puntos_en_rango(self, area_min: float, area_max: float,
+                        tv_min: float, tv_max: float) -> List[List[float]]:
+        """
+        Puntos del dataset dentro de una caja de area_vidrio × tv
 
-        fila = df_sorted.iloc[0]
-        return float(fila["yhat"]), float(fila["area_vidrio"]), float(fila["tv"])
+        Returns:
+            Lista de [area_vidrio, tv, yhat] en el orden del dataset
+        """
+        almacen = self.almacen()
+        if almacen is not None:
+            columnas = almacen.rango(
+                nombre_dataset(self.csv_path), area_min, area_max, tv_min, tv_max)
+        else:
+            ds = self.dataset
+            mascara = (
+                (ds.area_vidrio >= area_min) & (ds.area_vidrio <= area_max)
+                & (ds.tv >= tv_min) & (ds.tv <= tv_max)
+            )
+            columnas = (ds.area_vidrio[mascara], ds.tv[mascara], ds.yhat[mascara])
+        return np.column_stack(columnas).tolist()
 
-    def get_model_sheet(self, metric: str) -> Dict[str, Any]:
+    def vecinos_cercanos(self, area_vidrio: float, tv: float,
+                         k: Optional[int] = None) -> Dict[str, Any]:
         """
-        Obtiene información de la métrica y su imagen en base64
+        Obtiene los k puntos del dataset más cercanos a la consulta
 
         Args:
-            metric: Nombre de la métrica (DA, UDI, etc.)
+            area_vidrio: Área de vidrio en m²
+            tv: Transmitancia visible (0-1)
+            k: Cantidad de vecinos (por defecto settings.knn_k)
 
         Returns:
-            Dict con información de la métrica
+            Dict con la lista de vecinos (distancia en ejes normalizados)
+            y la dispersión de yhat en el vecindario
+        """
+        k = k or settings.knn_k
+        almacen = self.almacen()
+
+        if almacen is not None:
+            dist, filas = almacen.k_vecinos(
+                nombre_dataset(self.csv_path), area_vidrio, tv, k, settings.knn_escala)
+        else:
+            ds = self.dataset
+            if ds.empty:
+                raise ValueError("El archivo CSV está vacío")
+            dist, idx = ds.kdtree(settings.knn_escala).query((area_vidrio, tv), k=k)
+            filas = np.column_stack((ds.area_vidrio[idx], ds.tv[idx], ds.yhat[idx]))
+
+        vecinos = [
+            {
+                "area_vidrio": float(fila[0]),
+                "tv": float(fila[1]),
+                "yhat": float(fila[2]),
+                "distancia": float(d)
+            }
+            for d, fila in zip(dist, filas)
+        ]
+
+        return {
+            "vecinos": vecinos,
+            "dispersion_yhat": float(np.std(filas[:, 2])),
+            "escala": settings.knn_escala
+        }
+
+    def ruta_model_sheet(self, metric: str) -> str:
+        """
+        Ruta de la imagen de una métrica
+
+        Raises:
+            ValueError: Si la métrica no es válida
+            FileNotFoundError: Si la imagen no existe
         """
         if metric not in self.GRAPH_PATHS:
             raise ValueError(
@@ -131,27 +450,114 @@ class DataService:
                 f"Opciones válidas: {list(self.GRAPH_PATHS.keys())}"
             )
 
-        filename = self.GRAPH_PATHS[metric]
-        filepath = os.path.join(os.getcwd(), filename)
-
-        # Si el archivo no existe, retornar error controlado
+        filepath = os.path.join(os.getcwd(), self.GRAPH_PATHS[metric])
         if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Imagen no encontrada: {self.GRAPH_PATHS[metric]}")
+        return filepath
+
+    def model_sheet_cacheada(self, metric: str) -> cache_sheets.SheetCacheada:
+        """
+        Imagen de una métrica (bytes, base64 y variantes) desde el cache en memoria
+
+        Si el PNG no existe y settings.sheets_generadas está activo, la
+        imagen se genera desde las zonas poligonales de la métrica.
+
+        Raises:
+            ValueError: Si la métrica no es válida
+            FileNotFoundError: Si la imagen no existe y no se generan sheets
+        """
+        try:
+            return cache_sheets.obtener_sheet(self.ruta_model_sheet(metric))
+        except FileNotFoundError:
+            if not settings.sheets_generadas:
+                raise
+        return cache_sheets.obtener_sheet_generada(
+            os.path.join(os.getcwd(), self.GRAPH_PATHS[metric]),
+            lambda: render.renderizar_zonas(
+                metric, "png", settings.sheets_generadas_ancho, settings.sheets_generadas_alto)
+        )
+
+    def precargar_model_sheets(self) -> None:
+        """Carga en el cache las imágenes (existentes o generadas) y sus variantes"""
+        for metric in self.GRAPH_PATHS:
+            try:
+                self.model_sheet_cacheada(metric)
+            except FileNotFoundError:
+                continue
+
+    def _url_model_sheet(self, metric: str, imagen: cache_sheets.ImagenCacheada,
+                         variante: Optional[str] = None) -> str:
+        url = f"{settings.api_prefix}/model_sheet/{metric}/imagen?v={imagen.hash[:16]}"
+        return f"{url}&variante={variante}" if variante else url
+
+    def get_model_sheet(self, metric: str, inline: Optional[bool] = None,
+                        variante: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Obtiene información de la métrica y la referencia a su imagen
+
+        La imagen se sirve aparte en url (con el hash en la query, así el
+        cliente la puede cachear sin revalidar); en base64 solo si se pide.
+        Bytes y base64 salen del cache en memoria (ver services/cache_sheets.py).
+
+        Args:
+            metric: Nombre de la métrica (DA, UDI, etc.)
+            inline: Incluir la imagen en image_base64 (por defecto settings.sheets_inline)
+            variante: Variante reducida a referenciar (p.ej. "miniatura"); si no
+                se pudo generar (imagen más chica o sin Pillow) se usa la original
+
+        Returns:
+            Dict con información de la métrica
+
+        Raises:
+            ValueError: Si la métrica o la variante no son válidas
+        """
+        if inline is None:
+            inline = settings.sheets_inline
+        if variante is not None and variante not in dict(cache_sheets.variantes_configuradas()):
+            raise ValueError(
+                f"Variante inválida: {variante}. "
+                f"Opciones válidas: {[v for v, _ in cache_sheets.variantes_configuradas()]}"
+            )
+
+        try:
+            cacheada = self.model_sheet_cacheada(metric)
+        except FileNotFoundError as e:
+            # Si el archivo no existe, retornar error controlado
             return {
                 "metric": metric,
                 "image_base64": None,
-                "filename": filename,
-                "error": f"Imagen no encontrada: {filename}",
+                "filename": self.GRAPH_PATHS[metric],
+                "error": str(e),
                 "description": self._get_metric_description(metric)
             }
 
         try:
-            with open(filepath, "rb") as img_file:
-                encoded_img = base64.b64encode(img_file.read()).decode("utf-8")
+            if variante not in cacheada.variantes:
+                variante = None
+            imagen = cacheada.variantes[variante] if variante else cacheada.original
 
             return {
                 "metric": metric,
-                "image_base64": encoded_img,
-                "filename": os.path.basename(filepath),
+                "url": self._url_model_sheet(metric, imagen, variante),
+                "hash": imagen.hash,
+                "bytes": len(imagen.contenido),
+                "content_type": "image/png",
+                "ancho": imagen.ancho or None,
+                "alto": imagen.alto or None,
+                "variante": variante,
+                "variantes": {
+                    nombre: {
+                        "url": self._url_model_sheet(metric, v, nombre),
+                        "hash": v.hash,
+                        "bytes": len(v.contenido),
+                        "ancho": v.ancho,
+                        "alto": v.alto
+                    }
+                    for nombre, v in cacheada.variantes.items()
+                },
+                "image_base64": imagen.base64 if inline else None,
+                "filename": os.path.basename(cacheada.ruta),
+                "generada": cacheada.generada,
                 "description": self._get_metric_description(metric)
             }
 
@@ -159,7 +565,7 @@ class DataService:
             return {
                 "metric": metric,
                 "image_base64": None,
-                "filename": filename,
+                "filename": self.GRAPH_PATHS[metric],
                 "error": f"Error al cargar imagen: {str(e)}",
                 "description": self._get_metric_description(metric)
             }
@@ -182,17 +588,9 @@ class DataService:
         Returns:
             Dict con estadísticas del CSV
         """
-        if not os.path.exists(self.csv_path):
-            raise FileNotFoundError(
-                f"No se encontró el archivo CSV en: {self.csv_path}"
-            )
+        ds = self.dataset
 
-        try:
-            df = pd.read_csv(self.csv_path)
-        except Exception as e:
-            raise ValueError(f"Error leyendo el CSV: {str(e)}")
-
-        if df.empty:
+        if ds.empty:
             return {
                 "total_records": 0,
                 "csv_path": self.csv_path,
@@ -200,32 +598,16 @@ class DataService:
             }
 
         stats = {
-            "total_records": len(df),
+            "total_records": len(ds),
+            "version": ds.version,
             "csv_path": self.csv_path,
-            "columns": list(df.columns)
+            "columns": list(ds.columns)
         }
 
-        # Agregar estadísticas de columnas específicas si existen
-        if "area_vidrio" in df.columns:
-            stats["area_vidrio_range"] = {
-                "min": float(df["area_vidrio"].min()),
-                "max": float(df["area_vidrio"].max()),
-                "mean": float(df["area_vidrio"].mean())
-            }
+        for col, rango in self._estadisticas_columnas(self._almacen_agregados()).items():
+            stats[f"{col}_range"] = rango
 
-        if "tv" in df.columns:
-            stats["tv_range"] = {
-                "min": float(df["tv"].min()),
-                "max": float(df["tv"].max()),
-                "mean": float(df["tv"].mean())
-            }
-
-        if "yhat" in df.columns:
-            stats["yhat_range"] = {
-                "min": float(df["yhat"].min()),
-                "max": float(df["yhat"].max()),
-                "mean": float(df["yhat"].mean())
-            }
+        stats["lattice"] = ds.lattice.metadata() if ds.lattice is not None else None
 
         return stats
 
@@ -0,0 +1,687 @@
+"""
+Snapshot inmutable del dataset de simulación.
+
+El CSV se parsea una sola vez por proceso y se comparte entre todas las
+instancias de DataService como arrays NumPy contiguos de solo lectura.
+Si existe un .luzbin vigente junto al CSV (ver services.dataset_binario)
+se abre con numpy.memmap en lugar de parsear el texto.
+
+Cada snapshot tiene una versión única y nunca se modifica: cuando el CSV
+cambia (o se agregan filas con agregar_filas) se construye uno nuevo en
+segundo plano, con sus índices ya armados, y se reemplaza atómicamente.
+Los requests en curso terminan con el snapshot que tomaron.
+"""
+
+import csv
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from config import get_settings
+from services import almacen_sqlite, dataset_binario
+from services.kdtree import KDTree
+from services.lattice import Lattice, detectar_lattice
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLS = ["area_vidrio", "tv", "yhat"]
+
+
+def _solo_lectura(valores) -> np.ndarray:
+    """
+    Convierte a array float contiguo y lo marca como no escribible.
+
+    Los arrays float32/float64 (incluidos los memmap del .luzbin) se
+    conservan sin copiar; el resto se convierte a float64.
+    """
+    arr = np.asarray(valores)
+    if arr.dtype.kind != "f":
+        arr = arr.astype(np.float64)
+    arr = np.ascontiguousarray(arr).view(np.ndarray)
+    arr.setflags(write=False)
+    return arr
+
+
+def _tamano_aprox(obj: Any, profundidad: int = 2) -> int:
+    """
+    Estimación barata del tamaño de una estructura derivada.
+
+    Cuenta los arrays NumPy que son dueños de su memoria (las vistas sobre
+    las columnas del snapshot no suman) y extrapola las listas a partir de
+    su primer elemento.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if obj.base is None else 0
+    if isinstance(obj, dict):
+        total = sys.getsizeof(obj)
+        if profundidad > 0:
+            total += sum(_tamano_aprox(v, profundidad - 1) for v in obj.values())
+        return total
+    if isinstance(obj, (list, tuple)):
+        total = sys.getsizeof(obj)
+        if obj and profundidad > 0:
+            total += len(obj) * max(_tamano_aprox(obj[0], profundidad - 1), sys.getsizeof(obj[0]))
+        return total
+    if profundidad > 0 and hasattr(obj, "__dict__"):
+        return sum(_tamano_aprox(v, profundidad - 1) for v in vars(obj).values())
+    return sys.getsizeof(obj)
+
+
+# Versiones monótonas para todo el proceso; las cachés derivadas se indexan por ellas
+_versiones = itertools.count(1)
+
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """Vista inmutable del dataset cargado en memoria"""
+
+    csv_path: str
+    columns: Tuple[str, ...]
+    area_vidrio: np.ndarray
+    tv: np.ndarray
+    yhat: np.ndarray
+    mtime: float = 0.0
+    lattice: Optional[Lattice] = field(default=None, repr=False)
+    version: int = field(default_factory=lambda: next(_versiones))
+    _cache: Dict[Any, Any] = field(default_factory=dict, repr=False, compare=False)
+    # Un lock por clave de _cache: construir una estructura no frena al resto
+    _locks_cache: Dict[Any, threading.RLock] = field(default_factory=dict, repr=False, compare=False)
+    _lock_locks: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return int(self.yhat.shape[0])
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    def memoria_estimada(self) -> int:
+        """
+        Bytes aproximados que ocupa el snapshot: columnas, grilla y las
+        estructuras derivadas construidas hasta el momento
+        """
+        total = self.area_vidrio.nbytes + self.tv.nbytes + self.yhat.nbytes
+        if self.lattice is not None:
+            total += self.lattice.grid.nbytes
+        for valor in list(self._cache.values()):
+            total += _tamano_aprox(valor)
+        return total
+
+    def en_cache(self, clave: Hashable, fabrica: Callable[[], Any]) -> Any:
+        """
+        Estructura derivada del snapshot (índices, coeficientes, ...),
+        construida una sola vez y compartida mientras viva el snapshot
+        """
+        valor = self._cache.get(clave)
+        if valor is not None:
+            return valor
+
+        # La fábrica corre con el lock de su clave, no con el global: mientras
+        # se construye (p.ej. en una recarga) los requests siguen atendiéndose
+        with self._lock_locks:
+            lock = self._locks_cache.setdefault(clave, threading.RLock())
+        try:
+            with lock:
+                valor = self._cache.get(clave)
+                if valor is not None:
+                    return valor
+                valor = fabrica()
+                self._cache[clave] = valor
+        finally:
+            # También si la fábrica falló: el próximo intento crea un lock nuevo
+            with self._lock_locks:
+                if self._locks_cache.get(clave) is lock:
+                    del self._locks_cache[clave]
+
+        liberar_memoria(conservar=self.csv_path)
+        return valor
+
+    def usar_escalado(self) -> bool:
+        """Indica si el dataset se sirve agregado y diezmado (ver settings.modo_escalado)"""
+        if settings.modo_escalado == "siempre":
+            return True
+        if settings.modo_escalado == "nunca":
+            return False
+        return len(self) > settings.umbral_escalado_puntos
+
+    @property
+    def heatmap_data(self) -> List[List[float]]:
+        """Filas [area_vidrio, tv, yhat] en el orden del CSV, construidas a demanda"""
+        return self.en_cache(
+            "heatmap_data",
+            lambda: np.column_stack((self.area_vidrio, self.tv, self.yhat)).tolist()
+        )
+
+    def kdtree(self, escala: str = "rango") -> KDTree:
+        """KD-tree sobre (area_vidrio, tv), construido una vez por escala"""
+        return self.en_cache(
+            ("kdtree", escala),
+            lambda: KDTree(np.column_stack((self.area_vidrio, self.tv)), escala=escala)
+        )
+
+    @classmethod
+    def from_arrays(cls, csv_path: str, area_vidrio, tv, yhat,
+                    columns: Tuple[str, ...] = tuple(REQUIRED_COLS),
+                    mtime: float = 0.0,
+                    lattice: Optional[Lattice] = None) -> "DatasetSnapshot":
+        """
+        Construye el snapshot a partir de columnas ya parseadas
+
+        Si no se pasa lattice se detecta a partir de las columnas.
+        """
+        area_vidrio = _solo_lectura(area_vidrio)
+        tv = _solo_lectura(tv)
+        yhat = _solo_lectura(yhat)
+
+        if lattice is None:
+            lattice = detectar_lattice(area_vidrio, tv, yhat)
+
+        return cls(
+            csv_path=csv_path,
+            columns=tuple(columns),
+            area_vidrio=area_vidrio,
+            tv=tv,
+            yhat=yhat,
+            mtime=mtime,
+            lattice=lattice,
+        )
+
+
+# Celdas que se leen como NaN (mismo criterio que los valores nulos habituales de pandas)
+_VALORES_NULOS = {"", "na", "n/a", "nan", "-nan", "null", "none", "#n/a", "<na>"}
+
+
+def _a_float(valor: str, fila: int, columna: str) -> float:
+    try:
+        return float(valor)
+    except ValueError:
+        if valor.strip().lower() in _VALORES_NULOS:
+            return float("nan")
+        raise ValueError(
+            f"Error leyendo el CSV: valor no numérico '{valor}' en la columna "
+            f"{columna}, fila {fila}"
+        )
+
+
+def leer_columnas_csv(csv_path: str, columnas: List[str]
+                      ) -> Tuple[Tuple[str, ...], List[np.ndarray]]:
+    """
+    Lee columnas numéricas de un CSV con la biblioteca estándar y NumPy
+
+    Primero intenta numpy.loadtxt (parser en C); si hay celdas vacías o
+    nulas usa un parser por celda que las convierte en NaN.
+
+    Args:
+        csv_path: Ruta del CSV (UTF-8, con o sin BOM, separado por comas)
+        columnas: Columnas a leer
+
+    Returns:
+        Tuple (encabezado completo, un array float64 por columna pedida)
+
+    Raises:
+        ValueError: Si el archivo no tiene encabezado, faltan columnas o
+            hay valores no numéricos
+    """
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        encabezado = tuple(c.strip() for c in next(csv.reader([f.readline()]), []))
+        if not encabezado:
+            raise ValueError("Error leyendo el CSV: el archivo no tiene encabezado")
+
+        missing_cols = [col for col in columnas if col not in encabezado]
+        if missing_cols:
+            raise ValueError(f"Columnas faltantes en CSV: {missing_cols}")
+        indices = [encabezado.index(col) for col in columnas]
+        inicio_datos = f.tell()
+
+        try:
+            with warnings.catch_warnings():
+                # Un CSV con solo encabezado es un dataset vacío, no un aviso
+                warnings.simplefilter("ignore", UserWarning)
+                datos = np.loadtxt(
+                    f, delimiter=",", usecols=indices, dtype=np.float64,
+                    ndmin=2, quotechar='"'
+                )
+            return encabezado, [datos[:, i].copy() for i in range(len(columnas))]
+        except ValueError:
+            f.seek(inicio_datos)
+
+        valores: List[List[float]] = [[] for _ in columnas]
+        for num, fila in enumerate(csv.reader(f), start=2):
+            if not fila:
+                continue
+            for destino, i, col in zip(valores, indices, columnas):
+                destino.append(_a_float(fila[i] if i < len(fila) else "", num, col))
+
+    return encabezado, [np.array(v, dtype=np.float64) for v in valores]
+
+
+def cargar_snapshot_csv(csv_path: str) -> DatasetSnapshot:
+    """
+    Lee el CSV y construye un snapshot nuevo (sin pandas)
+
+    Raises:
+        FileNotFoundError: Si no se encuentra el CSV
+        ValueError: Si hay errores de lectura o faltan columnas requeridas
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(
+            f"No se encontró el archivo CSV en: {csv_path}"
+        )
+
+    mtime = os.path.getmtime(csv_path)
+
+    try:
+        columns, (area_vidrio, tv, yhat) = leer_columnas_csv(csv_path, REQUIRED_COLS)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f"Error leyendo el CSV: {str(e)}")
+
+    return DatasetSnapshot.from_arrays(
+        csv_path, area_vidrio, tv, yhat,
+        columns=columns,
+        mtime=mtime,
+    )
+
+
+def cargar_snapshot_binario(bin_path: str, csv_path: Optional[str] = None,
+                            verificar: bool = False) -> DatasetSnapshot:
+    """
+    Abre un .luzbin con numpy.memmap y construye el snapshot sin copiar columnas.
+
+    Las páginas del archivo las comparte el sistema operativo entre todos
+    los procesos que lo abren (ver services/compartido.py).
+
+    Args:
+        bin_path: Ruta del archivo binario
+        csv_path: Ruta reportada como origen del snapshot (por defecto bin_path)
+        verificar: Si True, valida el checksum de la sección de datos
+
+    Raises:
+        FileNotFoundError: Si no se encuentra el archivo
+        ValueError: Si el formato o el checksum no son válidos
+    """
+    if not os.path.exists(bin_path):
+        raise FileNotFoundError(
+            f"No se encontró el dataset binario en: {bin_path}"
+        )
+
+    datos = dataset_binario.abrir_binario(bin_path, verificar=verificar)
+    fuente = datos["header"].get("fuente") or {}
+
+    snapshot = DatasetSnapshot.from_arrays(
+        csv_path or bin_path,
+        datos["area_vidrio"],
+        datos["tv"],
+        datos["yhat"],
+        columns=tuple(fuente.get("columnas") or REQUIRED_COLS),
+        mtime=fuente.get("mtime", os.path.getmtime(bin_path)),
+        lattice=datos["lattice"],
+    )
+
+    # Los KD-trees guardados se usan sobre el memmap, sin construirlos de nuevo
+    for escala, arbol in dataset_binario.kdtrees_guardados(datos).items():
+        snapshot.en_cache(("kdtree", escala), lambda arbol=arbol: arbol)
+
+    return snapshot
+
+
+def _almacen_de(csv_path: str) -> Optional[almacen_sqlite.AlmacenSQLite]:
+    """Almacén SQLite que sirve csv_path (BACKEND_DATOS=sqlite y dataset importado)"""
+    if settings.backend_datos != "sqlite":
+        return None
+    almacen = almacen_sqlite.obtener_almacen(settings.sqlite_path)
+    return almacen if almacen.contiene(almacen_sqlite.nombre_dataset(csv_path)) else None
+
+
+def cargar_snapshot(csv_path: str) -> DatasetSnapshot:
+    """
+    Carga el dataset desde la base SQLite (si BACKEND_DATOS=sqlite y el
+    dataset fue importado), desde el .luzbin compilado si está vigente, o
+    desde el CSV
+
+    Raises:
+        FileNotFoundError: Si no se encuentra ni el CSV ni el binario
+        ValueError: Si hay errores de lectura o faltan columnas requeridas
+    """
+    almacen = _almacen_de(csv_path)
+    if almacen is not None:
+        return DatasetSnapshot.from_arrays(
+            csv_path, *almacen.columnas(almacen_sqlite.nombre_dataset(csv_path))
+        )
+
+    bin_path = dataset_binario.ruta_binaria(csv_path)
+    if settings.usar_dataset_binario and dataset_binario.binario_vigente(csv_path, bin_path):
+        try:
+            return cargar_snapshot_binario(
+                bin_path, csv_path, verificar=settings.verificar_dataset_binario
+            )
+        except ValueError as e:
+            if not os.path.exists(csv_path):
+                raise
+            # Binario truncado o dañado: se sirve el CSV hasta recompilarlo
+            logger.warning("Se ignora el dataset binario %s: %s", bin_path, e)
+    return cargar_snapshot_csv(csv_path)
+
+
+# Snapshots compartidos por todo el proceso, indexados por ruta del CSV.
+# El orden es de uso (LRU): el último usado queda al final.
+_snapshots: "OrderedDict[str, DatasetSnapshot]" = OrderedDict()
+_lock = threading.RLock()
+# Serializa las escrituras de filas a los CSV
+_lock_escritura = threading.Lock()
+
+
+@dataclass
+class _EstadoArchivo:
+    """Seguimiento del archivo de origen de un snapshot publicado"""
+
+    firma: Optional[Tuple[float, int]]
+    verificado: float
+    recarga: Optional[threading.Thread] = None
+    pendiente: bool = False
+
+
+_estados: Dict[str, _EstadoArchivo] = {}
+
+# Lock de la primera carga de cada dataset (no se toma _lock mientras se lee)
+_cargas: Dict[str, threading.Lock] = {}
+
+
+def _firma(csv_path: str) -> Optional[Tuple[float, int]]:
+    """(mtime, tamaño) del archivo, o None si no existe"""
+    try:
+        stat = os.stat(csv_path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def obtener_snapshot(csv_path: str) -> DatasetSnapshot:
+    """
+    Devuelve el snapshot del proceso para csv_path, cargándolo si hace falta.
+
+    Cada settings.intervalo_verificacion_dataset_s se compara el mtime y
+    tamaño del CSV; si cambió se programa una recarga en segundo plano y
+    mientras tanto se sigue devolviendo la versión vigente.
+
+    Al cargar un dataset nuevo se liberan los menos usados si se supera
+    settings.memoria_max_datasets_mb. Los errores de carga no se cachean:
+    el siguiente llamado vuelve a intentar.
+    """
+    with _lock:
+        snapshot = _snapshots.get(csv_path)
+        if snapshot is not None:
+            _snapshots.move_to_end(csv_path)
+            _verificar_cambios(csv_path)
+            return snapshot
+        carga = _cargas.setdefault(csv_path, threading.Lock())
+
+    # La lectura se hace fuera de _lock: solo esperan los requests de este dataset
+    with carga:
+        with _lock:
+            snapshot = _snapshots.get(csv_path)
+            if snapshot is not None:
+                _snapshots.move_to_end(csv_path)
+                return snapshot
+
+        firma = _firma(csv_path)
+        snapshot = cargar_snapshot(csv_path)
+
+        with _lock:
+            _snapshots[csv_path] = snapshot
+            _estados[csv_path] = _EstadoArchivo(firma=firma, verificado=time.monotonic())
+            _cargas.pop(csv_path, None)
+
+    liberar_memoria(conservar=csv_path)
+    return snapshot
+
+
+def _verificar_cambios(csv_path: str) -> None:
+    """Programa una recarga si el archivo cambió desde la última verificación"""
+    intervalo = settings.intervalo_verificacion_dataset_s
+    estado = _estados.get(csv_path)
+    if estado is None or intervalo <= 0:
+        return
+
+    ahora = time.monotonic()
+    if ahora - estado.verificado < intervalo:
+        return
+    estado.verificado = ahora
+
+    firma = _firma(csv_path)
+    if firma is not None and firma != estado.firma:
+        estado.firma = firma
+        programar_recarga(csv_path)
+
+
+# Preparaciones de otras capas (p.ej. payloads de heatmaps) para cada versión nueva
+_preparaciones: List[Callable[[DatasetSnapshot], Any]] = []
+
+
+def registrar_preparacion(funcion: Callable[[DatasetSnapshot], Any]) -> None:
+    """
+    Agrega una función que se ejecuta sobre cada snapshot recargado antes
+    de publicarlo, para que los requests encuentren sus cachés construidas
+    """
+    with _lock:
+        if funcion not in _preparaciones:
+            _preparaciones.append(funcion)
+
+
+def _preparar(snapshot: DatasetSnapshot) -> None:
+    """Construye los índices y cachés que usan los requests antes de publicar"""
+    # Import diferido: services.predictores importa este módulo
+    from services.predictores import obtener_predictor
+
+    if not snapshot.usar_escalado():
+        # En modo escalado los heatmaps usan la agregación, no la lista de filas
+        snapshot.heatmap_data
+    if _almacen_de(snapshot.csv_path) is None:
+        # Con el almacén SQLite las búsquedas de vecinos usan su R*Tree
+        snapshot.kdtree(settings.knn_escala)
+    if not snapshot.empty:
+        try:
+            obtener_predictor(settings.modo_prediccion, snapshot)
+        except ValueError:
+            # El backend por defecto no soporta este dataset; se informa al predecir
+            pass
+
+    for funcion in list(_preparaciones):
+        try:
+            funcion(snapshot)
+        except Exception as e:
+            # Lo que no se pudo preparar se construye en el primer request
+            logger.warning("No se pudo preparar %s para %s: %s", funcion, snapshot.csv_path, e)
+
+
+def programar_recarga(csv_path: str,
+                      fabrica: Optional[Callable[[], DatasetSnapshot]] = None
+                      ) -> threading.Thread:
+    """
+    Reconstruye el snapshot de csv_path en un hilo y lo publica al terminar
+
+    Si ya hay una recarga en curso, se marca como pendiente y al terminar
+    se vuelve a leer el archivo completo (que incluye todos los cambios).
+
+    Args:
+        csv_path: Ruta del dataset
+        fabrica: Construye el snapshot nuevo (por defecto relee el archivo)
+
+    Returns:
+        El hilo de la recarga en curso
+    """
+    with _lock:
+        estado = _estados.setdefault(
+            csv_path, _EstadoArchivo(firma=_firma(csv_path), verificado=time.monotonic())
+        )
+        if estado.recarga is not None and estado.recarga.is_alive():
+            estado.pendiente = True
+            return estado.recarga
+
+        hilo = threading.Thread(
+            target=_recargar, args=(csv_path, fabrica),
+            name=f"recarga-dataset-{os.path.basename(csv_path)}", daemon=True
+        )
+        estado.recarga = hilo
+        estado.pendiente = False
+        hilo.start()
+        return hilo
+
+
+def _recargar(csv_path: str, fabrica: Optional[Callable[[], DatasetSnapshot]]) -> None:
+    while True:
+        try:
+            snapshot = fabrica() if fabrica is not None else cargar_snapshot(csv_path)
+            _preparar(snapshot)
+        except (FileNotFoundError, ValueError) as e:
+            # Se mantiene la versión vigente; el próximo cambio vuelve a intentar
+            logger.warning("No se pudo recargar el dataset %s: %s", csv_path, e)
+            snapshot = None
+
+        with _lock:
+            if snapshot is not None and csv_path in _snapshots:
+                _snapshots[csv_path] = snapshot
+                logger.info("Dataset %s actualizado a la versión %d", csv_path, snapshot.version)
+
+            estado = _estados.get(csv_path)
+            if estado is None:
+                # liberar_memoria descartó el dataset durante la recarga
+                return
+            if not estado.pendiente:
+                estado.recarga = None
+                return
+            estado.pendiente = False
+            fabrica = None
+
+
+def agregar_filas(csv_path: str, area_vidrio, tv, yhat) -> threading.Thread:
+    """
+    Agrega filas de simulación al CSV y programa la publicación de la nueva versión
+
+    Las filas se escriben primero en el CSV (quedan persistidas aunque el
+    proceso se reinicie) y, si el dataset se sirve desde el almacén SQLite,
+    también en la base (que es lo que se relee al recargar). Si no hay otra recarga en curso, el snapshot nuevo
+    se arma concatenando las columnas en memoria sin volver a parsear el CSV.
+
+    Args:
+        csv_path: Ruta del dataset
+        area_vidrio, tv, yhat: Columnas de las filas nuevas
+
+    Returns:
+        El hilo de la recarga programada
+
+    Raises:
+        FileNotFoundError: Si no se encuentra el CSV
+        ValueError: Si las filas son inválidas
+        sqlite3.Error: Si no se pudo escribir en la base SQLite
+    """
+    nuevas = [np.asarray(c, dtype=np.float64).ravel() for c in (area_vidrio, tv, yhat)]
+    n = nuevas[0].shape[0]
+    if n == 0 or any(c.shape[0] != n for c in nuevas):
+        raise ValueError("Las columnas area_vidrio, tv e yhat deben tener el mismo largo (> 0)")
+    if not all(np.all(np.isfinite(c)) for c in nuevas):
+        raise ValueError("Las filas agregadas deben tener valores numéricos finitos")
+
+    base = obtener_snapshot(csv_path)
+    with _lock_escritura:
+        _escribir_filas_csv(csv_path, base.columns, nuevas)
+        almacen = _almacen_de(csv_path)
+        if almacen is not None:
+            almacen.agregar(almacen_sqlite.nombre_dataset(csv_path), *nuevas)
+        firma = _firma(csv_path)
+
+    with _lock:
+        estado = _estados.setdefault(
+            csv_path, _EstadoArchivo(firma=firma, verificado=time.monotonic()))
+        estado.firma = firma
+        mtime = firma[0]
+
+        def fabrica() -> DatasetSnapshot:
+            return DatasetSnapshot.from_arrays(
+                csv_path,
+                *(np.concatenate((actual, agregada))
+                  for actual, agregada in zip((base.area_vidrio, base.tv, base.yhat), nuevas)),
+                columns=base.columns,
+                mtime=mtime,
+            )
+
+        return programar_recarga(csv_path, fabrica)
+
+
+def _escribir_filas_csv(csv_path: str, columnas: Tuple[str, ...], nuevas: List[np.ndarray]) -> None:
+    """Agrega las filas al final del CSV; las columnas extra quedan vacías"""
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(
+            f"No se encontró el archivo CSV en: {csv_path}"
+        )
+
+    with open(csv_path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        termina_en_linea = f.tell() == 0
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            termina_en_linea = f.read(1) == b"\n"
+
+    valores = dict(zip(REQUIRED_COLS, nuevas))
+    with open(csv_path, "a", encoding="utf-8", newline="") as f:
+        if not termina_en_linea:
+            f.write("\n")
+        writer = csv.writer(f)
+        for i in range(nuevas[0].shape[0]):
+            writer.writerow([
+                repr(float(valores[col][i])) if col in valores else ""
+                for col in columnas
+            ])
+
+
+def liberar_memoria(conservar: Optional[str] = None) -> List[str]:
+    """
+    Descarta los snapshots menos usados hasta entrar en el presupuesto de memoria
+
+    Los requests en curso conservan su referencia al snapshot descartado;
+    solo se libera cuando terminan.
+
+    Args:
+        conservar: Ruta que no se descarta aunque se supere el presupuesto
+
+    Returns:
+        Rutas descartadas
+    """
+    presupuesto = settings.memoria_max_datasets_mb * 1024 * 1024
+    descartados = []
+
+    with _lock:
+        total = sum(s.memoria_estimada() for s in _snapshots.values())
+        for ruta in list(_snapshots):
+            if total <= presupuesto:
+                break
+            if ruta == conservar:
+                continue
+            total -= _snapshots.pop(ruta).memoria_estimada()
+            _estados.pop(ruta, None)
+            descartados.append(ruta)
+
+    return descartados
+
+
+def snapshots_cargados() -> List[Dict[str, Any]]:
+    """Datasets cargados en el proceso, del menos al más usado"""
+    with _lock:
+        return [
+            {
+                "csv_path": ruta,
+                "version": s.version,
+                "filas": len(s),
+                "memoria_bytes": s.memoria_estimada()
+            }
+            for ruta, s in _snapshots.items()
+        ]
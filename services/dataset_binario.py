@@ -0,0 +1,357 @@
+"""
+Formato binario columnar del dataset de simulación.
+
+El CSV se compila una vez (en el build) a un archivo .luzbin que los
+workers abren con numpy.memmap: el arranque no parsea texto y las
+páginas se comparten entre procesos a través del page cache del SO.
+
+Estructura del archivo:
+    MAGIC (8 bytes) | largo del header (uint32 LE) | header JSON (UTF-8)
+    | relleno hasta ALINEACION | columnas, cada una alineada a ALINEACION
+
+El header describe cada columna (dtype, offset, largo, forma), la
+metadata del lattice si el dataset es una grilla regular, los datos del
+CSV de origen y un SHA-256 de la sección de datos. Además de las columnas
+puede guardar estructuras derivadas (p.ej. el KD-tree, como
+"kdtree/<escala>/<campo>") para que cada worker las abra sin construirlas.
+
+Uso:
+    python -m services.dataset_binario compilar datos_sudi_limpio.csv [-o salida.luzbin] [--dtype float32] [--kdtree rango]
+    python -m services.dataset_binario verificar datos_sudi_limpio.luzbin
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.kdtree import KDTree
+from services.lattice import Lattice, detectar_lattice
+
+MAGIC = b"LUZDSET1"
+EXTENSION = ".luzbin"
+ALINEACION = 64
+VERSION_FORMATO = 1
+
+COLUMNAS = ("area_vidrio", "tv", "yhat")
+COLUMNAS_LATTICE = ("lattice_x", "lattice_y", "lattice_yhat")
+
+
+def ruta_binaria(csv_path: str) -> str:
+    """Ruta del .luzbin que corresponde a un CSV"""
+    return os.path.splitext(csv_path)[0] + EXTENSION
+
+
+def _alinear(n: int) -> int:
+    return (n + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+def _tramos(columnas: Iterable[np.ndarray]) -> Iterator[Tuple[np.ndarray, bytes]]:
+    """Cada columna (contigua) con el relleno que la lleva hasta ALINEACION"""
+    for arr in columnas:
+        arr = np.ascontiguousarray(arr)
+        yield arr, b"\0" * (_alinear(arr.nbytes) - arr.nbytes)
+
+
+def escribir_binario(destino: str, area_vidrio: np.ndarray, tv: np.ndarray,
+                     yhat: np.ndarray, dtype: str = "float64",
+                     fuente: Optional[Dict[str, Any]] = None,
+                     extras: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+    """
+    Escribe las columnas en formato .luzbin (reemplazo atómico del destino)
+
+    Args:
+        destino: Ruta del archivo a generar
+        area_vidrio, tv, yhat: Columnas del dataset
+        dtype: "float64" o "float32"
+        fuente: Metadata del CSV de origen (ruta, tamaño, mtime)
+        extras: Arrays adicionales por nombre; conservan su dtype y forma
+
+    Returns:
+        El header escrito
+    """
+    dt = np.dtype(dtype).newbyteorder("<")
+    if dt.kind != "f":
+        raise ValueError(f"dtype inválido: {dtype}. Opciones válidas: float64, float32")
+
+    columnas = {
+        "area_vidrio": np.asarray(area_vidrio, dtype=dt),
+        "tv": np.asarray(tv, dtype=dt),
+        "yhat": np.asarray(yhat, dtype=dt),
+    }
+
+    lattice = detectar_lattice(
+        np.asarray(area_vidrio, dtype=np.float64),
+        np.asarray(tv, dtype=np.float64),
+        np.asarray(yhat, dtype=np.float64),
+    )
+    if lattice is not None:
+        # La grilla se guarda aparte para no reordenar las filas del CSV
+        columnas["lattice_x"] = lattice.x_coords.astype(dt)
+        columnas["lattice_y"] = lattice.y_coords.astype(dt)
+        columnas["lattice_yhat"] = lattice.grid.ravel().astype(dt)
+
+    for nombre, arr in (extras or {}).items():
+        arr = np.ascontiguousarray(arr)
+        columnas[nombre] = arr.astype(arr.dtype.newbyteorder("<"))
+
+    descriptores = []
+    offset = 0
+    for nombre, arr in columnas.items():
+        descriptores.append({
+            "nombre": nombre,
+            "dtype": arr.dtype.str,
+            "offset": offset,
+            "largo": int(arr.size),
+            "forma": list(arr.shape)
+        })
+        offset = _alinear(offset + arr.nbytes)
+
+    # La sección de datos no se arma en memoria: se recorre una vez para el
+    # checksum y otra para escribirla, columna por columna
+    sha = hashlib.sha256()
+    for arr, relleno in _tramos(columnas.values()):
+        sha.update(memoryview(arr).cast("B"))
+        sha.update(relleno)
+
+    header = {
+        "version": VERSION_FORMATO,
+        "filas": int(columnas["yhat"].size),
+        "columnas": descriptores,
+        "lattice": lattice.metadata() if lattice is not None else None,
+        "fuente": fuente,
+        "largo_datos": offset,
+        "sha256": sha.hexdigest()
+    }
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    inicio_datos = _alinear(len(MAGIC) + 4 + len(header_bytes))
+    preambulo = MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+    preambulo += b"\0" * (inicio_datos - len(preambulo))
+
+    temporal = destino + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(preambulo)
+        for arr, relleno in _tramos(columnas.values()):
+            f.write(memoryview(arr).cast("B"))
+            f.write(relleno)
+    os.replace(temporal, destino)
+
+    return header
+
+
+def leer_header(ruta: str) -> Dict[str, Any]:
+    """
+    Lee y valida el header de un .luzbin
+
+    Raises:
+        ValueError: Si el archivo no tiene el formato esperado
+    """
+    with open(ruta, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Archivo de dataset binario inválido: {ruta}")
+        largo_bytes = f.read(4)
+        if len(largo_bytes) < 4:
+            raise ValueError(f"Dataset binario truncado: {ruta}")
+        (largo,) = struct.unpack("<I", largo_bytes)
+        header_bytes = f.read(largo)
+
+    if len(header_bytes) < largo:
+        raise ValueError(f"Dataset binario truncado: {ruta}")
+    try:
+        header = json.loads(header_bytes.decode("utf-8"))
+    except ValueError as e:
+        raise ValueError(f"Header inválido en dataset binario {ruta}: {e}") from e
+
+    if not isinstance(header, dict):
+        raise ValueError(f"Header inválido en dataset binario {ruta}")
+    if header.get("version") != VERSION_FORMATO:
+        raise ValueError(f"Versión de dataset binario no soportada: {header.get('version')}")
+
+    header["inicio_datos"] = _alinear(len(MAGIC) + 4 + largo)
+    return header
+
+
+def _largo_datos(ruta: str, header: Dict[str, Any]) -> int:
+    """
+    Largo de la sección de datos según el header, validando que cada
+    columna quede dentro de ella y que el archivo tenga exactamente ese tamaño
+
+    Raises:
+        ValueError: Si los descriptores no son coherentes o el archivo está
+            truncado o tiene bytes de más
+    """
+    try:
+        fin = 0
+        for desc in header["columnas"]:
+            dt = np.dtype(desc["dtype"])
+            forma = desc.get("forma", [desc["largo"]])
+            if desc["offset"] < 0 or desc["offset"] % ALINEACION or int(np.prod(forma)) != desc["largo"]:
+                raise ValueError(f"columna {desc['nombre']} fuera de formato")
+            fin = max(fin, desc["offset"] + desc["largo"] * dt.itemsize)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Header inválido en dataset binario {ruta}: {e}") from e
+
+    largo_datos = _alinear(fin)
+    # Los archivos anteriores a "largo_datos" en el header usan el calculado
+    if header.get("largo_datos", largo_datos) != largo_datos:
+        raise ValueError(f"Header inválido en dataset binario {ruta}: largo de datos inconsistente")
+
+    esperado = header["inicio_datos"] + largo_datos
+    tamano = os.path.getsize(ruta)
+    if tamano < esperado:
+        raise ValueError(f"Dataset binario truncado: {ruta} ({tamano} bytes, se esperaban {esperado})")
+    if tamano > esperado:
+        raise ValueError(f"Dataset binario con datos de más: {ruta} ({tamano} bytes, se esperaban {esperado})")
+    return largo_datos
+
+
+def abrir_binario(ruta: str, verificar: bool = False) -> Dict[str, Any]:
+    """
+    Abre un .luzbin con numpy.memmap, sin copiar las columnas a memoria
+
+    Args:
+        ruta: Ruta del archivo
+        verificar: Si True, recalcula el SHA-256 de la sección de datos
+
+    Returns:
+        Dict con "header", una entrada por columna (memmap de solo lectura)
+        y "lattice" (Lattice o None)
+
+    Raises:
+        ValueError: Si el formato o el checksum no son válidos, o si el
+            tamaño del archivo no coincide con el header (siempre se valida,
+            aunque no se pida verificar el checksum)
+    """
+    header = leer_header(ruta)
+    inicio = header["inicio_datos"]
+    descriptores = header["columnas"]
+    largo_datos = _largo_datos(ruta, header)
+
+    mapa = np.memmap(ruta, dtype=np.uint8, mode="r", offset=inicio, shape=(largo_datos,))
+
+    if verificar and hashlib.sha256(mapa).hexdigest() != header["sha256"]:
+        raise ValueError(f"Checksum inválido en dataset binario: {ruta}")
+
+    resultado: Dict[str, Any] = {"header": header}
+    for desc in descriptores:
+        dt = np.dtype(desc["dtype"])
+        tramo = mapa[desc["offset"]:desc["offset"] + desc["largo"] * dt.itemsize]
+        resultado[desc["nombre"]] = tramo.view(dt).reshape(desc.get("forma", [desc["largo"]]))
+
+    resultado["lattice"] = None
+    meta = header.get("lattice")
+    if meta is not None:
+        x = resultado["lattice_x"]
+        y = resultado["lattice_y"]
+        resultado["lattice"] = Lattice(
+            x0=meta["x0"], dx=meta["dx"], nx=meta["nx"],
+            y0=meta["y0"], dy=meta["dy"], ny=meta["ny"],
+            x_coords=x, y_coords=y,
+            grid=resultado["lattice_yhat"].reshape(meta["nx"], meta["ny"]),
+        )
+
+    return resultado
+
+
+def kdtrees_guardados(datos: Dict[str, Any]) -> Dict[str, KDTree]:
+    """KD-trees guardados en un .luzbin abierto, por escala"""
+    arboles = {}
+    for nombre in datos:
+        partes = nombre.split("/")
+        if len(partes) == 3 and partes[0] == "kdtree" and partes[2] == "meta":
+            prefijo = f"kdtree/{partes[1]}/"
+            arboles[partes[1]] = KDTree.desde_arrays({
+                k[len(prefijo):]: v for k, v in datos.items() if k.startswith(prefijo)
+            })
+    return arboles
+
+
+def binario_vigente(csv_path: str, bin_path: str) -> bool:
+    """
+    Indica si el .luzbin puede usarse en lugar del CSV
+
+    Es vigente si existe y el CSV no existe o coincide en tamaño y mtime
+    con el que se usó para compilarlo.
+    """
+    if not os.path.exists(bin_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+
+    try:
+        fuente = leer_header(bin_path).get("fuente") or {}
+    except (ValueError, OSError):
+        return False
+
+    stat = os.stat(csv_path)
+    return fuente.get("tamano") == stat.st_size and fuente.get("mtime") == stat.st_mtime
+
+
+def compilar_csv(csv_path: str, destino: Optional[str] = None,
+                 dtype: str = "float64",
+                 escalas_kdtree: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Compila un CSV de simulación a .luzbin
+
+    Args:
+        csv_path: CSV de origen
+        destino: Archivo a generar (por defecto junto al CSV)
+        dtype: "float64" o "float32" para las columnas
+        escalas_kdtree: Escalas para las que se guarda el KD-tree ya construido
+    """
+    # Import diferido: evita un ciclo con services.dataset
+    from services.dataset import cargar_snapshot_csv
+
+    snapshot = cargar_snapshot_csv(csv_path)
+    stat = os.stat(csv_path)
+    fuente = {
+        "csv": os.path.basename(csv_path),
+        "tamano": stat.st_size,
+        "mtime": stat.st_mtime,
+        "columnas": list(snapshot.columns)
+    }
+    extras = {}
+    for escala in escalas_kdtree:
+        arbol = KDTree(np.column_stack((snapshot.area_vidrio, snapshot.tv)), escala=escala)
+        for campo, arr in arbol.exportar().items():
+            extras[f"kdtree/{escala}/{campo}"] = arr
+
+    return escribir_binario(
+        destino or ruta_binaria(csv_path),
+        snapshot.area_vidrio, snapshot.tv, snapshot.yhat,
+        dtype=dtype, fuente=fuente, extras=extras,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset binario de simulación")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_compilar = sub.add_parser("compilar", help="Compila un CSV a .luzbin")
+    p_compilar.add_argument("csv")
+    p_compilar.add_argument("-o", "--salida", default=None)
+    p_compilar.add_argument("--dtype", default="float64", choices=["float64", "float32"])
+    p_compilar.add_argument("--kdtree", action="append", default=[], metavar="ESCALA",
+                            help="Guardar el KD-tree para esta escala (repetible)")
+
+    p_verificar = sub.add_parser("verificar", help="Verifica header y checksum")
+    p_verificar.add_argument("archivo")
+
+    args = parser.parse_args()
+
+    if args.comando == "compilar":
+        header = compilar_csv(args.csv, args.salida, args.dtype, args.kdtree)
+        destino = args.salida or ruta_binaria(args.csv)
+        print(f"{destino}: {header['filas']} filas, lattice={header['lattice'] is not None}")
+    else:
+        datos = abrir_binario(args.archivo, verificar=True)
+        print(f"{args.archivo}: OK ({datos['header']['filas']} filas)")
+
+
+if __name__ == "__main__":
+    main()
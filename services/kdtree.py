@@ -0,0 +1,341 @@
+"""
+KD-tree en NumPy para búsquedas k-NN sobre datasets irregulares.
+
+Los ejes se normalizan antes de construir el árbol para que area_vidrio
+(0.25–12 m²) y tv (0.1–0.9) pesen lo mismo en la distancia.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+ESCALAS_VALIDAS = ("rango", "std", "ninguna")
+
+# Consultas x puntos evaluados a la vez al combinar nodos en query_many
+_MAX_PARES_BLOQUE = 4_000_000
+# Con menos consultas, query_many busca de a una (el recorrido por lotes
+# tiene un costo fijo de ~1 ms)
+_MIN_CONSULTAS_LOTE = 8
+
+
+def escala_por_eje(puntos: np.ndarray, modo: str = "rango") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula (offset, factor) por eje para normalizar los puntos
+
+    Args:
+        puntos: Array (n, d)
+        modo: "rango" (min-max), "std" (z-score) o "ninguna"
+
+    Returns:
+        Tuple (offset, factor) tal que (p - offset) * factor queda normalizado
+    """
+    if modo not in ESCALAS_VALIDAS:
+        raise ValueError(
+            f"Escala inválida: {modo}. Opciones válidas: {list(ESCALAS_VALIDAS)}"
+        )
+
+    d = puntos.shape[1]
+    if modo == "ninguna" or puntos.shape[0] == 0:
+        return np.zeros(d), np.ones(d)
+
+    if modo == "rango":
+        offset = puntos.min(axis=0)
+        ancho = puntos.max(axis=0) - offset
+    else:
+        offset = puntos.mean(axis=0)
+        ancho = puntos.std(axis=0)
+
+    # Ejes constantes no se escalan
+    ancho = np.where(ancho > 0, ancho, 1.0)
+    return offset, 1.0 / ancho
+
+
+class KDTree:
+    """Árbol k-d estático con hojas de tamaño fijo"""
+
+    def __init__(self, puntos: np.ndarray, escala: str = "rango",
+                 factores: Optional[Sequence[float]] = None, leafsize: int = 16):
+        """
+        Args:
+            puntos: Array (n, d) con las coordenadas originales
+            escala: Modo de normalización por eje (ver escala_por_eje)
+            factores: Factores explícitos por eje; reemplazan a escala
+            leafsize: Máximo de puntos por hoja
+        """
+        puntos = np.asarray(puntos, dtype=np.float64)
+        validos = np.flatnonzero(np.all(np.isfinite(puntos), axis=1))
+        puntos = puntos[validos]
+
+        if factores is not None:
+            self._offset = np.zeros(puntos.shape[1])
+            self._factor = np.asarray(factores, dtype=np.float64)
+        else:
+            self._offset, self._factor = escala_por_eje(puntos, escala)
+
+        self.leafsize = max(1, int(leafsize))
+        self.n = puntos.shape[0]
+
+        normalizados = (puntos - self._offset) * self._factor
+        perm = np.arange(self.n)
+
+        # Nodos en arrays paralelos; dim == -1 marca una hoja
+        self._lo, self._hi, self._dim = [], [], []
+        self._split, self._left, self._right = [], [], []
+
+        if self.n:
+            self._build(normalizados, perm, 0, self.n)
+
+        # Puntos reordenados por hoja para accesos contiguos
+        self._pts = np.ascontiguousarray(normalizados[perm])
+        self._idx = validos[perm]
+        self._tabla = tuple(np.asarray(c) for c in (
+            self._lo, self._hi, self._dim, self._split, self._left, self._right
+        ))
+
+    def exportar(self) -> Dict[str, np.ndarray]:
+        """
+        Arrays planos que describen el árbol (para guardarlo en el .luzbin)
+
+        Returns:
+            Dict con pts, idx, nodos (lo, hi, dim, left, right), split,
+            offset, factor y meta (n, leafsize)
+        """
+        return {
+            "pts": self._pts,
+            "idx": np.asarray(self._idx, dtype=np.int64),
+            "nodos": np.array(
+                [self._lo, self._hi, self._dim, self._left, self._right], dtype=np.int64
+            ).T.reshape(-1, 5),
+            "split": np.asarray(self._split, dtype=np.float64),
+            "offset": np.asarray(self._offset, dtype=np.float64),
+            "factor": np.asarray(self._factor, dtype=np.float64),
+            "meta": np.array([self.n, self.leafsize], dtype=np.int64),
+        }
+
+    @classmethod
+    def desde_arrays(cls, arrays: Dict[str, np.ndarray]) -> "KDTree":
+        """
+        Reconstruye un árbol exportado sin volver a construirlo.
+
+        pts e idx se usan tal cual (pueden ser memmaps compartidos entre
+        procesos); solo la tabla de nodos se copia a listas.
+        """
+        arbol = cls.__new__(cls)
+        arbol.n, arbol.leafsize = (int(v) for v in arrays["meta"])
+        arbol._offset = np.asarray(arrays["offset"], dtype=np.float64)
+        arbol._factor = np.asarray(arrays["factor"], dtype=np.float64)
+        nodos = np.asarray(arrays["nodos"]).reshape(-1, 5)
+        arbol._lo, arbol._hi, arbol._dim, arbol._left, arbol._right = (
+            nodos[:, c].tolist() for c in range(5)
+        )
+        arbol._split = np.asarray(arrays["split"]).tolist()
+        arbol._tabla = (nodos[:, 0], nodos[:, 1], nodos[:, 2],
+                        np.asarray(arrays["split"], dtype=np.float64), nodos[:, 3], nodos[:, 4])
+        arbol._pts = arrays["pts"]
+        arbol._idx = arrays["idx"]
+        return arbol
+
+    def _build(self, pts: np.ndarray, perm: np.ndarray, lo: int, hi: int) -> int:
+        nodo = len(self._lo)
+        self._lo.append(lo)
+        self._hi.append(hi)
+        self._dim.append(-1)
+        self._split.append(0.0)
+        self._left.append(-1)
+        self._right.append(-1)
+
+        if hi - lo <= self.leafsize:
+            return nodo
+
+        segmento = pts[perm[lo:hi]]
+        extension = segmento.max(axis=0) - segmento.min(axis=0)
+        dim = int(np.argmax(extension))
+        if extension[dim] == 0:
+            # Todos los puntos coinciden: no hay corte posible
+            return nodo
+
+        mid = (lo + hi) // 2
+        orden = np.argpartition(segmento[:, dim], mid - lo)
+        perm[lo:hi] = perm[lo:hi][orden]
+
+        self._dim[nodo] = dim
+        self._split[nodo] = float(pts[perm[mid], dim])
+        self._left[nodo] = self._build(pts, perm, lo, mid)
+        self._right[nodo] = self._build(pts, perm, mid, hi)
+        return nodo
+
+    def normalizar(self, puntos) -> np.ndarray:
+        """Lleva coordenadas originales al espacio normalizado del árbol"""
+        return (np.asarray(puntos, dtype=np.float64) - self._offset) * self._factor
+
+    def query(self, punto, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los k vecinos más cercanos a un punto
+
+        Args:
+            punto: Coordenadas originales (d,)
+            k: Cantidad de vecinos
+
+        Returns:
+            Tuple (distancias, índices) ordenados por distancia creciente.
+            Las distancias están en el espacio normalizado y los índices
+            refieren a las filas del array original.
+
+        Raises:
+            ValueError: Si el árbol está vacío
+        """
+        if self.n == 0:
+            raise ValueError("No se encontró un punto de predicción válido.")
+
+        k = max(1, min(int(k), self.n))
+        q = self.normalizar(punto)
+
+        mejores_d = np.empty(0)
+        mejores_i = np.empty(0, dtype=np.intp)
+        # (nodo, cota inferior de la distancia² a cualquier punto del nodo)
+        pila = [(0, 0.0)]
+
+        while pila:
+            nodo, cota = pila.pop()
+            peor = mejores_d.max() if mejores_d.size == k else np.inf
+            # A igual cota se visita igual: puede tener un empate que gane
+            if nodo < 0 or cota > peor:
+                continue
+
+            dim = self._dim[nodo]
+
+            if dim < 0:
+                lo, hi = self._lo[nodo], self._hi[nodo]
+                d2 = ((self._pts[lo:hi] - q) ** 2).sum(axis=1)
+                cand_d = np.concatenate((mejores_d, d2))
+                cand_i = np.concatenate((mejores_i, np.arange(lo, hi)))
+                if cand_d.size > k:
+                    # A igual distancia gana la primera fila del array original
+                    sel = np.lexsort((self._idx[cand_i], cand_d))[:k]
+                    cand_d, cand_i = cand_d[sel], cand_i[sel]
+                mejores_d, mejores_i = cand_d, cand_i
+                continue
+
+            delta = q[dim] - self._split[nodo]
+            cerca, lejos = (
+                (self._left[nodo], self._right[nodo]) if delta <= 0
+                else (self._right[nodo], self._left[nodo])
+            )
+            # Se apila primero el lado lejano para visitarlo después
+            pila.append((lejos, max(cota, delta * delta)))
+            pila.append((cerca, cota))
+
+        orden = np.lexsort((self._idx[mejores_i], mejores_d))
+        return np.sqrt(mejores_d[orden]), self._idx[mejores_i[orden]]
+
+    def _tabla_nodos(self) -> Tuple[np.ndarray, ...]:
+        """(lo, hi, dim, split, left, right) como arrays, para recorrer el árbol por lotes"""
+        return self._tabla
+
+    def _bajar(self, q: np.ndarray, k: int) -> np.ndarray:
+        """Nodo más profundo con al menos k puntos en el camino de cada consulta"""
+        lo, hi, dims, splits, left, right = self._tabla_nodos()
+        nodo = np.zeros(q.shape[0], dtype=np.intp)
+        activos = np.flatnonzero(dims[nodo] >= 0)
+        while activos.size:
+            actual = nodo[activos]
+            izquierda = q[activos, dims[actual]] - splits[actual] <= 0
+            hijo = np.where(izquierda, left[actual], right[actual])
+            baja = hi[hijo] - lo[hijo] >= k
+            activos, hijo = activos[baja], hijo[baja]
+            nodo[activos] = hijo
+            activos = activos[dims[hijo] >= 0]
+        return nodo
+
+    def _fusionar(self, q: np.ndarray, consultas: np.ndarray, nodos: np.ndarray,
+                  mejores_d: np.ndarray, mejores_i: np.ndarray) -> None:
+        """
+        Combina los puntos de cada nodo (su tramo lo:hi de _pts) con los k
+        mejores de su consulta. Una consulta puede aparecer en varios pares:
+        se procesan por rondas con cada consulta a lo sumo una vez.
+        """
+        lo, hi = self._tabla_nodos()[:2]
+        k = mejores_d.shape[1]
+        while consultas.size:
+            unicas, primero = np.unique(consultas, return_index=True)
+            inicio, cantidad = lo[nodos[primero]], hi[nodos[primero]] - lo[nodos[primero]]
+            ancho = int(cantidad.max())
+            bloque = max(1, _MAX_PARES_BLOQUE // ancho)
+            for a in range(0, unicas.size, bloque):
+                c, n0, cant = unicas[a:a + bloque], inicio[a:a + bloque], cantidad[a:a + bloque]
+                validos = np.arange(ancho) < cant[:, None]
+                pos = np.where(validos, n0[:, None] + np.arange(ancho), 0)
+                d2 = ((q[c, None, :] - self._pts[pos]) ** 2).sum(axis=2)
+                d2[~validos] = np.inf
+                cand_d = np.concatenate((mejores_d[c], d2), axis=1)
+                cand_i = np.concatenate((mejores_i[c], pos), axis=1)
+                # A igual distancia gana la primera fila del array original
+                orden = np.lexsort((self._idx[cand_i], cand_d), axis=1)[:, :k]
+                mejores_d[c] = np.take_along_axis(cand_d, orden, axis=1)
+                mejores_i[c] = np.take_along_axis(cand_i, orden, axis=1)
+            resto = np.ones(consultas.size, dtype=bool)
+            resto[primero] = False
+            consultas, nodos = consultas[resto], nodos[resto]
+
+    def query_many(self, puntos, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Versión por lotes de query; devuelve arrays (m, k)
+
+        Todas las consultas recorren el árbol juntas, nivel por nivel, como
+        pares (consulta, nodo) en arrays. Primero cada consulta baja hasta
+        el nodo más profundo de su camino con al menos k puntos y los toma
+        como cota inicial; después se descartan los pares cuya cota inferior
+        supera la k-ésima mejor distancia de su consulta y en las hojas las
+        distancias se calculan como una matriz pares x puntos de la hoja.
+        Los empates se resuelven igual que en query.
+
+        Raises:
+            ValueError: Si el árbol está vacío
+        """
+        puntos = np.atleast_2d(np.asarray(puntos, dtype=np.float64))
+        m = puntos.shape[0]
+        if m == 0:
+            k = max(1, min(int(k), self.n)) if self.n else 1
+            return np.empty((0, k)), np.empty((0, k), dtype=np.intp)
+        if self.n == 0:
+            raise ValueError("No se encontró un punto de predicción válido.")
+
+        k = max(1, min(int(k), self.n))
+        if m < _MIN_CONSULTAS_LOTE:
+            resultados = [self.query(punto, k) for punto in puntos]
+            return (np.array([d for d, _ in resultados]),
+                    np.array([i for _, i in resultados], dtype=np.intp))
+
+        q = self.normalizar(puntos)
+        lo, hi, dims, splits, left, right = self._tabla_nodos()
+        # k mejores distancias² (crecientes) y posiciones en _pts por consulta
+        mejores_d = np.full((m, k), np.inf)
+        mejores_i = np.full((m, k), -1, dtype=np.intp)
+
+        inicial = self._bajar(q, k)
+        self._fusionar(q, np.arange(m), inicial, mejores_d, mejores_i)
+        inicial_lo, inicial_hi = lo[inicial], hi[inicial]
+
+        # Pares (consulta, nodo) con la cota inferior de la distancia² de la consulta al nodo
+        consultas = np.arange(m)
+        nodos = np.zeros(m, dtype=np.intp)
+        cotas = np.zeros(m)
+        while consultas.size:
+            vivos = cotas <= mejores_d[consultas, -1]
+            consultas, nodos, cotas = consultas[vivos], nodos[vivos], cotas[vivos]
+
+            hoja = dims[nodos] < 0
+            c, n = consultas[hoja], nodos[hoja]
+            # Los puntos del nodo inicial ya se combinaron
+            nuevos = (lo[n] < inicial_lo[c]) | (lo[n] >= inicial_hi[c])
+            self._fusionar(q, c[nuevos], n[nuevos], mejores_d, mejores_i)
+
+            c, n, cota = consultas[~hoja], nodos[~hoja], cotas[~hoja]
+            delta = q[c, dims[n]] - splits[n]
+            lejos = np.maximum(cota, delta * delta)
+            izquierda = delta <= 0
+            consultas = np.concatenate((c, c))
+            nodos = np.concatenate((left[n], right[n]))
+            cotas = np.concatenate((np.where(izquierda, cota, lejos), np.where(izquierda, lejos, cota)))
+
+        return np.sqrt(mejores_d), self._idx[mejores_i]
@@ -0,0 +1,170 @@
+"""
+Detección de grillas rectilíneas regulares en el dataset de simulación.
+
+Cuando los puntos (area_vidrio, tv) forman un lattice completo con paso
+constante en cada eje, el vecino más cercano se obtiene por aritmética de
+índices en O(1) en lugar de recorrer todo el dataset.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Lattice:
+    """Grilla regular nx × ny con valores yhat indexados por [ix, iy]"""
+
+    x0: float
+    dx: float
+    nx: int
+    y0: float
+    dy: float
+    ny: int
+    x_coords: np.ndarray  # niveles de area_vidrio tal como vienen del CSV
+    y_coords: np.ndarray  # niveles de tv tal como vienen del CSV
+    grid: np.ndarray  # shape (nx, ny)
+
+    @staticmethod
+    def _snap(valores, coords: np.ndarray, origen: float, paso: float) -> np.ndarray:
+        v = np.asarray(valores, dtype=np.float64)
+        n = coords.size
+        # Candidatos por aritmética; el desempate final usa los niveles reales
+        # para coincidir exactamente con la búsqueda lineal
+        i0 = np.clip(np.floor((v - origen) / paso), 0, n - 1).astype(np.intp)
+        i1 = np.minimum(i0 + 1, n - 1)
+        usar_i1 = np.abs(v - coords[i1]) < np.abs(v - coords[i0])
+        return np.where(usar_i1, i1, i0)
+
+    def nearest_index(self, area_vidrio, tv) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Índices (ix, iy) del nodo más cercano. Acepta escalares o arrays.
+
+        En un lattice rectilíneo el vecino euclidiano más cercano es el
+        producto de los vecinos más cercanos por eje.
+        """
+        ix = self._snap(area_vidrio, self.x_coords, self.x0, self.dx)
+        iy = self._snap(tv, self.y_coords, self.y0, self.dy)
+        return ix, iy
+
+    def nearest(self, area_vidrio, tv) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Devuelve (yhat, area_vidrio_usado, tv_usado) del nodo más cercano"""
+        ix, iy = self.nearest_index(area_vidrio, tv)
+        return self.grid[ix, iy], self.x_coords[ix], self.y_coords[iy]
+
+    def bilinear(self, area_vidrio, tv) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Interpolación bilineal entre los cuatro nodos que rodean cada consulta.
+
+        Acepta escalares o arrays; las consultas fuera del dominio se
+        proyectan al borde.
+
+        Returns:
+            (yhat, area_vidrio_usado, tv_usado), donde los puntos usados son
+            las consultas ya proyectadas al dominio
+        """
+        x = np.clip(np.asarray(area_vidrio, dtype=np.float64), self.x_coords[0], self.x_coords[-1])
+        y = np.clip(np.asarray(tv, dtype=np.float64), self.y_coords[0], self.y_coords[-1])
+
+        i0, tx = self._celda(x, self.x_coords, self.x0, self.dx)
+        j0, ty = self._celda(y, self.y_coords, self.y0, self.dy)
+
+        g = self.grid
+        yhat = (
+            g[i0, j0] * (1 - tx) * (1 - ty)
+            + g[i0 + 1, j0] * tx * (1 - ty)
+            + g[i0, j0 + 1] * (1 - tx) * ty
+            + g[i0 + 1, j0 + 1] * tx * ty
+        )
+        return yhat, x, y
+
+    @staticmethod
+    def _celda(v: np.ndarray, coords: np.ndarray, origen: float,
+               paso: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Índice inferior de la celda y fracción [0, 1] dentro de ella"""
+        i0 = np.clip(np.floor((v - origen) / paso), 0, coords.size - 2).astype(np.intp)
+        c0 = coords[i0]
+        t = np.clip((v - c0) / (coords[i0 + 1] - c0), 0.0, 1.0)
+        return i0, t
+
+    def metadata(self) -> dict:
+        return {
+            "x0": self.x0,
+            "dx": self.dx,
+            "nx": self.nx,
+            "y0": self.y0,
+            "dy": self.dy,
+            "ny": self.ny,
+        }
+
+
+def _eje_regular(valores: np.ndarray, rtol: float) -> Optional[Tuple[np.ndarray, float, np.ndarray]]:
+    """
+    Verifica que los valores de un eje caigan en niveles equiespaciados.
+
+    Returns:
+        (niveles, paso, índice de nivel por fila) o None si el eje es irregular
+    """
+    niveles = np.unique(valores)
+    if niveles.size < 2:
+        return None
+
+    paso = float(niveles[-1] - niveles[0]) / (niveles.size - 1)
+    if paso <= 0:
+        return None
+
+    pos = (niveles - niveles[0]) / paso
+    if np.max(np.abs(pos - np.arange(niveles.size))) > rtol:
+        return None
+
+    idx = np.searchsorted(niveles, valores)
+    niveles.setflags(write=False)
+    return niveles, paso, idx
+
+
+def detectar_lattice(area_vidrio: np.ndarray, tv: np.ndarray, yhat: np.ndarray,
+                     rtol: float = 1e-6) -> Optional[Lattice]:
+    """
+    Detecta si (area_vidrio, tv) forman un lattice rectilíneo completo.
+
+    Args:
+        area_vidrio, tv, yhat: Columnas del dataset
+        rtol: Tolerancia relativa al paso para aceptar un nivel
+
+    Returns:
+        Lattice con los valores yhat en grilla, o None si los datos son
+        irregulares, tienen huecos o puntos repetidos
+    """
+    if area_vidrio.size == 0 or not (
+            np.all(np.isfinite(area_vidrio)) and np.all(np.isfinite(tv))):
+        return None
+
+    eje_x = _eje_regular(area_vidrio, rtol)
+    eje_y = _eje_regular(tv, rtol)
+    if eje_x is None or eje_y is None:
+        return None
+
+    x_coords, dx, ix = eje_x
+    y_coords, dy, iy = eje_y
+    nx = x_coords.size
+    ny = y_coords.size
+
+    if nx * ny != area_vidrio.size:
+        return None
+
+    # Cada nodo debe aparecer exactamente una vez
+    ocupados = np.zeros((nx, ny), dtype=bool)
+    ocupados[ix, iy] = True
+    if not ocupados.all():
+        return None
+
+    grid = np.empty((nx, ny), dtype=np.float64)
+    grid[ix, iy] = yhat
+    grid.setflags(write=False)
+
+    return Lattice(
+        x0=float(x_coords[0]), dx=dx, nx=nx,
+        y0=float(y_coords[0]), dy=dy, ny=ny,
+        x_coords=x_coords, y_coords=y_coords, grid=grid,
+    )
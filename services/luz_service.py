@@ -1,16 +1,49 @@
-from typing import Dict, List, Optional, Tuple
+import csv
+import hashlib
+import io
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from pydantic import ValidationError
+from config import get_settings
 from schemas.luz_schemas import VentanaInput, MetricaOutput, PuntoUsado
 from services.data_service import DataService
-from utils.colores import obtener_color_hex, generar_colores_heatmap, generar_colores_metrica_heatmap, generar_colores_por_rangos
+from services.dataset import DatasetSnapshot
+from utils.codificacion import FORMATOS_HEATMAP, compactar_grilla, compactar_heatmap, compactar_scatter
+from utils.colores import colores_hex, indices_color, obtener_color_hex, generar_colores_heatmap, generar_colores_metrica_heatmap, generar_colores_por_rangos
 from utils.orientacion import codificar_orientacion
+from utils.grilla import Eje, celdas_heatmap, columnas_puntos, construir_grilla, eje_tile, rellenar, remuestrear, remuestrear_bloques
+from utils.lru import CacheLRU
+from utils.render import FORMATOS_RENDER, escribir_png, raster_grilla, renderizar_zonas, svg_grilla
 from utils.zonas_poligonales import get_zones_by_metric
 
+settings = get_settings()
+
+
+
+def _bytes_valor(valor: Any) -> int:
+    """Memoria de una grilla numpy o de un JSON ya serializado"""
+    return valor.nbytes if isinstance(valor, np.ndarray) else len(valor)
+
+
+# Heatmaps a resoluciones pedidas por los clientes, por versión del dataset:
+# grillas de la métrica (uint8) y payloads ya serializados, nunca listas JSON
+_cache_resoluciones = CacheLRU(settings.cache_resoluciones_heatmap,
+                               int(settings.cache_resoluciones_heatmap_mb * 1024 * 1024),
+                               _bytes_valor)
+
+# Tiles (zoom, x, y) ya serializados, compartidos entre usuarios
+_cache_tiles = CacheLRU(settings.cache_tiles_heatmap)
+
+# Imágenes PNG/SVG renderizadas (heatmaps por versión del dataset y zonas)
+_cache_render = CacheLRU(settings.cache_render)
+
 
 class LuzNaturalService:
     """Servicio principal para cálculos de luz natural"""
 
-    def __init__(self):
-        self.data_service = DataService()
+    def __init__(self, data_service: Optional[DataService] = None):
+        self.data_service = data_service or DataService()
 
     def calcular_metricas_desde_yhat(self, yhat: float) -> Dict[str, int]:
         """
@@ -33,12 +66,52 @@ class LuzNaturalService:
             "energia": int(max(0, 100 - y)),
         }
 
-    def generar_metricas_output(self, metricas: Dict[str, int]) -> List[MetricaOutput]:
+    def calcular_metricas_vectorizado(self, yhat: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Versión vectorizada de calcular_metricas_desde_yhat
+
+        Args:
+            yhat: Array de valores predichos
+
+        Returns:
+            Dict con un array de enteros por métrica
+        """
+        y = np.clip(np.asarray(yhat, dtype=np.float64), 0, 100)
+
+        # int() trunca hacia cero; todos los valores son no negativos
+        return {metrica: np.trunc(f(y)).astype(np.int64) for metrica, f in self._METRICAS_YHAT.items()}
+
+    def calcular_metrica(self, yhat: np.ndarray, metrica: str) -> np.ndarray:
+        """
+        Una sola métrica de calcular_metricas_vectorizado, en uint8
+
+        Para grillas grandes (imágenes, remuestreos): no arma las otras
+        métricas y usa un byte por valor (todas van de 0 a 100).
+        """
+        y = np.clip(np.asarray(yhat, dtype=np.float64), 0, 100)
+        # La conversión a entero trunca hacia cero, igual que np.trunc
+        return self._METRICAS_YHAT[metrica](y).astype(np.uint8)
+
+    # Cada métrica en función de yhat ya acotado a [0, 100], antes de truncar
+    _METRICAS_YHAT = {
+        "DA": lambda y: y,
+        "UDI": lambda y: np.minimum(100, y + 8),
+        "sDA": lambda y: np.maximum(0, y - 13),
+        "sUDI": lambda y: np.minimum(100, y + 4),
+        "DAv_zone": lambda y: y,
+        "energia": lambda y: np.maximum(0, 100 - y),
+    }
+
+    def generar_metricas_output(self, metricas: Dict[str, int],
+                                sheets_inline: Optional[bool] = None,
+                                sheets_variante: Optional[str] = None) -> List[MetricaOutput]:
         """
         Genera la lista de métricas con colores y sheets
 
         Args:
             metricas: Dict con los valores calculados
+            sheets_inline: Incluir las imágenes en base64 (por defecto solo URL + hash)
+            sheets_variante: Variante reducida de las imágenes (p.ej. "miniatura")
 
         Returns:
             Lista de MetricaOutput
@@ -49,7 +122,7 @@ class LuzNaturalService:
         for key in metricas_principales:
             if key in metricas:
                 try:
-                    sheet = self.data_service.get_model_sheet(key)
+                    sheet = self.data_service.get_model_sheet(key, sheets_inline, sheets_variante)
                     color_hex = obtener_color_hex(key, metricas[key])
 
                     resultado.append(MetricaOutput(
@@ -102,6 +175,28 @@ class LuzNaturalService:
 
         return echarts_data
 
+    # Grilla de los heatmaps ECharts
+    EJE_AREA = Eje(0.25, 12.0, 24)  # Divisiones en X (área)
+    EJE_TV = Eje(0.1, 0.9, 16)      # Divisiones en Y (TV)
+
+    def _heatmap_grilla(self, grilla: np.ndarray, eje_x: Optional[Eje] = None,
+                        eje_y: Optional[Eje] = None) -> Dict:
+        """Campos comunes de los heatmaps ECharts para una grilla (por defecto EJE_AREA x EJE_TV)"""
+        return {"heatmap_data": celdas_heatmap(grilla), **self._ejes_heatmap(eje_x, eje_y)}
+
+    def _ejes_heatmap(self, eje_x: Optional[Eje] = None, eje_y: Optional[Eje] = None) -> Dict:
+        """Etiquetas, tamaños y rangos de los ejes de un heatmap ECharts"""
+        eje_x = eje_x or self.EJE_AREA
+        eje_y = eje_y or self.EJE_TV
+        return {
+            "x_labels": eje_x.etiquetas(".1f"),
+            "y_labels": eje_y.etiquetas(".2f"),
+            "x_grid_size": eje_x.n,
+            "y_grid_size": eje_y.n,
+            "x_range": {"min": eje_x.minimo, "max": eje_x.maximo},
+            "y_range": {"min": eje_y.minimo, "max": eje_y.maximo},
+        }
+
     def generar_echarts_heatmap_data(self, heatmap_data: List, heatmap_colors: List) -> Dict:
         """
         Genera datos para ECharts heatmap con grilla completa usando interpolación simple
@@ -113,62 +208,10 @@ class LuzNaturalService:
         Returns:
             Dict con datos de heatmap completo, configuración de ejes y grilla
         """
-        # Configuración de la grilla
-        x_grid_size = 24  # Divisiones en X (área)
-        y_grid_size = 16  # Divisiones en Y (TV)
-
-        x_min, x_max = 0.25, 12.0
-        y_min, y_max = 0.1, 0.9
-
-        x_step = (x_max - x_min) / (x_grid_size - 1)
-        y_step = (y_max - y_min) / (y_grid_size - 1)
-
-        # Generar coordenadas y etiquetas de ejes
-        x_coords = [x_min + i * x_step for i in range(x_grid_size)]
-        y_coords = [y_min + i * y_step for i in range(y_grid_size)]
-
-        x_labels = [f"{x:.1f}" for x in x_coords]
-        y_labels = [f"{y:.2f}" for y in y_coords]
-
-        # Crear diccionario de datos existentes por coordenadas
-        data_dict = {}
-        for punto in heatmap_data:
-            if len(punto) >= 3:
-                area, tv, yhat = punto[0], punto[1], punto[2]
-                # Encontrar índices más cercanos
-                x_idx = min(range(x_grid_size), key=lambda i: abs(x_coords[i] - area))
-                y_idx = min(range(y_grid_size), key=lambda i: abs(y_coords[i] - tv))
-                data_dict[(x_idx, y_idx)] = yhat
-
-        # Interpolar valores faltantes usando nearest neighbor simple
-        heatmap_grid_data = []
-        for i in range(x_grid_size):
-            for j in range(y_grid_size):
-                if (i, j) in data_dict:
-                    # Usar valor exacto si existe
-                    valor = data_dict[(i, j)]
-                else:
-                    # Buscar el punto más cercano con datos
-                    min_dist = float('inf')
-                    valor = 0
-                    for (x_idx, y_idx), yhat in data_dict.items():
-                        dist = ((i - x_idx) ** 2 + (j - y_idx) ** 2) ** 0.5
-                        if dist < min_dist:
-                            min_dist = dist
-                            valor = yhat
-
-                heatmap_grid_data.append([i, j, valor])
+        x, y, yhat = columnas_puntos(heatmap_data)
+        grilla = construir_grilla(x, y, yhat, self.EJE_AREA, self.EJE_TV)
 
-        return {
-            "heatmap_data": heatmap_grid_data,
-            "x_labels": x_labels,
-            "y_labels": y_labels,
-            "x_grid_size": x_grid_size,
-            "y_grid_size": y_grid_size,
-            "x_range": {"min": x_min, "max": x_max},
-            "y_range": {"min": y_min, "max": y_max},
-            "interpolated": True
-        }
+        return {**self._heatmap_grilla(grilla), "interpolated": True}
 
     def generar_echarts_heatmap_dav_zone(self, heatmap_data: List) -> Dict:
         """
@@ -180,64 +223,12 @@ class LuzNaturalService:
         Returns:
             Dict con datos de heatmap DAv_zone con colores violeta-magenta
         """
-        # Configuración de la grilla
-        x_grid_size = 24  # Divisiones en X (área)
-        y_grid_size = 16  # Divisiones en Y (TV)
-
-        x_min, x_max = 0.25, 12.0
-        y_min, y_max = 0.1, 0.9
-
-        x_step = (x_max - x_min) / (x_grid_size - 1)
-        y_step = (y_max - y_min) / (y_grid_size - 1)
-
-        # Generar coordenadas y etiquetas de ejes
-        x_coords = [x_min + i * x_step for i in range(x_grid_size)]
-        y_coords = [y_min + i * y_step for i in range(y_grid_size)]
-
-        x_labels = [f"{x:.1f}" for x in x_coords]
-        y_labels = [f"{y:.2f}" for y in y_coords]
-
-        # Crear diccionario de valores DAv_zone por coordenadas
-        dav_zone_dict = {}
-        for punto in heatmap_data:
-            if len(punto) >= 3:
-                area, tv, yhat = punto[0], punto[1], punto[2]
-                # Calcular DAv_zone desde yhat
-                metricas = self.calcular_metricas_desde_yhat(yhat)
-                dav_zone_value = metricas["DAv_zone"]
-
-                # Encontrar índices más cercanos
-                x_idx = min(range(x_grid_size), key=lambda i: abs(x_coords[i] - area))
-                y_idx = min(range(y_grid_size), key=lambda i: abs(y_coords[i] - tv))
-                dav_zone_dict[(x_idx, y_idx)] = dav_zone_value
-
-        # Interpolar valores faltantes usando nearest neighbor
-        heatmap_grid_data = []
-        for i in range(x_grid_size):
-            for j in range(y_grid_size):
-                if (i, j) in dav_zone_dict:
-                    # Usar valor exacto si existe
-                    valor = dav_zone_dict[(i, j)]
-                else:
-                    # Buscar el punto más cercano con datos
-                    min_dist = float('inf')
-                    valor = 0
-                    for (x_idx, y_idx), dav_value in dav_zone_dict.items():
-                        dist = ((i - x_idx) ** 2 + (j - y_idx) ** 2) ** 0.5
-                        if dist < min_dist:
-                            min_dist = dist
-                            valor = dav_value
-
-                heatmap_grid_data.append([i, j, valor])
+        x, y, yhat = columnas_puntos(heatmap_data)
+        dav_zone = self.calcular_metricas_vectorizado(yhat)["DAv_zone"]
+        grilla = construir_grilla(x, y, dav_zone, self.EJE_AREA, self.EJE_TV)
 
         return {
-            "heatmap_data": heatmap_grid_data,
-            "x_labels": x_labels,
-            "y_labels": y_labels,
-            "x_grid_size": x_grid_size,
-            "y_grid_size": y_grid_size,
-            "x_range": {"min": x_min, "max": x_max},
-            "y_range": {"min": y_min, "max": y_max},
+            **self._heatmap_grilla(grilla),
             "metrica": "DAv_zone",
             "uses_21_colors": True
         }
@@ -254,98 +245,465 @@ class LuzNaturalService:
         Returns:
             Dict con datos de heatmap con colores por rangos discretos
         """
-        # Configuración de la grilla
-        x_grid_size = 24  # Divisiones en X (área)
-        y_grid_size = 16  # Divisiones en Y (TV)
+        x, y, valores = columnas_puntos(heatmap_data, valores_metrica)
+        grilla = construir_grilla(x, y, valores, self.EJE_AREA, self.EJE_TV)
 
-        x_min, x_max = 0.25, 12.0
-        y_min, y_max = 0.1, 0.9
+        return {
+            **self._heatmap_grilla(grilla),
+            "colores_metrica": colores_hex(metrica, grilla.ravel()).tolist(),
+            "metrica": metrica,
+            "uses_discrete_ranges": True
+        }
 
-        x_step = (x_max - x_min) / (x_grid_size - 1)
-        y_step = (y_max - y_min) / (y_grid_size - 1)
+    def generar_echarts_heatmap_agregado(self, servicio: DataService, metrica: str) -> Dict:
+        """
+        Heatmap ECharts para datasets grandes: agrega todos los puntos por celda
 
-        # Generar coordenadas y etiquetas de ejes
-        x_coords = [x_min + i * x_step for i in range(x_grid_size)]
-        y_coords = [y_min + i * y_step for i in range(y_grid_size)]
+        A diferencia de los heatmaps por punto (donde el último punto de la
+        celda define su valor), cada celda usa la media de yhat de todos sus
+        puntos y reporta además mínimo, máximo y conteo. Las celdas vacías
+        toman la celda llena más cercana.
 
-        x_labels = [f"{x:.1f}" for x in x_coords]
-        y_labels = [f"{y:.2f}" for y in y_coords]
+        Args:
+            servicio: DataService del dataset a graficar
+            metrica: DA, UDI, sDA, sUDI o DAv_zone
 
-        # Crear diccionario de valores de métrica por coordenadas
-        metrica_dict = {}
-        for i, punto in enumerate(heatmap_data):
-            if i < len(valores_metrica) and len(punto) >= 3:
-                area, tv = punto[0], punto[1]
-                valor_metrica = valores_metrica[i]
-
-                # Encontrar índices más cercanos
-                x_idx = min(range(x_grid_size), key=lambda i: abs(x_coords[i] - area))
-                y_idx = min(range(y_grid_size), key=lambda i: abs(y_coords[i] - tv))
-                metrica_dict[(x_idx, y_idx)] = valor_metrica
-
-        # Interpolar valores faltantes usando nearest neighbor y generar colores
-        heatmap_grid_data = []
-        colores_grid = []
-        for i in range(x_grid_size):
-            for j in range(y_grid_size):
-                if (i, j) in metrica_dict:
-                    # Usar valor exacto si existe
-                    valor = metrica_dict[(i, j)]
-                else:
-                    # Buscar el punto más cercano con datos
-                    min_dist = float('inf')
-                    valor = 0
-                    for (x_idx, y_idx), metrica_value in metrica_dict.items():
-                        dist = ((i - x_idx) ** 2 + (j - y_idx) ** 2) ** 0.5
-                        if dist < min_dist:
-                            min_dist = dist
-                            valor = metrica_value
-
-                heatmap_grid_data.append([i, j, valor])
-                # Generar color para este valor usando función de colores
-                from utils.colores import obtener_color_hex
-                color = obtener_color_hex(metrica, valor)
-                colores_grid.append(color)
+        Returns:
+            Dict con el mismo formato que los heatmaps de 24x16 más
+            "estadisticas" (yhat_min, yhat_max, conteo por celda)
+        """
+        agregado = self._grilla_agregada(servicio)
+        conteo = agregado["conteo"]
+        grilla = self.calcular_metricas_vectorizado(self.grilla_yhat(servicio))[metrica]
 
-        return {
-            "heatmap_data": heatmap_grid_data,
-            "colores_metrica": colores_grid,
-            "x_labels": x_labels,
-            "y_labels": y_labels,
-            "x_grid_size": x_grid_size,
-            "y_grid_size": y_grid_size,
-            "x_range": {"min": x_min, "max": x_max},
-            "y_range": {"min": y_min, "max": y_max},
+        resultado = {
+            **self._heatmap_grilla(grilla),
             "metrica": metrica,
-            "uses_discrete_ranges": True
+            "agregado": True,
+            "estadisticas": {
+                "yhat_min": np.where(conteo > 0, agregado["minimo"], None).ravel().tolist(),
+                "yhat_max": np.where(conteo > 0, agregado["maximo"], None).ravel().tolist(),
+                "conteo": conteo.ravel().tolist()
+            }
         }
 
-    def procesar_calculo_luz(self, data: VentanaInput) -> Dict:
+        if metrica == "DAv_zone":
+            resultado["uses_21_colors"] = True
+        else:
+            resultado["colores_metrica"] = colores_hex(metrica, grilla.ravel()).tolist()
+            resultado["uses_discrete_ranges"] = True
+        return resultado
+
+    def _grilla_agregada(self, servicio: DataService) -> Dict[str, np.ndarray]:
+        ejes = (self.EJE_AREA, self.EJE_TV)
+        return servicio.get_grilla_agregada(*[(e.minimo, e.maximo, e.n) for e in ejes])
+
+    def grilla_yhat(self, servicio: DataService) -> np.ndarray:
+        """
+        yhat en la grilla base (EJE_AREA x EJE_TV), sin celdas vacías
+
+        Es la grilla de la que salen los heatmaps: último punto de cada celda
+        (o la media por celda en modo escalado) y relleno por celda cercana.
+        Se construye una vez por versión del dataset.
+        """
+        servicio = servicio.fijar()
+        ds = servicio.dataset
+
+        def construir() -> np.ndarray:
+            if servicio.usar_escalado():
+                agregado = self._grilla_agregada(servicio)
+                # Orden de ocupación = orden de las celdas, para desempatar el relleno
+                conteo = agregado["conteo"]
+                orden = np.where(conteo > 0, np.arange(conteo.size).reshape(conteo.shape), -1)
+                return rellenar(np.nan_to_num(agregado["media"]), orden, self.EJE_AREA, self.EJE_TV)
+            return construir_grilla(ds.area_vidrio, ds.tv, ds.yhat, self.EJE_AREA, self.EJE_TV)
+
+        return ds.en_cache("grilla_yhat", construir)
+
+    def generar_echarts_heatmap_resolucion(self, servicio: DataService, metrica: str,
+                                           resolucion: Tuple[int, int],
+                                           metodo: str = "bilineal",
+                                           formato: str = "json") -> Dict:
+        """
+        Heatmap ECharts de una métrica a otra resolución
+
+        Remuestrea yhat desde la grilla base (grilla_yhat) y recién después
+        calcula la métrica, así las celdas nuevas respetan sus rangos.
+
+        Args:
+            servicio: DataService del dataset a graficar
+            metrica: DA, UDI, sDA, sUDI o DAv_zone
+            resolucion: (celdas en área, celdas en TV)
+            metodo: "cercano", "bilineal" o "bicubico"
+            formato: "json" o "compacto" (ver utils.codificacion)
+
+        Returns:
+            Dict con el formato de los heatmaps de la grilla base
+
+        Raises:
+            ValueError: Si la resolución o el método no son válidos
+        """
+        grilla = self._grilla_resolucion(servicio, metrica, resolucion, metodo)
+        return self._heatmap_resolucion(grilla, metrica, metodo, formato)
+
+    def _grilla_resolucion(self, servicio: DataService, metrica: str,
+                           resolucion: Tuple[int, int], metodo: str) -> np.ndarray:
+        """Grilla (nx, ny) de la métrica remuestreada, en uint8 (las métricas van de 0 a 100)"""
+        nx, ny = resolucion
+        maximo = settings.max_resolucion_heatmap
+        if not (2 <= nx <= maximo and 2 <= ny <= maximo):
+            raise ValueError(f"Resolución inválida: {nx}x{ny}. Debe estar entre 2 y {maximo} por eje")
+
+        eje_x = Eje(self.EJE_AREA.minimo, self.EJE_AREA.maximo, nx)
+        eje_y = Eje(self.EJE_TV.minimo, self.EJE_TV.maximo, ny)
+        yhat = remuestrear(self.grilla_yhat(servicio), self.EJE_AREA, self.EJE_TV, eje_x, eje_y, metodo)
+        return self.calcular_metrica(yhat, metrica)
+
+    def _heatmap_resolucion(self, grilla: np.ndarray, metrica: str, metodo: str,
+                            formato: str) -> Dict:
+        """Heatmap de generar_echarts_heatmap_resolucion a partir de la grilla de la métrica"""
+        nx, ny = grilla.shape
+        eje_x = Eje(self.EJE_AREA.minimo, self.EJE_AREA.maximo, nx)
+        eje_y = Eje(self.EJE_TV.minimo, self.EJE_TV.maximo, ny)
+        campos = {
+            **self._ejes_heatmap(eje_x, eje_y),
+            "metrica": metrica,
+            "remuestreo": metodo,
+            "resolucion_base": [self.EJE_AREA.n, self.EJE_TV.n]
+        }
+        discreta = metrica != "DAv_zone"
+        campos["uses_discrete_ranges" if discreta else "uses_21_colors"] = True
+
+        # El formato compacto sale de la grilla, sin armar las listas por celda
+        if formato == "compacto":
+            return compactar_grilla(campos, grilla.ravel(), colores=discreta)
+
+        resultado = {"heatmap_data": celdas_heatmap(grilla), **campos}
+        if discreta:
+            resultado["colores_metrica"] = colores_hex(metrica, grilla.ravel()).tolist()
+        return resultado
+
+    def heatmap_resolucion(self, servicio: DataService, metrica: str,
+                           resolucion: Tuple[int, int], metodo: str = "bilineal",
+                           formato: str = "json") -> Dict:
+        """
+        generar_echarts_heatmap_resolucion con un cache LRU de las últimas
+        resoluciones pedidas, por versión del dataset
+
+        Se cachea solo la grilla de la métrica (uint8, un byte por celda),
+        acotada por settings.cache_resoluciones_heatmap y
+        settings.cache_resoluciones_heatmap_mb; el dict en el formato pedido
+        se arma en cada llamada.
+        """
+        servicio = servicio.fijar()
+        ds = servicio.dataset
+        clave = (ds.csv_path, ds.version, "grilla", metrica, tuple(resolucion), metodo)
+        grilla = _cache_resoluciones.obtener(
+            clave, lambda: self._grilla_resolucion(servicio, metrica, resolucion, metodo))
+        return self._heatmap_resolucion(grilla, metrica, metodo, formato)
+
+    def generar_tile_heatmap(self, servicio: DataService, metrica: str,
+                             zoom: int, x: int, y: int) -> Dict:
+        """
+        Tile de heatmap de una métrica sobre el dominio (área, TV)
+
+        Con zoom z el dominio de la grilla base se divide en 2**z x 2**z
+        tiles de settings.tamano_tile_heatmap celdas por lado; x crece con
+        el área e y con la TV. Cada celda se predice desde el dataset (con
+        el backend configurado), así al acercarse se ve el detalle real y
+        no una ampliación de la grilla de 24x16.
+
+        Args:
+            servicio: DataService del dataset a graficar
+            metrica: DA, UDI, sDA, sUDI o DAv_zone
+            zoom: Nivel de zoom (0 = un tile para todo el dominio)
+            x, y: Índices del tile en ese zoom
+
+        Returns:
+            Dict con el formato de los heatmaps de la grilla base más "tile"
+
+        Raises:
+            ValueError: Si la métrica, el zoom o los índices no son válidos
+        """
+        if metrica not in self.METRICAS_HEATMAP:
+            raise ValueError(f"Métrica inválida: {metrica}. Opciones válidas: {list(self.METRICAS_HEATMAP)}")
+        if not 0 <= zoom <= settings.max_zoom_heatmap:
+            raise ValueError(f"Zoom inválido: {zoom}. Debe estar entre 0 y {settings.max_zoom_heatmap}")
+
+        n = settings.tamano_tile_heatmap
+        eje_x = eje_tile(self.EJE_AREA.minimo, self.EJE_AREA.maximo, zoom, x, n)
+        eje_y = eje_tile(self.EJE_TV.minimo, self.EJE_TV.maximo, zoom, y, n)
+
+        area, tv = np.meshgrid(eje_x.coords, eje_y.coords, indexing="ij")
+        yhat, _, _ = servicio.predict_yhat(area.ravel(), tv.ravel())
+        grilla = self.calcular_metricas_vectorizado(np.asarray(yhat))[metrica].reshape(n, n)
+
+        medio_x, medio_y = eje_x.paso / 2, eje_y.paso / 2
+        resultado = {
+            **self._heatmap_grilla(grilla, eje_x, eje_y),
+            "metrica": metrica,
+            "tile": {
+                "zoom": zoom,
+                "x": x,
+                "y": y,
+                "tiles_por_eje": 2 ** zoom,
+                "area_min": eje_x.minimo - medio_x,
+                "area_max": eje_x.maximo + medio_x,
+                "tv_min": eje_y.minimo - medio_y,
+                "tv_max": eje_y.maximo + medio_y
+            }
+        }
+        if metrica == "DAv_zone":
+            resultado["uses_21_colors"] = True
+        else:
+            resultado["colores_metrica"] = colores_hex(metrica, grilla.ravel()).tolist()
+            resultado["uses_discrete_ranges"] = True
+        return resultado
+
+    def tile_heatmap_json(self, metrica: str, zoom: int, x: int, y: int,
+                          servicio: Optional[DataService] = None,
+                          formato: str = "json") -> Tuple[bytes, str]:
+        """
+        generar_tile_heatmap serializado a JSON, con un cache LRU de tiles
+        (settings.cache_tiles_heatmap) por versión del dataset
+
+        Returns:
+            (contenido, hash SHA-256 del contenido para el ETag)
+        """
+        self._validar_formato(formato)
+        servicio = (servicio or self.data_service).fijar()
+        ds = servicio.dataset
+
+        def construir() -> Tuple[bytes, str]:
+            tile = self.generar_tile_heatmap(servicio, metrica, zoom, x, y)
+            if formato == "compacto":
+                tile = compactar_heatmap(tile)
+            contenido = json.dumps(
+                tile, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+            ).encode("utf-8")
+            return contenido, hashlib.sha256(contenido).hexdigest()
+
+        clave = (ds.csv_path, ds.version, settings.modo_prediccion,
+                 settings.tamano_tile_heatmap, metrica, zoom, x, y, formato)
+        return _cache_tiles.obtener(clave, construir)
+
+    def generar_imagen_heatmap(self, servicio: DataService, metrica: str, formato: str,
+                               ancho: int, alto: int, remuestreo: str = "cercano") -> bytes:
+        """
+        Heatmap de una métrica renderizado a PNG o SVG con los colores de sus rangos
+
+        Con "cercano" las celdas de la grilla base se dibujan como bloques
+        (igual que el heatmap de ECharts); con "bilineal" o "bicubico" yhat
+        se remuestrea a un valor por píxel y los bordes entre rangos quedan
+        suaves. El remuestreo se hace de a bloques de filas que se reducen a
+        índices de color, así la memoria es la del raster uint8 y no la de
+        yhat en float64 por píxel. El SVG siempre dibuja la grilla base.
+
+        Args:
+            servicio: DataService del dataset a graficar
+            metrica: DA, UDI, sDA, sUDI o DAv_zone
+            formato: "png" o "svg"
+            ancho, alto: Tamaño de la imagen en píxeles
+            remuestreo: "cercano", "bilineal" o "bicubico"
+
+        Returns:
+            Bytes de la imagen
+
+        Raises:
+            ValueError: Si la métrica, el formato, el tamaño o el método no son válidos
+        """
+        self._validar_imagen(metrica, formato, ancho, alto)
+
+        yhat = self.grilla_yhat(servicio)
+        if formato == "png" and remuestreo != "cercano":
+            eje_x = Eje(self.EJE_AREA.minimo, self.EJE_AREA.maximo, ancho)
+            eje_y = Eje(self.EJE_TV.minimo, self.EJE_TV.maximo, alto)
+            indices = np.empty((ancho, alto), dtype=np.uint8)
+            for filas, bloque in remuestrear_bloques(yhat, self.EJE_AREA, self.EJE_TV,
+                                                     eje_x, eje_y, remuestreo):
+                indices[filas], paleta = indices_color(metrica, self.calcular_metrica(bloque, metrica))
+        else:
+            indices, paleta = indices_color(metrica, self.calcular_metrica(yhat, metrica))
+
+        if formato == "svg":
+            return svg_grilla(indices, paleta, ancho, alto)
+        return escribir_png(raster_grilla(indices, ancho, alto), paleta)
+
+    def imagen_heatmap(self, metrica: str, formato: str, ancho: int, alto: int,
+                       remuestreo: str = "cercano",
+                       servicio: Optional[DataService] = None) -> Tuple[bytes, str]:
+        """
+        generar_imagen_heatmap con un cache LRU de imágenes
+        (settings.cache_render) por versión del dataset
+
+        Returns:
+            (contenido, hash SHA-256 del contenido para el ETag)
+        """
+        servicio = (servicio or self.data_service).fijar()
+        ds = servicio.dataset
+        if formato == "svg":
+            remuestreo = "cercano"  # El SVG no usa el remuestreo
+
+        def construir() -> Tuple[bytes, str]:
+            contenido = self.generar_imagen_heatmap(servicio, metrica, formato, ancho, alto, remuestreo)
+            return contenido, hashlib.sha256(contenido).hexdigest()
+
+        clave = (ds.csv_path, ds.version, "heatmap", metrica, formato, ancho, alto, remuestreo)
+        return _cache_render.obtener(clave, construir)
+
+    def imagen_zonas(self, metrica: str, formato: str, ancho: int, alto: int) -> Tuple[bytes, str]:
+        """
+        Zonas poligonales de una métrica renderizadas a PNG o SVG (cacheadas)
+
+        Returns:
+            (contenido, hash SHA-256 del contenido para el ETag)
+
+        Raises:
+            ValueError: Si la métrica, el formato o el tamaño no son válidos
+        """
+        self._validar_imagen(metrica, formato, ancho, alto)
+
+        def construir() -> Tuple[bytes, str]:
+            contenido = renderizar_zonas(metrica, formato, ancho, alto)
+            return contenido, hashlib.sha256(contenido).hexdigest()
+
+        return _cache_render.obtener(("zonas", metrica, formato, ancho, alto), construir)
+
+    def _validar_imagen(self, metrica: str, formato: str, ancho: int, alto: int) -> None:
+        if metrica not in self.METRICAS_HEATMAP:
+            raise ValueError(f"Métrica inválida: {metrica}. Opciones válidas: {list(self.METRICAS_HEATMAP)}")
+        if formato not in FORMATOS_RENDER:
+            raise ValueError(f"Formato inválido: {formato}. Opciones válidas: {list(FORMATOS_RENDER)}")
+        maximo = settings.max_tamano_render
+        if not (1 <= ancho <= maximo and 1 <= alto <= maximo):
+            raise ValueError(f"Tamaño inválido: {ancho}x{alto}. Debe estar entre 1 y {maximo} px por lado")
+
+    METRICAS_HEATMAP = ("DA", "UDI", "sDA", "sUDI", "DAv_zone")
+
+    @staticmethod
+    def _validar_formato(formato: str) -> None:
+        if formato not in FORMATOS_HEATMAP:
+            raise ValueError(f"Formato inválido: {formato}. Opciones válidas: {list(FORMATOS_HEATMAP)}")
+
+    def heatmaps_calculo(self, servicio: DataService) -> Dict[str, Any]:
+        """
+        Heatmaps de /calcular_luz: scatter, sus colores y la grilla DAv_zone
+
+        Dependen solo del dataset, así que se construyen una vez por versión
+        y se comparten entre requests (no deben modificarse).
+
+        Args:
+            servicio: DataService del dataset (se usa la versión vigente)
+        """
+        servicio = servicio.fijar()
+        return servicio.dataset.en_cache(
+            ("payload", "calcular_luz"),
+            lambda: self._construir_heatmaps_calculo(servicio)
+        )
+
+    def heatmaps_calculo_compactos(self, servicio: DataService) -> Dict[str, Any]:
+        """heatmaps_calculo en formato compacto (scatter y grilla), cacheado por versión"""
+        servicio = servicio.fijar()
+
+        def construir() -> Dict[str, Any]:
+            heatmaps = self.heatmaps_calculo(servicio)
+            return {
+                "scatter": compactar_scatter(heatmaps["heatmap_data"], heatmaps["heatmap_colors"]),
+                "echarts_heatmap": compactar_heatmap(heatmaps["echarts_heatmap"])
+            }
+
+        return servicio.dataset.en_cache(("payload", "calcular_luz", "compacto"), construir)
+
+    def _construir_heatmaps_calculo(self, servicio: DataService) -> Dict[str, Any]:
+        # Obtener datos del heatmap (diezmados si el dataset es grande)
+        escalado = servicio.usar_escalado()
+        heatmap_data = servicio.get_scatter_data()
+
+        # Generar colores para el heatmap
+        heatmap_colors = generar_colores_heatmap(heatmap_data)
+
+        # Generar datos para heatmap verdadero con índices de grilla (usando DAv_zone)
+        echarts_heatmap = (
+            self.generar_echarts_heatmap_agregado(servicio, "DAv_zone") if escalado
+            else self.generar_echarts_heatmap_dav_zone(heatmap_data)
+        )
+
+        return {
+            "heatmap_data": heatmap_data,
+            "heatmap_colors": heatmap_colors,
+            # Datos pre-formateados para ECharts (scatter original)
+            "echarts_data": self.generar_echarts_data(heatmap_data, heatmap_colors),
+            "echarts_heatmap": echarts_heatmap
+        }
+
+    def precalcular_heatmaps(self, servicio: Optional[DataService] = None) -> int:
+        """
+        Construye los heatmaps de /calcular_luz y de /metrica_heatmap (todas
+        las métricas) para la versión vigente del dataset
+
+        Args:
+            servicio: Dataset a preparar (por defecto el de este servicio)
+
+        Returns:
+            Versión del dataset preparada
+        """
+        servicio = (servicio or self.data_service).fijar()
+        self.heatmaps_calculo(servicio)
+        for metrica in self.METRICAS_HEATMAP:
+            self.datos_metrica_individual_json(metrica, servicio)
+        return servicio.dataset.version
+
+    def preparar_snapshot(self, snapshot: DatasetSnapshot) -> None:
+        """Precalcula los heatmaps de un snapshot antes de publicarlo (ver registrar_preparacion)"""
+        self.precalcular_heatmaps(DataService(snapshot.csv_path, snapshot=snapshot))
+
+    def procesar_calculo_luz(self, data: VentanaInput,
+                             sheets_inline: Optional[bool] = None,
+                             sheets_variante: Optional[str] = None,
+                             resolucion: Optional[Tuple[int, int]] = None,
+                             remuestreo: str = "bilineal",
+                             formato: str = "json") -> Dict:
         """
         Procesa el cálculo completo de luz natural
 
         Args:
             data: Datos de entrada validados
+            sheets_inline: Incluir las imágenes de las métricas en base64
+            sheets_variante: Variante reducida de las imágenes (p.ej. "miniatura")
+            resolucion: (celdas en área, celdas en TV) del heatmap DAv_zone
+                (por defecto la grilla base)
+            remuestreo: Método para llevar la grilla base a esa resolución
+            formato: "json" o "compacto" (scatter y grilla como arreglos
+                en base64, ver utils.codificacion)
 
         Returns:
             Dict con toda la respuesta
         """
+        self._validar_formato(formato)
+
         # Validar área máxima
         area_v = data.area_vidrio()
         if area_v is not None and area_v > 12.0:
             raise ValueError("Área de ventana no puede superar 12 m²")
 
-        # Obtener datos del heatmap
-        heatmap_data = self.data_service.get_heatmap_data()
-
-        # Generar colores para el heatmap
-        heatmap_colors = generar_colores_heatmap(heatmap_data)
-
-        # Generar datos pre-formateados para ECharts (scatter original)
-        echarts_data = self.generar_echarts_data(heatmap_data, heatmap_colors)
+        # Codificar orientación y elegir el dataset que le corresponde
+        orient_sigla = codificar_orientacion(
+            data.orientation) if data.orientation else None
+        servicio = self.data_service.para(data.orientation, data.ubicacion).fijar()
 
-        # Generar datos para heatmap verdadero con índices de grilla (usando DAv_zone)
-        echarts_heatmap = self.generar_echarts_heatmap_dav_zone(heatmap_data)
+        # Heatmaps del dataset (precalculados por versión)
+        heatmaps = self.heatmaps_calculo(servicio)
+        echarts_heatmap = (
+            heatmaps["echarts_heatmap"] if resolucion is None
+            else self.heatmap_resolucion(servicio, "DAv_zone", resolucion, remuestreo)
+        )
+        compactos = None
+        if formato == "compacto":
+            compactos = self.heatmaps_calculo_compactos(servicio)
+            echarts_heatmap = (
+                compactos["echarts_heatmap"] if resolucion is None
+                else self.heatmap_resolucion(servicio, "DAv_zone", resolucion, remuestreo, formato)
+            )
 
         # Inicializar variables de respuesta
         yhat_pred = None
@@ -353,19 +711,19 @@ class LuzNaturalService:
         metrics = []
         energia_pct = None
 
-        # Codificar orientación
-        orient_sigla = codificar_orientacion(
-            data.orientation) if data.orientation else None
-
         # Si tenemos área, hacer predicción
         if area_v is not None:
             try:
-                yhat_pred, av_used, tv_used = self.data_service.predict_yhat_nearest(
-                    area_v, data.tv
+                yhat_arr, av_used, tv_used = servicio.predict_yhat(
+                    area_v, data.tv, data.modo_prediccion
                 )
+                yhat_pred = float(yhat_arr)
+                vecindario = servicio.vecinos_cercanos(area_v, data.tv)
                 punto_usado = PuntoUsado(
                     area_vidrio=float(av_used),
-                    tv=float(tv_used)
+                    tv=float(tv_used),
+                    vecinos=vecindario["vecinos"],
+                    dispersion_yhat=vecindario["dispersion_yhat"]
                 )
             except Exception as e:
                 raise ValueError(f"Error en predicción: {str(e)}")
@@ -373,7 +731,7 @@ class LuzNaturalService:
         # Si tenemos predicción, calcular métricas
         if yhat_pred is not None:
             metricas_dict = self.calcular_metricas_desde_yhat(yhat_pred)
-            metrics = self.generar_metricas_output(metricas_dict)
+            metrics = self.generar_metricas_output(metricas_dict, sheets_inline, sheets_variante)
             energia_pct = metricas_dict["energia"]
 
         # Generar mensaje
@@ -383,14 +741,14 @@ class LuzNaturalService:
             else "Heatmap generado. Ingresa medidas de ventana para ver tu predicción."
         )
 
-        return {
+        resultado = {
             "ok": True,
             "mensaje": mensaje,
             "yhat_pred": yhat_pred,
             "punto_usado": punto_usado.dict() if punto_usado else None,
-            "heatmap_data": heatmap_data,
-            "heatmap_colors": heatmap_colors,
-            "echarts_data": echarts_data,  # Datos scatter originales
+            "heatmap_data": heatmaps["heatmap_data"],
+            "heatmap_colors": heatmaps["heatmap_colors"],
+            "echarts_data": heatmaps["echarts_data"],  # Datos scatter originales
             "echarts_heatmap": echarts_heatmap,  # NUEVO: Datos para heatmap verdadero
             "metrics": [metric.dict() for metric in metrics],
             "energia_pct": energia_pct,
@@ -399,17 +757,379 @@ class LuzNaturalService:
             "ubicacion": data.ubicacion,
             "nombre_espacio": data.nombre_espacio
         }
+        if compactos is not None:
+            # El scatter va solo en "scatter"; las listas quedan vacías
+            resultado.update({
+                "formato": "compacto",
+                "heatmap_data": [],
+                "heatmap_colors": [],
+                "echarts_data": [],
+                "scatter": compactos["scatter"]
+            })
+        return resultado
+
+    def calcular_lote(self, area_vidrio: np.ndarray, tv: np.ndarray,
+                      modos: Optional[List[Optional[str]]] = None,
+                      datasets: Optional[List[Optional[str]]] = None) -> Dict[str, np.ndarray]:
+        """
+        Predice y calcula métricas para un lote de ventanas en pasadas vectorizadas
+
+        Args:
+            area_vidrio: Array de áreas en m² (NaN si la ventana no tiene medidas)
+            tv: Array de transmitancias visibles
+            modos: Backend de predicción por ventana (None usa el configurado)
+            datasets: Ruta del dataset por ventana (None usa el del servicio)
+
+        Returns:
+            Dict de columnas: yhat, area_usada, tv_usada y una por métrica.
+            Las filas sin área quedan con NaN en yhat y -1 en las métricas.
+        """
+        n = area_vidrio.shape[0]
+        yhat = np.full(n, np.nan)
+        area_usada = np.full(n, np.nan)
+        tv_usada = np.full(n, np.nan)
+
+        con_area = ~np.isnan(area_vidrio)
+        claves = list(zip(datasets or [None] * n, modos or [None] * n))
+        distintas: Dict[Tuple[Optional[str], Optional[str]], int] = {}
+        codigos = np.fromiter(
+            (distintas.setdefault(c, len(distintas)) for c in claves), dtype=np.int64, count=n
+        )
+        if len(distintas) <= 1:
+            grupos = {clave: np.flatnonzero(con_area) for clave in distintas}
+        else:
+            grupos = {
+                clave: np.flatnonzero(con_area & (codigos == codigo))
+                for clave, codigo in distintas.items()
+            }
+
+        # Una pasada vectorizada por (dataset, backend de predicción)
+        for (csv_path, modo), idx in grupos.items():
+            if idx.size == 0:
+                continue
+            servicio = (
+                self.data_service if csv_path in (None, self.data_service.csv_path)
+                else DataService(csv_path)
+            )
+            pred, av_used, tv_used = servicio.predict_yhat(
+                area_vidrio[idx], tv[idx], modo
+            )
+            yhat[idx] = pred
+            area_usada[idx] = av_used
+            tv_usada[idx] = tv_used
+
+        columnas = {"yhat": yhat, "area_usada": area_usada, "tv_usada": tv_usada}
+        for key, valores in self.calcular_metricas_vectorizado(np.nan_to_num(yhat)).items():
+            columnas[key] = np.where(con_area, valores, -1)
+        return columnas
+
+    def procesar_lote(self, ventanas: List[VentanaInput],
+                      modo_prediccion: Optional[str] = None) -> Dict:
+        """
+        Procesa un lote de ventanas sin regenerar el heatmap
+
+        Args:
+            ventanas: Ventanas validadas
+            modo_prediccion: Backend para las ventanas que no indiquen uno
+
+        Returns:
+            Dict con un resultado compacto por ventana
+
+        Raises:
+            ValueError: Si alguna ventana supera el área máxima (se listan todas)
+        """
+        areas = [v.area_vidrio() for v in ventanas]
+
+        errores = [
+            f"Ventana {i}: Área de ventana no puede superar 12 m²"
+            for i, area in enumerate(areas)
+            if area is not None and area > 12.0
+        ]
+        if errores:
+            raise ValueError("; ".join(errores))
+
+        resultados = self._resultados_ventanas(ventanas, areas, modo_prediccion)
+
+        return {
+            "ok": True,
+            "total": len(resultados),
+            "resultados": resultados
+        }
+
+    def _resultados_ventanas(self, ventanas: List[VentanaInput], areas: List[Optional[float]],
+                             modo_prediccion: Optional[str] = None,
+                             indices: Optional[List[int]] = None) -> List[Dict]:
+        """
+        Calcula y arma los resultados compactos de ventanas ya validadas
+
+        Args:
+            ventanas: Ventanas a calcular
+            areas: Área de vidrio de cada ventana (None si no tiene medidas)
+            modo_prediccion: Backend para las ventanas que no indiquen uno
+            indices: Índice a reportar por ventana (por defecto su posición)
+        """
+        if indices is None:
+            indices = list(range(len(ventanas)))
+
+        area_arr = np.array([np.nan if a is None else a for a in areas], dtype=np.float64)
+        tv_arr = np.array([v.tv for v in ventanas], dtype=np.float64)
+        modos = [v.modo_prediccion or modo_prediccion for v in ventanas]
+
+        rutas: Dict[Tuple[Optional[str], Optional[str]], str] = {}
+        datasets = []
+        for v in ventanas:
+            clave = (v.orientation, v.ubicacion)
+            if clave not in rutas:
+                rutas[clave] = self.data_service.resolver_csv(*clave)
+            datasets.append(rutas[clave])
+
+        try:
+            columnas = self.calcular_lote(area_arr, tv_arr, modos, datasets)
+        except ValueError as e:
+            raise ValueError(f"Error en predicción: {str(e)}")
+
+        claves = ["DA", "UDI", "sDA", "sUDI", "DAv_zone"]
+        filas = {k: columnas[k].tolist() for k in claves + ["energia"]}
+        yhat = columnas["yhat"].tolist()
+        area_usada = columnas["area_usada"].tolist()
+        tv_usada = columnas["tv_usada"].tolist()
+
+        resultados = []
+        for i, ventana in enumerate(ventanas):
+            if areas[i] is None:
+                resultados.append({
+                    "indice": indices[i],
+                    "yhat_pred": None,
+                    "punto_usado": None,
+                    "metrics": None,
+                    "energia_pct": None,
+                    "nombre_espacio": ventana.nombre_espacio
+                })
+                continue
+
+            resultados.append({
+                "indice": indices[i],
+                "yhat_pred": yhat[i],
+                "punto_usado": {"area_vidrio": area_usada[i], "tv": tv_usada[i]},
+                "metrics": {k: filas[k][i] for k in claves},
+                "energia_pct": filas["energia"][i],
+                "nombre_espacio": ventana.nombre_espacio
+            })
+
+        return resultados
+
+    def _procesar_registros(self, registros: List[Tuple[int, Any]],
+                            validar: Callable[[Any], VentanaInput],
+                            modo_prediccion: Optional[str] = None) -> Dict[int, Dict]:
+        """
+        Valida y calcula un bloque de registros crudos sin abortar por errores
+
+        Args:
+            registros: Pares (índice, registro crudo)
+            validar: Convierte un registro crudo en VentanaInput
+            modo_prediccion: Backend para las ventanas que no indiquen uno
+
+        Returns:
+            Dict índice -> resultado compacto, o {"indice", "error"} si el
+            registro es inválido
+        """
+        salida: Dict[int, Dict] = {}
+        ventanas, areas, indices = [], [], []
+
+        for num, crudo in registros:
+            try:
+                ventana = validar(crudo)
+            except ValidationError as e:
+                salida[num] = {"indice": num, "error": e.errors(include_url=False)}
+                continue
+
+            area = ventana.area_vidrio()
+            if area is not None and area > 12.0:
+                salida[num] = {"indice": num, "error": "Área de ventana no puede superar 12 m²"}
+                continue
+
+            ventanas.append(ventana)
+            areas.append(area)
+            indices.append(num)
+
+        if ventanas:
+            try:
+                for resultado in self._resultados_ventanas(ventanas, areas, modo_prediccion, indices):
+                    salida[resultado["indice"]] = resultado
+            except ValueError as e:
+                for num in indices:
+                    salida[num] = {"indice": num, "error": str(e)}
+
+        return salida
 
-    def generar_datos_metrica_individual(self, metrica: str) -> Dict:
+    def procesar_chunk_ndjson(self, lineas: List[Tuple[int, bytes]],
+                              modo_prediccion: Optional[str] = None) -> str:
+        """
+        Procesa un bloque de registros NDJSON y devuelve los resultados en NDJSON
+
+        Cada línea inválida produce un registro {"indice", "error"} en lugar
+        de abortar el stream, porque el status HTTP ya fue enviado.
+
+        Args:
+            lineas: Pares (número de línea, contenido JSON de un VentanaInput)
+            modo_prediccion: Backend para las ventanas que no indiquen uno
+
+        Returns:
+            Texto NDJSON con un resultado por línea de entrada, en orden
+        """
+        salida = self._procesar_registros(
+            lineas, VentanaInput.model_validate_json, modo_prediccion)
+
+        return "".join(
+            json.dumps(salida[num], ensure_ascii=False, default=str) + "\n"
+            for num, _ in lineas
+        )
+
+    COLUMNAS_CSV_ENTRADA = ["nombre_espacio", "alto", "ancho", "tv", "orientation", "ubicacion"]
+    COLUMNAS_CSV_SALIDA = COLUMNAS_CSV_ENTRADA + [
+        "fila", "yhat_pred", "area_vidrio_usada", "tv_usada",
+        "DA", "UDI", "sDA", "sUDI", "DAv_zone", "energia_pct", "error"
+    ]
+
+    @staticmethod
+    def _ventana_desde_fila(fila: Dict[str, Any]) -> VentanaInput:
+        """
+        Convierte una fila tabular (CSV, NDJSON, Parquet) en VentanaInput.
+        Las celdas vacías o NaN se toman como None.
+        """
+        datos = {}
+        for col in LuzNaturalService.COLUMNAS_CSV_ENTRADA:
+            valor = fila.get(col)
+            if isinstance(valor, str):
+                valor = valor.strip() or None
+            elif isinstance(valor, float) and valor != valor:
+                valor = None
+            datos[col] = valor
+        return VentanaInput.model_validate(datos)
+
+    def procesar_bloque_csv(self, filas: List[Tuple[int, Dict[str, str]]],
+                            modo_prediccion: Optional[str] = None) -> str:
+        """
+        Procesa un bloque de filas de CSV y devuelve las filas de resultado en CSV
+
+        Args:
+            filas: Pares (número de fila, fila como dict; p.ej. de csv.DictReader)
+            modo_prediccion: Backend para las ventanas que no indiquen uno
+
+        Returns:
+            Texto CSV (sin encabezado) con una fila de resultado por fila de entrada
+        """
+        salida = self._procesar_registros(
+            filas, self._ventana_desde_fila, modo_prediccion)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for num, fila in filas:
+            resultado = salida[num]
+            entrada = [
+                "" if fila.get(col) is None else fila[col]
+                for col in self.COLUMNAS_CSV_ENTRADA
+            ]
+
+            if "error" in resultado:
+                error = resultado["error"]
+                if isinstance(error, list):
+                    error = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error)
+                writer.writerow(entrada + [num] + [""] * 9 + [error])
+                continue
+
+            punto = resultado["punto_usado"] or {}
+            metricas = resultado["metrics"] or {}
+            writer.writerow(entrada + [
+                num,
+                resultado["yhat_pred"] if resultado["yhat_pred"] is not None else "",
+                punto.get("area_vidrio", ""),
+                punto.get("tv", ""),
+                *[metricas.get(k, "") for k in ["DA", "UDI", "sDA", "sUDI", "DAv_zone"]],
+                resultado["energia_pct"] if resultado["energia_pct"] is not None else "",
+                ""
+            ])
+
+        return buffer.getvalue()
+
+    def generar_datos_metrica_individual(self, metrica: str,
+                                         servicio: Optional[DataService] = None) -> Dict:
         """
         Genera datos de heatmap para una métrica individual usando rangos discretos.
 
+        El resultado se construye una vez por versión del dataset y se
+        comparte entre requests (no debe modificarse).
+
         Args:
             metrica: Nombre de la métrica (DA, UDI, sDA, sUDI)
+            servicio: Dataset a usar (por defecto el de este servicio)
 
         Returns:
             Dict con datos y colores para la métrica específica con rangos discretos
         """
+        servicio = (servicio or self.data_service).fijar()
+        return servicio.dataset.en_cache(
+            ("payload", "metrica_heatmap", metrica),
+            lambda: self._construir_datos_metrica_individual(metrica, servicio)
+        )
+
+    def datos_metrica_individual_json(self, metrica: str,
+                                      servicio: Optional[DataService] = None,
+                                      resolucion: Optional[Tuple[int, int]] = None,
+                                      remuestreo: str = "bilineal",
+                                      formato: str = "json") -> bytes:
+        """
+        generar_datos_metrica_individual ya serializado a JSON (mismo formato
+        que JSONResponse)
+
+        Con la grilla base se cachea por versión del dataset; con otra
+        resolución, en el LRU de resoluciones recientes. Con
+        formato="compacto" el scatter y la grilla van codificados (ver
+        utils.codificacion) y se omiten las listas equivalentes.
+        """
+        self._validar_formato(formato)
+        servicio = (servicio or self.data_service).fijar()
+        ds = servicio.dataset
+
+        def serializar(datos: Dict) -> bytes:
+            return json.dumps(
+                datos, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+            ).encode("utf-8")
+
+        def construir() -> bytes:
+            datos = self.generar_datos_metrica_individual(metrica, servicio)
+            if "error" in datos:
+                return serializar(datos)
+            if resolucion is not None:
+                datos = {
+                    **datos,
+                    "echarts_heatmap": self.heatmap_resolucion(
+                        servicio, metrica, resolucion, remuestreo, formato)
+                }
+            if formato == "compacto":
+                datos = self._compactar_datos_metrica(datos)
+            return serializar(datos)
+
+        if resolucion is None:
+            clave = ("payload_json", "metrica_heatmap", metrica)
+            return ds.en_cache(clave if formato == "json" else clave + (formato,), construir)
+
+        clave = (ds.csv_path, ds.version, "metrica_heatmap_json", metrica,
+                 tuple(resolucion), remuestreo, formato)
+        return _cache_resoluciones.obtener(clave, construir)
+
+    @staticmethod
+    def _compactar_datos_metrica(datos: Dict) -> Dict:
+        return {
+            "metrica": datos["metrica"],
+            "formato": "compacto",
+            "scatter": compactar_scatter(
+                datos["heatmap_data"], valores=datos["valores_metrica"], metrica=datos["metrica"]),
+            "echarts_heatmap": compactar_heatmap(datos["echarts_heatmap"]),
+            "rango_valores": datos["rango_valores"]
+        }
+
+    def _construir_datos_metrica_individual(self, metrica: str, servicio: DataService) -> Dict:
         # Verificar que sea una métrica válida para rangos discretos
         metricas_validas = ["DA", "UDI", "sDA", "sUDI"]
         if metrica not in metricas_validas:
@@ -417,8 +1137,9 @@ class LuzNaturalService:
                 "error": f"Métrica {metrica} no soportada para rangos discretos"
             }
 
-        # Obtener datos base del heatmap
-        heatmap_data = self.data_service.get_heatmap_data()
+        # Obtener datos base del heatmap (diezmados si el dataset es grande)
+        escalado = servicio.usar_escalado()
+        heatmap_data = servicio.get_scatter_data()
 
         if not heatmap_data:
             return {
@@ -462,7 +1183,10 @@ class LuzNaturalService:
                 })
 
         # Generar datos para heatmap verdadero con índices de grilla (rangos discretos)
-        echarts_heatmap = self.generar_echarts_heatmap_rangos_discretos(heatmap_data, valores_metrica, metrica)
+        echarts_heatmap = (
+            self.generar_echarts_heatmap_agregado(servicio, metrica) if escalado
+            else self.generar_echarts_heatmap_rangos_discretos(heatmap_data, valores_metrica, metrica)
+        )
 
         return {
             "metrica": metrica,
@@ -0,0 +1,265 @@
+"""
+Registro de backends de predicción de yhat.
+
+Cada backend implementa la misma interfaz vectorizada sobre un
+DatasetSnapshot y se selecciona por nombre, ya sea por request
+(VentanaInput.modo_prediccion) o por configuración (MODO_PREDICCION).
+Los ajustes costosos (coeficientes, pesos RBF) se cachean en el snapshot.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Tuple, Type
+
+import numpy as np
+
+from config import get_settings
+from services.dataset import DatasetSnapshot
+
+settings = get_settings()
+
+Prediccion = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Tamaño de bloque para backends que evalúan consultas × centros
+_BLOQUE_CONSULTAS = 4096
+
+
+class Predictor(ABC):
+    """Interfaz común de los backends de predicción"""
+
+    nombre: str = ""
+    descripcion: str = ""
+    requiere_lattice: bool = False
+
+    def __init__(self, dataset: DatasetSnapshot):
+        self.dataset = dataset
+
+    @classmethod
+    def soporta(cls, dataset: DatasetSnapshot) -> bool:
+        """Indica si el backend puede operar sobre el dataset"""
+        return not dataset.empty and (not cls.requiere_lattice or dataset.lattice is not None)
+
+    @abstractmethod
+    def predecir(self, area_vidrio: np.ndarray, tv: np.ndarray) -> Prediccion:
+        """
+        Predice yhat para arrays de consultas
+
+        Returns:
+            Tuple de arrays (yhat, area_vidrio_usado, tv_usado)
+        """
+
+    def predict(self, area_vidrio, tv) -> np.ndarray:
+        """Solo los valores yhat predichos"""
+        return self.predecir(area_vidrio, tv)[0]
+
+    def _proyectar_al_dominio(self, area_vidrio, tv) -> Tuple[np.ndarray, np.ndarray]:
+        """Recorta las consultas a la caja que contiene al dataset"""
+        ds = self.dataset
+        x = np.clip(np.asarray(area_vidrio, dtype=np.float64),
+                    np.nanmin(ds.area_vidrio), np.nanmax(ds.area_vidrio))
+        y = np.clip(np.asarray(tv, dtype=np.float64),
+                    np.nanmin(ds.tv), np.nanmax(ds.tv))
+        return x, y
+
+
+PREDICTORES: Dict[str, Type[Predictor]] = {}
+
+
+def registrar_predictor(nombre: str) -> Callable[[Type[Predictor]], Type[Predictor]]:
+    """Decorador para registrar un backend bajo un nombre"""
+    def decorador(cls: Type[Predictor]) -> Type[Predictor]:
+        cls.nombre = nombre
+        PREDICTORES[nombre] = cls
+        return cls
+    return decorador
+
+
+def listar_predictores() -> List[Dict[str, object]]:
+    """Nombres y descripciones de los backends registrados"""
+    return [
+        {
+            "nombre": nombre,
+            "descripcion": cls.descripcion,
+            "requiere_lattice": cls.requiere_lattice
+        }
+        for nombre, cls in PREDICTORES.items()
+    ]
+
+
+def obtener_predictor(nombre: str, dataset: DatasetSnapshot) -> Predictor:
+    """
+    Devuelve el backend ajustado al dataset, construido una vez por snapshot
+
+    Raises:
+        ValueError: Si el nombre no está registrado o el backend no
+            soporta el dataset
+    """
+    cls = PREDICTORES.get(nombre)
+    if cls is None:
+        raise ValueError(
+            f"Modo de predicción inválido: {nombre}. "
+            f"Opciones válidas: {list(PREDICTORES.keys())}"
+        )
+
+    if not cls.soporta(dataset):
+        if dataset.empty:
+            raise ValueError("El archivo CSV está vacío")
+        raise ValueError(
+            f"El modo de predicción {nombre} requiere un dataset en grilla regular"
+        )
+
+    return dataset.en_cache(("predictor", nombre), lambda: cls(dataset))
+
+
+@registrar_predictor("nearest")
+class NearestPredictor(Predictor):
+    descripcion = "Punto más cercano del dataset (lattice o KD-tree)"
+
+    def predecir(self, area_vidrio, tv) -> Prediccion:
+        ds = self.dataset
+        area_vidrio = np.asarray(area_vidrio, dtype=np.float64)
+        tv = np.asarray(tv, dtype=np.float64)
+
+        if ds.lattice is not None:
+            return ds.lattice.nearest(area_vidrio, tv)
+
+        forma = np.broadcast(area_vidrio, tv).shape
+        consultas = np.column_stack([c.ravel() for c in np.broadcast_arrays(area_vidrio, tv)])
+        _, idx = ds.kdtree(settings.knn_escala).query_many(consultas, k=1)
+        idx = idx[:, 0].reshape(forma)
+        return ds.yhat[idx], ds.area_vidrio[idx], ds.tv[idx]
+
+
+@registrar_predictor("bilinear")
+class BilinearPredictor(Predictor):
+    descripcion = "Interpolación bilineal entre los cuatro nodos del lattice"
+    requiere_lattice = True
+
+    def predecir(self, area_vidrio, tv) -> Prediccion:
+        return self.dataset.lattice.bilinear(area_vidrio, tv)
+
+
+@registrar_predictor("idw")
+class IDWPredictor(Predictor):
+    descripcion = "Ponderación por distancia inversa sobre los k vecinos más cercanos"
+
+    potencia: float = 2.0
+
+    def predecir(self, area_vidrio, tv) -> Prediccion:
+        ds = self.dataset
+        x, y = self._proyectar_al_dominio(area_vidrio, tv)
+        forma = np.broadcast(x, y).shape
+        consultas = np.column_stack([c.ravel() for c in np.broadcast_arrays(x, y)])
+
+        dist, idx = ds.kdtree(settings.knn_escala).query_many(consultas, k=settings.knn_k)
+        valores = ds.yhat[idx]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pesos = 1.0 / dist ** self.potencia
+            yhat = (pesos * valores).sum(axis=1) / pesos.sum(axis=1)
+
+        # Coincidencia exacta con un punto del dataset
+        exactos = dist[:, 0] == 0
+        yhat[exactos] = valores[exactos, 0]
+
+        return yhat.reshape(forma), x, y
+
+
+class _SuperficieAjustada(Predictor):
+    """Base para sustitutos ajustados sobre ejes normalizados a [0, 1]"""
+
+    def __init__(self, dataset: DatasetSnapshot):
+        super().__init__(dataset)
+        validos = np.isfinite(dataset.area_vidrio) & np.isfinite(dataset.tv) & np.isfinite(dataset.yhat)
+        self._x = dataset.area_vidrio[validos]
+        self._y = dataset.tv[validos]
+        self._z = dataset.yhat[validos]
+        self._offset = np.array([self._x.min(), self._y.min()])
+        ancho = np.array([self._x.max(), self._y.max()]) - self._offset
+        self._factor = 1.0 / np.where(ancho > 0, ancho, 1.0)
+        self._ajustar()
+
+    def _normalizar(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return (x - self._offset[0]) * self._factor[0], (y - self._offset[1]) * self._factor[1]
+
+    @abstractmethod
+    def _ajustar(self) -> None:
+        """Ajusta la superficie a (_x, _y, _z); se llama al construir el backend"""
+
+    @abstractmethod
+    def _evaluar(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """Evalúa la superficie en coordenadas normalizadas (u, v)"""
+
+    def predecir(self, area_vidrio, tv) -> Prediccion:
+        x, y = self._proyectar_al_dominio(area_vidrio, tv)
+        forma = np.broadcast(x, y).shape
+        u, v = self._normalizar(*[c.ravel() for c in np.broadcast_arrays(x, y)])
+        return self._evaluar(u, v).reshape(forma), x, y
+
+
+@registrar_predictor("polinomial")
+class PolinomioPredictor(_SuperficieAjustada):
+    descripcion = "Polinomio bivariado ajustado por mínimos cuadrados"
+
+    grado: int = 3
+
+    def _terminos(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        return np.column_stack([
+            u ** i * v ** j
+            for i in range(self.grado + 1)
+            for j in range(self.grado + 1 - i)
+        ])
+
+    def _ajustar(self) -> None:
+        u, v = self._normalizar(self._x, self._y)
+        self.coeficientes, *_ = np.linalg.lstsq(self._terminos(u, v), self._z, rcond=None)
+
+    def _evaluar(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        return self._terminos(u, v) @ self.coeficientes
+
+
+@registrar_predictor("rbf")
+class RBFPredictor(_SuperficieAjustada):
+    descripcion = "Thin-plate spline (RBF) con término lineal"
+
+    # Máximo de centros: el ajuste resuelve un sistema denso n × n
+    max_centros: int = 2000
+    suavizado: float = 1e-6
+
+    @staticmethod
+    def _kernel(r2: np.ndarray) -> np.ndarray:
+        # φ(r) = r² log r, expresado con r² para evitar la raíz
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = 0.5 * r2 * np.log(r2)
+        return np.nan_to_num(k, nan=0.0)
+
+    def _ajustar(self) -> None:
+        u, v = self._normalizar(self._x, self._y)
+        z = self._z
+        if u.size > self.max_centros:
+            sel = np.linspace(0, u.size - 1, self.max_centros).astype(np.intp)
+            u, v, z = u[sel], v[sel], z[sel]
+
+        self._cu, self._cv = u, v
+        n = u.size
+        r2 = (u[:, None] - u[None, :]) ** 2 + (v[:, None] - v[None, :]) ** 2
+        P = np.column_stack((np.ones(n), u, v))
+
+        A = np.zeros((n + 3, n + 3))
+        A[:n, :n] = self._kernel(r2) + self.suavizado * np.eye(n)
+        A[:n, n:] = P
+        A[n:, :n] = P.T
+        b = np.concatenate((z, np.zeros(3)))
+
+        sol = np.linalg.lstsq(A, b, rcond=None)[0]
+        self.pesos, self.lineal = sol[:n], sol[n:]
+
+    def _evaluar(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        salida = np.empty(u.size)
+        for ini in range(0, u.size, _BLOQUE_CONSULTAS):
+            bu, bv = u[ini:ini + _BLOQUE_CONSULTAS], v[ini:ini + _BLOQUE_CONSULTAS]
+            r2 = (bu[:, None] - self._cu[None, :]) ** 2 + (bv[:, None] - self._cv[None, :]) ** 2
+            salida[ini:ini + bu.size] = (
+                self._kernel(r2) @ self.pesos
+                + self.lineal[0] + self.lineal[1] * bu + self.lineal[2] * bv
+            )
+        return salida
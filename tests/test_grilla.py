@@ -0,0 +1,141 @@
+"""
+Regresión del motor de grillas (utils/grilla.py) contra la rutina original
+en Python puro que armaban los heatmaps ECharts de LuzNaturalService.
+
+Con datos_sudi_limpio.csv ambas dan la misma grilla. El relleno de celdas
+vacías sí cambió: antes se tomaba la celda ocupada más cercana en pasos de
+índice y ahora en coordenadas físicas (el paso de área es ~10 veces el de
+TV), así que con puntos dispersos los resultados pueden diferir.
+"""
+
+import os
+import random
+
+import pytest
+
+from services.dataset import cargar_snapshot_csv
+from services.luz_service import LuzNaturalService
+from utils.colores import obtener_color_hex
+from utils.grilla import celdas_heatmap, construir_grilla, columnas_puntos
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "datos_sudi_limpio.csv")
+
+servicio = LuzNaturalService()
+EJE_AREA = LuzNaturalService.EJE_AREA
+EJE_TV = LuzNaturalService.EJE_TV
+
+
+def _celdas_original(puntos, valores=None):
+    """Rutina original de los heatmaps de 24x16 (relleno por distancia en índices)"""
+    x_grid_size, y_grid_size = 24, 16
+    x_min, x_max = 0.25, 12.0
+    y_min, y_max = 0.1, 0.9
+    x_step = (x_max - x_min) / (x_grid_size - 1)
+    y_step = (y_max - y_min) / (y_grid_size - 1)
+    x_coords = [x_min + i * x_step for i in range(x_grid_size)]
+    y_coords = [y_min + i * y_step for i in range(y_grid_size)]
+
+    data_dict = {}
+    for n, punto in enumerate(puntos):
+        if len(punto) >= 3 and (valores is None or n < len(valores)):
+            area, tv = punto[0], punto[1]
+            valor = punto[2] if valores is None else valores[n]
+            x_idx = min(range(x_grid_size), key=lambda i: abs(x_coords[i] - area))
+            y_idx = min(range(y_grid_size), key=lambda i: abs(y_coords[i] - tv))
+            data_dict[(x_idx, y_idx)] = valor
+
+    celdas = []
+    for i in range(x_grid_size):
+        for j in range(y_grid_size):
+            if (i, j) in data_dict:
+                valor = data_dict[(i, j)]
+            else:
+                min_dist = float('inf')
+                valor = 0
+                for (x_idx, y_idx), v in data_dict.items():
+                    dist = ((i - x_idx) ** 2 + (j - y_idx) ** 2) ** 0.5
+                    if dist < min_dist:
+                        min_dist = dist
+                        valor = v
+            celdas.append([i, j, valor])
+    return celdas
+
+
+def _celdas_fisicas(puntos):
+    """Como _celdas_original, pero rellenando por distancia en coordenadas físicas"""
+    x_grid_size, y_grid_size = EJE_AREA.n, EJE_TV.n
+    x_coords, y_coords = EJE_AREA.coords.tolist(), EJE_TV.coords.tolist()
+
+    data_dict = {}
+    for area, tv, valor in puntos:
+        x_idx = min(range(x_grid_size), key=lambda i: abs(x_coords[i] - area))
+        y_idx = min(range(y_grid_size), key=lambda i: abs(y_coords[i] - tv))
+        data_dict[(x_idx, y_idx)] = valor
+
+    celdas = []
+    for i in range(x_grid_size):
+        for j in range(y_grid_size):
+            valor = data_dict.get((i, j))
+            if valor is None:
+                min_dist = float('inf')
+                for (x_idx, y_idx), v in data_dict.items():
+                    dx = (i - x_idx) * EJE_AREA.paso
+                    dy = (j - y_idx) * EJE_TV.paso
+                    if dx * dx + dy * dy < min_dist:
+                        min_dist = dx * dx + dy * dy
+                        valor = v
+            celdas.append([i, j, valor])
+    return celdas
+
+
+@pytest.fixture(scope="module")
+def puntos():
+    return cargar_snapshot_csv(CSV_PATH).heatmap_data
+
+
+def test_heatmap_yhat_igual_al_original(puntos):
+    heatmap = servicio.generar_echarts_heatmap_data(puntos, [])
+    assert heatmap["heatmap_data"] == _celdas_original(puntos)
+
+
+def test_heatmap_dav_zone_igual_al_original(puntos):
+    valores = [servicio.calcular_metricas_desde_yhat(p[2])["DAv_zone"] for p in puntos]
+    heatmap = servicio.generar_echarts_heatmap_dav_zone(puntos)
+    assert heatmap["heatmap_data"] == _celdas_original(puntos, valores)
+
+
+@pytest.mark.parametrize("metrica", ["DA", "UDI", "sDA", "sUDI"])
+def test_rangos_discretos_iguales_al_original(puntos, metrica):
+    valores = [servicio.calcular_metricas_desde_yhat(p[2])[metrica] for p in puntos]
+    heatmap = servicio.generar_echarts_heatmap_rangos_discretos(puntos, valores, metrica)
+
+    original = _celdas_original(puntos, valores)
+    assert heatmap["heatmap_data"] == original
+    assert heatmap["colores_metrica"] == [obtener_color_hex(metrica, c[2]) for c in original]
+
+
+def test_relleno_por_distancia_fisica():
+    # La celda (0, 0) está a 1 paso de índice de (1, 0) y a 3 de (0, 3), pero
+    # en coordenadas físicas (0, 3) queda más cerca: 3 * 0.053 < 0.511
+    puntos = [[EJE_AREA.coords[1], EJE_TV.coords[0], 10.0],
+              [EJE_AREA.coords[0], EJE_TV.coords[3], 20.0]]
+
+    nuevo = servicio.generar_echarts_heatmap_data(puntos, [])["heatmap_data"]
+    assert nuevo[0] == [0, 0, 20.0]
+    assert _celdas_original(puntos)[0] == [0, 0, 10.0]
+
+
+def test_relleno_fisico_puntos_aleatorios():
+    rng = random.Random(0)
+    difieren = 0
+    for _ in range(50):
+        puntos = [
+            [rng.uniform(0.25, 12.0), rng.uniform(0.1, 0.9), float(rng.randint(0, 100))]
+            for _ in range(rng.randint(1, 30))
+        ]
+        x, y, valores = columnas_puntos(puntos)
+        grilla = construir_grilla(x, y, valores, EJE_AREA, EJE_TV)
+        assert celdas_heatmap(grilla) == _celdas_fisicas(puntos)
+        difieren += celdas_heatmap(grilla) != _celdas_original(puntos)
+    # El cambio de criterio se nota con puntos dispersos
+    assert difieren > 0
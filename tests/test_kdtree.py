@@ -0,0 +1,71 @@
+"""
+KDTree.query_many (recorrido por lotes) contra fuerza bruta y contra query.
+"""
+
+import numpy as np
+import pytest
+
+from services.kdtree import KDTree
+
+
+def _fuerza_bruta(arbol, puntos, consultas, k):
+    pts = arbol.normalizar(puntos)
+    q = arbol.normalizar(consultas)
+    d2 = ((q[:, None, :] - pts[None, :, :]) ** 2).sum(axis=2)
+    # A igual distancia, la primera fila
+    orden = np.lexsort((np.broadcast_to(np.arange(len(puntos)), d2.shape), d2), axis=1)[:, :k]
+    return np.sqrt(np.take_along_axis(d2, orden, axis=1)), orden
+
+
+@pytest.fixture(scope="module")
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.mark.parametrize("escala", ["rango", "std"])
+@pytest.mark.parametrize("k", [1, 4, 20])
+def test_query_many_igual_a_fuerza_bruta(rng, escala, k):
+    puntos = np.c_[rng.uniform(0.25, 12.0, 2000), rng.uniform(0.1, 0.9, 2000)]
+    consultas = np.c_[rng.uniform(-1.0, 13.0, 500), rng.uniform(0.0, 1.0, 500)]
+    arbol = KDTree(puntos, escala)
+
+    dist, idx = arbol.query_many(consultas, k)
+    esperado_d, esperado_i = _fuerza_bruta(arbol, puntos, consultas, k)
+    np.testing.assert_array_equal(dist, esperado_d)
+    np.testing.assert_array_equal(idx, esperado_i)
+
+
+@pytest.mark.parametrize("k", [1, 5])
+def test_empates_con_puntos_repetidos(k):
+    # Lattice con cada nodo repetido tres veces: gana la primera fila
+    nodos = np.array(np.meshgrid(np.linspace(0.25, 12.0, 24), np.linspace(0.1, 0.9, 16))).reshape(2, -1).T
+    puntos = np.repeat(nodos, 3, axis=0)
+    arbol = KDTree(puntos)
+
+    dist, idx = arbol.query_many(puntos, k)
+    esperado_d, esperado_i = _fuerza_bruta(arbol, puntos, puntos, k)
+    np.testing.assert_array_equal(dist, esperado_d)
+    np.testing.assert_array_equal(idx, esperado_i)
+
+    uno = [arbol.query(p, k) for p in puntos[:50]]
+    np.testing.assert_array_equal(idx[:50], np.array([i for _, i in uno]))
+
+
+def test_arbol_exportado(rng):
+    puntos = np.c_[rng.uniform(0.25, 12.0, 1000), rng.uniform(0.1, 0.9, 1000)]
+    consultas = np.c_[rng.uniform(0.25, 12.0, 200), rng.uniform(0.1, 0.9, 200)]
+    arbol = KDTree(puntos)
+    copia = KDTree.desde_arrays(arbol.exportar())
+
+    for a, b in zip(arbol.query_many(consultas, 3), copia.query_many(consultas, 3)):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_pocas_consultas_y_vacios():
+    arbol = KDTree(np.array([[1.0, 0.5], [2.0, 0.6], [np.nan, 0.7]]))
+    dist, idx = arbol.query_many([[1.1, 0.5]], k=5)
+    assert dist.shape == (1, 2) and idx.tolist() == [[0, 1]]
+    assert arbol.query_many(np.empty((0, 2)), k=1)[0].shape == (0, 1)
+
+    with pytest.raises(ValueError):
+        KDTree(np.empty((0, 2))).query_many([[1.0, 0.5]])
@@ -0,0 +1,155 @@
+"""
+Respuestas de archivos estáticos cacheables (ETag, Cache-Control, Range).
+
+ArchivoResponse envía el archivo sin cargarlo en memoria: si el servidor
+ASGI ofrece la extensión "http.response.zerocopy" se le pasa el descriptor
+(sendfile del lado del servidor); si no, se lee por bloques desde un hilo.
+También puede enviar contenido que ya está en memoria (p.ej. variantes
+generadas de una imagen) con las mismas reglas de cache y Range.
+"""
+
+import os
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+def parsear_rango(valor: str, tamano: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header Range de un solo tramo ("bytes=inicio-fin")
+
+    Returns:
+        (inicio, fin) inclusivo, o None si el header no aplica (otra unidad,
+        varios tramos o formato inválido: se responde el archivo completo)
+
+    Raises:
+        ValueError: Si el tramo es válido pero no se puede satisfacer
+    """
+    unidad, _, rangos = valor.partition("=")
+    if unidad.strip().lower() != "bytes" or "," in rangos:
+        return None
+
+    inicio_txt, sep, fin_txt = rangos.strip().partition("-")
+    if not sep or not (inicio_txt + fin_txt).isdigit():
+        return None
+
+    if inicio_txt == "":
+        # Sufijo: los últimos N bytes
+        sufijo = int(fin_txt)
+        if sufijo == 0:
+            raise ValueError("Rango no satisfacible")
+        return max(0, tamano - sufijo), tamano - 1
+
+    inicio = int(inicio_txt)
+    fin = int(fin_txt) if fin_txt else tamano - 1
+    if inicio >= tamano:
+        raise ValueError("Rango no satisfacible")
+    if fin < inicio:
+        return None
+    return inicio, min(fin, tamano - 1)
+
+
+class ArchivoResponse(Response):
+    """
+    Envía un archivo con ETag, Cache-Control y soporte de Range
+
+    Responde 304 si If-None-Match coincide con el ETag, 206 para un Range
+    válido (respetando If-Range) y 416 si el rango no se puede satisfacer.
+    Si se pasa contenido, se envía ese contenido en lugar de leer ruta.
+    """
+
+    def __init__(self, ruta: Optional[str], request_headers: Mapping[str, str],
+                 media_type: str, etag: str, max_age: int = 0,
+                 filename: Optional[str] = None, method: str = "GET",
+                 contenido: Optional[bytes] = None):
+        self.ruta = ruta
+        self.contenido = contenido
+        self.send_body = method != "HEAD"
+        tamano = len(contenido) if contenido is not None else os.path.getsize(ruta)
+        etag = f'"{etag}"'
+
+        headers = {
+            "etag": etag,
+            "cache-control": f"public, max-age={max_age}",
+            "accept-ranges": "bytes",
+        }
+        if filename:
+            headers["content-disposition"] = f'inline; filename="{filename}"'
+
+        self.offset, self.count = 0, tamano
+        status_code = 200
+
+        if_none_match = request_headers.get("if-none-match")
+        rango = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+
+        if if_none_match and {etag, "*"} & {e.strip() for e in if_none_match.split(",")}:
+            status_code, self.count = 304, 0
+        elif rango and (if_range is None or if_range.strip() == etag):
+            try:
+                tramo = parsear_rango(rango, tamano)
+            except ValueError:
+                tramo = None
+                status_code, self.count = 416, 0
+                headers["content-range"] = f"bytes */{tamano}"
+            if tramo is not None:
+                inicio, fin = tramo
+                status_code = 206
+                self.offset, self.count = inicio, fin - inicio + 1
+                headers["content-range"] = f"bytes {inicio}-{fin}/{tamano}"
+
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        if status_code == 304:
+            del self.headers["content-type"]
+        else:
+            self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if self.contenido is not None:
+            await send({
+                "type": "http.response.body",
+                "body": self.contenido[self.offset:self.offset + self.count],
+                "more_body": False,
+            })
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.ruta, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.ruta, "rb") as f:
+            await f.seek(self.offset)
+            restantes = self.count
+            while restantes > 0:
+                bloque = await f.read(min(TAMANO_BLOQUE, restantes))
+                if not bloque:
+                    break
+                restantes -= len(bloque)
+                await send({
+                    "type": "http.response.body",
+                    "body": bloque,
+                    "more_body": restantes > 0,
+                })
+            if restantes > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
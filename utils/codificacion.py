@@ -0,0 +1,155 @@
+"""
+Codificación compacta de heatmaps y scatters para el formato "compacto".
+
+En lugar de listas JSON de [i, j, valor] y de colores hex repetidos por
+celda, cada columna se envía como un arreglo binario en base64 (little
+endian) listo para leerse con un TypedArray del lado del cliente:
+
+    {"dtype": "uint8" | "uint16" | "float32", "base64": "..."}
+
+Se usa el entero sin signo más chico que representa todos los valores sin
+pérdida y, si no alcanza (decimales o NaN), Float32. Las grillas van en
+orden fila-mayor: el valor de la celda (i, j) está en i * y_grid_size + j,
+con i sobre el área y j sobre la TV (igual que heatmap_data). Los colores
+van como una paleta (la de la métrica, en el orden de sus rangos) más el
+índice de color de cada celda o punto.
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.colores import indices_color
+
+FORMATOS_HEATMAP = ("json", "compacto")
+
+_DTYPES_ENTEROS = (("uint8", "<u1"), ("uint16", "<u2"))
+
+# Campos de los heatmaps que dejan de enviarse como listas en el formato compacto
+_CAMPOS_POR_CELDA = ("heatmap_data", "colores_metrica", "estadisticas")
+
+
+def codificar_arreglo(valores: Sequence[Any]) -> Dict[str, str]:
+    """
+    Arreglo numérico en base64 con el dtype más compacto sin pérdida
+
+    Args:
+        valores: Números (None se envía como NaN)
+
+    Returns:
+        Dict con "dtype" y "base64"
+    """
+    arreglo = np.asarray(valores, dtype=np.float64).ravel()
+    finitos = np.isfinite(arreglo).all()
+    enteros = finitos and bool(np.all(arreglo == np.round(arreglo)))
+    minimo = arreglo.min() if arreglo.size else 0.0
+    maximo = arreglo.max() if arreglo.size else 0.0
+
+    nombre, dtype = "float32", "<f4"
+    if enteros and minimo >= 0:
+        for nombre_entero, dtype_entero in _DTYPES_ENTEROS:
+            if maximo <= np.iinfo(np.dtype(dtype_entero)).max:
+                nombre, dtype = nombre_entero, dtype_entero
+                break
+
+    return {
+        "dtype": nombre,
+        "base64": base64.b64encode(arreglo.astype(dtype).tobytes()).decode("ascii")
+    }
+
+
+def codificar_colores(colores: Sequence[str]) -> Dict[str, Any]:
+    """Paleta de colores distintos y el índice en la paleta de cada elemento"""
+    paleta, indices = np.unique(np.asarray(colores, dtype=str), return_inverse=True)
+    return {"paleta": paleta.tolist(), "indices": codificar_arreglo(indices)}
+
+
+def codificar_paleta(metrica: str, valores: Sequence[float]) -> Dict[str, Any]:
+    """Colores de una métrica como su paleta (en orden de rangos) e índices por valor"""
+    indices, paleta = indices_color(metrica, valores)
+    return {"paleta": paleta, "indices": codificar_arreglo(indices)}
+
+
+def compactar_heatmap(heatmap: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Heatmap ECharts (x_grid_size x y_grid_size) en formato compacto
+
+    Conserva los metadatos (ejes, etiquetas, rangos, flags) y reemplaza
+    heatmap_data por "valores", colores_metrica por "colores" (paleta +
+    índices) y las listas de "estadisticas" por arreglos codificados.
+
+    Args:
+        heatmap: Heatmap generado por LuzNaturalService (no se modifica)
+
+    Returns:
+        Dict nuevo; si el heatmap está vacío (sin datos) se devuelve tal cual
+    """
+    if not heatmap or "heatmap_data" not in heatmap:
+        return heatmap
+
+    valores = [celda[2] for celda in heatmap["heatmap_data"]]
+    return compactar_grilla(heatmap, valores, colores="colores_metrica" in heatmap)
+
+
+def compactar_grilla(heatmap: Dict[str, Any], valores: Sequence[float],
+                     colores: bool) -> Dict[str, Any]:
+    """
+    Como compactar_heatmap, pero con los valores de las celdas aparte
+
+    Sirve para compactar una grilla sin armar antes heatmap_data ni
+    colores_metrica: el heatmap puede traer solo los metadatos.
+
+    Args:
+        heatmap: Metadatos del heatmap (no se modifica)
+        valores: Valor de cada celda, en el orden de heatmap_data
+        colores: Si se agregan los colores de la paleta de la métrica
+
+    Returns:
+        Dict nuevo en formato compacto
+    """
+    compacto = {k: v for k, v in heatmap.items() if k not in _CAMPOS_POR_CELDA}
+    compacto["formato"] = "compacto"
+    compacto["shape"] = [heatmap["x_grid_size"], heatmap["y_grid_size"]]
+    compacto["valores"] = codificar_arreglo(valores)
+
+    if colores:
+        compacto["colores"] = codificar_paleta(heatmap["metrica"], valores)
+    if "estadisticas" in heatmap:
+        compacto["estadisticas"] = {
+            nombre: codificar_arreglo(lista)
+            for nombre, lista in heatmap["estadisticas"].items()
+        }
+    return compacto
+
+
+def compactar_scatter(puntos: List[List[float]], colores: Optional[Sequence[str]] = None,
+                      valores: Optional[Sequence[float]] = None,
+                      metrica: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Puntos [area, tv, yhat] del scatter como columnas codificadas
+
+    Args:
+        puntos: Puntos del heatmap (heatmap_data)
+        colores: Color hex de cada punto
+        valores: Valor de la métrica de cada punto
+        metrica: Con valores, los colores salen de la paleta de la métrica
+
+    Returns:
+        Dict con "n", "area", "tv", "yhat" y opcionalmente "valor" y "colores"
+    """
+    columnas = np.asarray(puntos, dtype=np.float64).reshape(-1, 3)
+    compacto = {
+        "formato": "compacto",
+        "n": int(columnas.shape[0]),
+        "area": codificar_arreglo(columnas[:, 0]),
+        "tv": codificar_arreglo(columnas[:, 1]),
+        "yhat": codificar_arreglo(columnas[:, 2]),
+    }
+    if valores is not None:
+        compacto["valor"] = codificar_arreglo(valores)
+    if metrica is not None and valores is not None:
+        compacto["colores"] = codificar_paleta(metrica, valores)
+    elif colores is not None:
+        compacto["colores"] = codificar_colores(colores)
+    return compacto
@@ -1,73 +1,71 @@
 """
 Módulo para manejo de colores según métricas y porcentajes.
 Cada métrica tiene su propia paleta de colores basada en rangos específicos.
+
+Los rangos se compilan una vez en tablas (TablaColores) de umbrales +
+paleta: colorear un arreglo de valores es un solo np.searchsorted, y el
+índice en la paleta se puede enviar en lugar del color hex.
 """
 
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+COLOR_DESCONOCIDO = "#CCCCCC"  # Métricas no reconocidas
+
+
+@dataclass(frozen=True)
+class TablaColores:
+    """
+    Rangos de una métrica compilados: paleta[i] colorea [umbrales[i-1], umbrales[i])
+
+    Valores por debajo del primer umbral toman paleta[0] y desde el último
+    umbral (o NaN) el último color.
+    """
+
+    umbrales: Tuple[float, ...]
+    paleta: Tuple[str, ...]
+
+    def indice(self, valor: float) -> int:
+        if valor != valor:  # NaN
+            return len(self.paleta) - 1
+        return bisect_right(self.umbrales, valor)
+
+    def indices(self, valores) -> np.ndarray:
+        """Índice en la paleta de cada valor (uint8, misma forma que valores)"""
+        arreglo = np.asarray(valores, dtype=np.float64)
+        return np.searchsorted(np.asarray(self.umbrales), arreglo, side="right").astype(np.uint8)
+
+    def colores(self, valores) -> np.ndarray:
+        """Color hex de cada valor (arreglo de str, misma forma que valores)"""
+        return np.asarray(self.paleta)[self.indices(valores)]
+
+
+# Rangos de cada métrica (ver get_color_legend)
+_TABLAS = {
+    # Métricas temporales: azul < 50%, verde, amarillo, naranja, rosa y magenta >= 90%
+    "da": TablaColores(
+        (50, 60, 70, 80, 90),
+        ("#3C8EEA", "#75D766", "#C8A443", "#E07060", "#F74A87", "#DA3DA5")),
+    "udi": TablaColores(
+        (50, 60, 70, 80, 90),
+        ("#3C8EEA", "#75D766", "#C8A443", "#E07060", "#F74A87", "#DA3DA5")),
+    # Métricas espaciales: azul < 55%, amarillo [55%, 75%), magenta >= 75%
+    "sda": TablaColores((55, 75), ("#3C8EEA", "#C8A443", "#E04196")),
+    # Turquesa < 75%, rosa [75%, 95%), magenta oscuro [95%, 99%); desde 99 es la zona híbrida (gris)
+    "sudi": TablaColores((75, 95, 99), ("#31ADD7", "#F74A87", "#DA3AB4", "#D5D5D5")),
+    # Availability 1 < 50%, Availability 2 [50%, 70%), Conditional availability >= 70%
+    "dav_zone": TablaColores((50, 70), ("#a1c781", "#81C784", "#d3d3d3")),
+}
+
+_TABLA_DESCONOCIDA = TablaColores((), (COLOR_DESCONOCIDO,))
 
-def obtener_color_da(percent: float) -> str:
-    """Color para métrica DA (Daylight Autonomy) - Métricas Temporales"""
-    if percent < 50:
-        return "#3C8EEA"  # Azul - < 50%
-    elif 50 <= percent < 60:
-        return "#75D766"  # Verde - [50%, 60%)
-    elif 60 <= percent < 70:
-        return "#C8A443"  # Amarillo - [60%, 70%)
-    elif 70 <= percent < 80:
-        return "#E07060"  # Naranja - [70%, 80%)
-    elif 80 <= percent < 90:
-        return "#F74A87"  # Rosa - [80%, 90%)
-    else:  # >= 90
-        return "#DA3DA5"  # Magenta - >= 90%
-
-
-def obtener_color_udi(percent: float) -> str:
-    """Color para métrica UDI (Useful Daylight Illuminance) - Métricas Temporales"""
-    if percent < 50:
-        return "#3C8EEA"  # Azul - < 50%
-    elif 50 <= percent < 60:
-        return "#75D766"  # Verde - [50%, 60%)
-    elif 60 <= percent < 70:
-        return "#C8A443"  # Amarillo - [60%, 70%)
-    elif 70 <= percent < 80:
-        return "#E07060"  # Naranja - [70%, 80%)
-    elif 80 <= percent < 90:
-        return "#F74A87"  # Rosa - [80%, 90%)
-    else:  # >= 90
-        return "#DA3DA5"  # Magenta - >= 90%
-
-
-def obtener_color_sda(percent: float) -> str:
-    """Color para métrica sDA (Spatial Daylight Autonomy) - Métricas Espaciales"""
-    if percent < 55:
-        return "#3C8EEA"  # Azul - < 55%
-    elif 55 <= percent < 75:
-        return "#C8A443"  # Amarillo - [55%, 75%)
-    else:  # >= 75
-        return "#E04196"  # Magenta - >= 75%
-
-
-def obtener_color_sudi(percent: float) -> str:
-    """Color para métrica sUDI (Spatial Useful Daylight Illuminance) - Métricas Espaciales"""
-    if percent >= 99:  # Hybrid zone (usar valor especial 99+)
-        return "#D5D5D5"  # Gris - Hybrid zone
-    elif percent < 75:
-        return "#31ADD7"  # Turquesa - < 75%
-    elif 75 <= percent < 95:
-        return "#F74A87"  # Rosa - [75%, 95%)
-    elif percent >= 95:
-        return "#DA3AB4"  # Magenta oscuro - >= 95%
-    return "#D5D5D5"  # Gris - Fallback
-
-
-def obtener_color_dav_zone(percent: float) -> str:
-    """Color para métrica DAv_zone (zonas de disponibilidad)"""
-    # Availability zones basadas en el código original del cliente
-    if percent < 50:  # Availability 1
-        return "#a1c781"  # Verde claro - Availability 1
-    elif 50 <= percent < 70:  # Availability 2
-        return "#81C784"  # Verde - Availability 2
-    else:  # Conditional availability (>= 70)
-        return "#d3d3d3"  # Gris - Conditional availability
+
+def tabla_colores(metrica: str) -> TablaColores:
+    """Tabla compilada de la métrica (una de un solo color gris si no se reconoce)"""
+    return _TABLAS.get(metrica.lower(), _TABLA_DESCONOCIDA)
 
 
 def obtener_color_hex(metrica: str, porcentaje: float) -> str:
@@ -81,21 +79,33 @@ def obtener_color_hex(metrica: str, porcentaje: float) -> str:
     Returns:
         String con el color en formato hexadecimal
     """
-    metrica_lower = metrica.lower()
-
-    color_functions = {
-        "da": obtener_color_da,
-        "udi": obtener_color_udi,
-        "sda": obtener_color_sda,
-        "sudi": obtener_color_sudi,
-        "dav_zone": obtener_color_dav_zone
-    }
+    tabla = tabla_colores(metrica)
+    return tabla.paleta[tabla.indice(porcentaje)]
+
+
+def colores_hex(metrica: str, valores) -> np.ndarray:
+    """
+    Color HEX de cada valor en una sola pasada vectorizada
 
-    color_func = color_functions.get(metrica_lower)
-    if color_func:
-        return color_func(porcentaje)
+    Args:
+        metrica: Nombre de la métrica (DA, UDI, sDA, sUDI, DAv_zone)
+        valores: Arreglo (o lista) de valores porcentuales, de cualquier forma
 
-    return "#CCCCCC"  # Color por defecto para métricas no reconocidas
+    Returns:
+        Arreglo de str con la misma forma que valores
+    """
+    return tabla_colores(metrica).colores(valores)
+
+
+def indices_color(metrica: str, valores) -> Tuple[np.ndarray, List[str]]:
+    """
+    Colores como índices en la paleta de la métrica (modo paleta)
+
+    Returns:
+        (índices uint8 con la forma de valores, paleta de colores hex)
+    """
+    tabla = tabla_colores(metrica)
+    return tabla.indices(valores), list(tabla.paleta)
 
 
 def get_color_legend(metrica: str) -> dict:
@@ -157,11 +167,7 @@ def generar_colores_por_rangos(metrica: str, valores: list) -> list:
     Returns:
         Lista de colores según rangos discretos
     """
-    colores = []
-    for valor in valores:
-        color = obtener_color_hex(metrica, valor)
-        colores.append(color)
-    return colores
+    return colores_hex(metrica, valores).tolist()
 
 
 def generar_colores_metrica_heatmap(metrica: str, valores: list) -> list:
@@ -0,0 +1,345 @@
+"""
+Motor de grillas regulares para los heatmaps ECharts.
+
+Construye la grilla de valores de un heatmap a partir de puntos
+dispersos, con operaciones vectorizadas:
+
+1. Cada punto se asigna al centro de celda más cercano en cada eje
+   (en empates gana el centro de menor índice) y si varios puntos caen en
+   la misma celda queda el último.
+2. Las celdas sin puntos se completan:
+   - "cercano": con el valor de la celda ocupada más cercana, medida en
+     coordenadas físicas (pasos de cada eje); en empates gana la celda
+     ocupada primero en el orden de los puntos.
+   - "lineal": interpolación lineal entre celdas ocupadas, primero a lo
+     largo de y (columnas) y luego de x para las columnas vacías.
+
+remuestrear() lleva una grilla completa a otra resolución sobre el mismo
+dominio ("cercano", "bilineal" o "bicubico"), como producto de matrices
+de pesos por eje; remuestrear_bloques() hace lo mismo de a bloques de
+filas para grillas destino grandes.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MODOS_RELLENO = ("cercano", "lineal")
+METODOS_REMUESTREO = ("cercano", "bilineal", "bicubico")
+
+# Celdas vacías x ocupadas evaluadas por bloque al buscar la más cercana
+_MAX_PARES_BLOQUE = 4_000_000
+
+
+@dataclass(frozen=True)
+class Eje:
+    """Eje de n centros de celda equiespaciados entre minimo y maximo"""
+
+    minimo: float
+    maximo: float
+    n: int
+
+    @property
+    def paso(self) -> float:
+        return (self.maximo - self.minimo) / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def coords(self) -> np.ndarray:
+        # minimo + i * paso, con la misma aritmética que las etiquetas de los ejes
+        return self.minimo + np.arange(self.n) * self.paso
+
+    def etiquetas(self, formato: str) -> List[str]:
+        return [format(c, formato) for c in self.coords.tolist()]
+
+
+def eje_tile(minimo: float, maximo: float, zoom: int, indice: int, n: int) -> Eje:
+    """
+    Eje de n celdas del tile `indice` cuando [minimo, maximo] se divide en 2**zoom tiles
+
+    Las celdas cubren el tramo del tile sin superponerse con los vecinos,
+    así los tiles de un mismo zoom forman una grilla continua.
+
+    Raises:
+        ValueError: Si el índice no corresponde a un tile de ese zoom
+    """
+    tiles = 2 ** zoom
+    if not 0 <= indice < tiles:
+        raise ValueError(f"Tile inválido: {indice}. Con zoom {zoom} debe estar entre 0 y {tiles - 1}")
+    ancho = (maximo - minimo) / tiles
+    inicio = minimo + indice * ancho
+    celda = ancho / n
+    return Eje(inicio + celda / 2, inicio + ancho - celda / 2, n)
+
+
+def indices_cercanos(valores: np.ndarray, coords: np.ndarray) -> np.ndarray:
+    """
+    Índice del centro más cercano a cada valor (coords ordenadas en forma creciente)
+
+    En empates devuelve el menor índice, igual que min() sobre los índices.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    if coords.size == 1:
+        return np.zeros(valores.shape, dtype=np.intp)
+
+    derecho = np.clip(np.searchsorted(coords, valores), 1, coords.size - 1)
+    izquierdo = derecho - 1
+    usar_izquierdo = np.abs(coords[izquierdo] - valores) <= np.abs(coords[derecho] - valores)
+    return np.where(usar_izquierdo, izquierdo, derecho)
+
+
+def rasterizar(x: np.ndarray, y: np.ndarray, valores: np.ndarray,
+               eje_x: Eje, eje_y: Eje) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Asigna los puntos a las celdas de la grilla
+
+    Returns:
+        (grilla, orden): grilla (nx, ny) con el último valor de cada celda
+        (dtype de valores; sin definir en celdas vacías) y orden (nx, ny)
+        con la posición del primer punto de cada celda, -1 si está vacía
+    """
+    valores = np.asarray(valores)
+    celdas = (indices_cercanos(x, eje_x.coords) * eje_y.n
+              + indices_cercanos(y, eje_y.coords))
+
+    total = eje_x.n * eje_y.n
+    grilla = np.zeros(total, dtype=valores.dtype if valores.size else np.int64)
+    orden = np.full(total, -1, dtype=np.int64)
+
+    if celdas.size:
+        # Primer punto de cada celda (orden de ocupación) y último (valor)
+        ocupadas, primero = np.unique(celdas, return_index=True)
+        orden[ocupadas] = primero
+        _, ultimo_invertido = np.unique(celdas[::-1], return_index=True)
+        grilla[ocupadas] = valores[celdas.size - 1 - ultimo_invertido]
+
+    return grilla.reshape(eje_x.n, eje_y.n), orden.reshape(eje_x.n, eje_y.n)
+
+
+def _rellenar_cercano(grilla: np.ndarray, orden: np.ndarray, eje_x: Eje, eje_y: Eje) -> np.ndarray:
+    salida = grilla.copy()
+    llenas = np.argwhere(orden >= 0)
+    vacias = np.argwhere(orden < 0)
+
+    # Ordenar las ocupadas por orden de ocupación: argmin toma la primera en empates
+    llenas = llenas[np.argsort(orden[llenas[:, 0], llenas[:, 1]], kind="stable")]
+    valores_llenas = grilla[llenas[:, 0], llenas[:, 1]]
+
+    bloque = max(1, _MAX_PARES_BLOQUE // len(llenas))
+    for inicio in range(0, len(vacias), bloque):
+        v = vacias[inicio:inicio + bloque]
+        # Distancias desde diferencias enteras de índice: idénticas para +d y -d,
+        # así los empates se resuelven siempre por orden de ocupación
+        dx = (v[:, 0, None] - llenas[None, :, 0]) * eje_x.paso
+        dy = (v[:, 1, None] - llenas[None, :, 1]) * eje_y.paso
+        cercana = np.argmin(dx * dx + dy * dy, axis=1)
+        salida[v[:, 0], v[:, 1]] = valores_llenas[cercana]
+
+    return salida
+
+
+def _interpolar_eje(grilla: np.ndarray, ocupada: np.ndarray, coords: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Interpola a lo largo del eje 1; devuelve la grilla y qué filas quedaron con datos"""
+    salida = grilla.astype(np.float64)
+    con_datos = ocupada.any(axis=1)
+    for i in np.flatnonzero(con_datos):
+        fila = ocupada[i]
+        if not fila.all():
+            salida[i] = np.interp(coords, coords[fila], salida[i, fila])
+    return salida, con_datos
+
+
+def _rellenar_lineal(grilla: np.ndarray, orden: np.ndarray, eje_x: Eje, eje_y: Eje) -> np.ndarray:
+    por_columna, columnas_llenas = _interpolar_eje(grilla, orden >= 0, eje_y.coords)
+    if columnas_llenas.all():
+        return por_columna
+
+    ocupada = np.broadcast_to(columnas_llenas[:, None], grilla.shape)
+    por_fila, _ = _interpolar_eje(por_columna.T, ocupada.T, eje_x.coords)
+    return por_fila.T
+
+
+def rellenar(grilla: np.ndarray, orden: np.ndarray, eje_x: Eje, eje_y: Eje,
+             modo: str = "cercano", valor_vacio: Any = 0) -> np.ndarray:
+    """
+    Completa las celdas vacías de una grilla de rasterizar()
+
+    Args:
+        grilla, orden: Resultado de rasterizar
+        eje_x, eje_y: Ejes de la grilla
+        modo: "cercano" o "lineal" (ver docstring del módulo)
+        valor_vacio: Valor de todas las celdas si ninguna tiene datos
+
+    Returns:
+        Grilla (nx, ny) sin celdas vacías; "lineal" devuelve float64
+
+    Raises:
+        ValueError: Si el modo no es válido
+    """
+    if modo not in MODOS_RELLENO:
+        raise ValueError(f"Modo de relleno inválido: {modo}. Opciones válidas: {list(MODOS_RELLENO)}")
+
+    if not (orden >= 0).any():
+        return np.full(grilla.shape, valor_vacio)
+    if (orden >= 0).all():
+        return grilla.copy()
+    if modo == "lineal":
+        return _rellenar_lineal(grilla, orden, eje_x, eje_y)
+    return _rellenar_cercano(grilla, orden, eje_x, eje_y)
+
+
+def construir_grilla(x: np.ndarray, y: np.ndarray, valores: np.ndarray,
+                     eje_x: Eje, eje_y: Eje, modo: str = "cercano") -> np.ndarray:
+    """Rasteriza los puntos y completa las celdas vacías (ver rasterizar y rellenar)"""
+    grilla, orden = rasterizar(x, y, valores, eje_x, eje_y)
+    return rellenar(grilla, orden, eje_x, eje_y, modo)
+
+
+def columnas_puntos(puntos: List, valores: Optional[List] = None
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Separa puntos [x, y, z] en columnas (x, y, valor)
+
+    Ignora los puntos con menos de tres componentes. Si se pasan valores,
+    el valor del punto i es valores[i] en lugar de z (y se ignoran los
+    puntos sin valor correspondiente). El valor conserva su tipo (int o float).
+    """
+    usados = [
+        i for i, p in enumerate(puntos)
+        if len(p) >= 3 and (valores is None or i < len(valores))
+    ]
+    x = np.array([puntos[i][0] for i in usados], dtype=np.float64)
+    y = np.array([puntos[i][1] for i in usados], dtype=np.float64)
+    z = np.array([puntos[i][2] if valores is None else valores[i] for i in usados])
+    return x, y, z
+
+
+def celdas_heatmap(grilla: np.ndarray) -> List[List[Any]]:
+    """Celdas [i, j, valor] recorriendo la grilla por filas de x"""
+    nx, ny = grilla.shape
+    valores = grilla.ravel().tolist()
+    return [[k // ny, k % ny, v] for k, v in enumerate(valores)]
+
+
+def _pesos_cubicos(t: np.ndarray) -> np.ndarray:
+    """Pesos de convolución cúbica (Keys, a = -0.5) para los nodos i-1, i, i+1, i+2"""
+    a = -0.5
+    t2, t3 = t * t, t * t * t
+    return np.stack([
+        a * (t3 - 2 * t2 + t),
+        (a + 2) * t3 - (a + 3) * t2 + 1,
+        -(a + 2) * t3 + (2 * a + 3) * t2 - a * t,
+        a * (t2 - t3),
+    ], axis=1)
+
+
+def matriz_pesos(origen: Eje, destino: Eje, metodo: str) -> np.ndarray:
+    """
+    Matriz (destino.n, origen.n) que interpola valores del eje origen en
+    los centros del eje destino; fuera del dominio se repite el borde
+    """
+    n = origen.n
+    pesos = np.zeros((destino.n, n))
+    filas = np.arange(destino.n)
+
+    if metodo == "cercano" or n == 1:
+        pesos[filas, indices_cercanos(destino.coords, origen.coords)] = 1.0
+        return pesos
+
+    posicion = np.clip((destino.coords - origen.minimo) / origen.paso, 0, n - 1)
+    base = np.minimum(np.floor(posicion).astype(np.intp), n - 2)
+    t = posicion - base
+
+    if metodo == "bilineal":
+        pesos[filas, base] = 1 - t
+        pesos[filas, base + 1] += t
+        return pesos
+
+    # Los nodos fantasma fuera del eje se extrapolan linealmente desde el borde
+    # (-1 = 2*g[0] - g[1], n = 2*g[n-1] - g[n-2]), así se conservan las rectas
+    for k, w in enumerate(_pesos_cubicos(t).T):
+        idx = base + k - 1
+        abajo, arriba = idx < 0, idx > n - 1
+        dentro = ~(abajo | arriba)
+        np.add.at(pesos, (filas[dentro], idx[dentro]), w[dentro])
+        for fantasma, borde, vecino in ((abajo, 0, 1), (arriba, n - 1, n - 2)):
+            np.add.at(pesos, (filas[fantasma], borde), 2 * w[fantasma])
+            np.add.at(pesos, (filas[fantasma], vecino), -w[fantasma])
+    return pesos
+
+
+def remuestrear(grilla: np.ndarray, origen_x: Eje, origen_y: Eje,
+                destino_x: Eje, destino_y: Eje, metodo: str = "bilineal") -> np.ndarray:
+    """
+    Lleva una grilla completa (sin celdas vacías) a otros ejes
+
+    Con "cercano" cada celda toma el nodo más cercano, "bilineal" interpola
+    entre los cuatro que la rodean y "bicubico" usa convolución cúbica sobre
+    los dieciséis nodos vecinos.
+
+    Args:
+        grilla: Valores (origen_x.n, origen_y.n)
+        origen_x, origen_y: Ejes de la grilla
+        destino_x, destino_y: Ejes de la grilla resultante
+        metodo: "cercano", "bilineal" o "bicubico"
+
+    Returns:
+        Grilla (destino_x.n, destino_y.n). Si los ejes no cambian se
+        devuelve una copia sin interpolar; el bicúbico se acota al rango
+        de la grilla original para no generar valores nuevos en los bordes.
+
+    Raises:
+        ValueError: Si el método no es válido
+    """
+    _validar_metodo(metodo)
+
+    if (origen_x, origen_y) == (destino_x, destino_y):
+        return grilla.copy()
+
+    return _remuestrear_filas(grilla, matriz_pesos(origen_x, destino_x, metodo),
+                              matriz_pesos(origen_y, destino_y, metodo), metodo)
+
+
+def remuestrear_bloques(grilla: np.ndarray, origen_x: Eje, origen_y: Eje,
+                        destino_x: Eje, destino_y: Eje, metodo: str = "bilineal",
+                        celdas_bloque: int = 1 << 20) -> Iterator[Tuple[slice, np.ndarray]]:
+    """
+    remuestrear() de a bloques de filas (celdas en x) de la grilla destino
+
+    La grilla destino completa en float64 nunca existe: cada bloque tiene a
+    lo sumo celdas_bloque celdas (y al menos una fila), así el que consume
+    puede reducirlo (p.ej. a índices de color en uint8) antes del siguiente.
+
+    Yields:
+        (filas, valores): slice de filas de la grilla destino y sus valores
+        (filas, destino_y.n), iguales a remuestrear(...)[filas]
+
+    Raises:
+        ValueError: Si el método no es válido
+    """
+    _validar_metodo(metodo)
+
+    pesos_x = matriz_pesos(origen_x, destino_x, metodo)
+    pesos_y = matriz_pesos(origen_y, destino_y, metodo)
+    paso = max(1, celdas_bloque // destino_y.n)
+    for inicio in range(0, destino_x.n, paso):
+        filas = slice(inicio, min(inicio + paso, destino_x.n))
+        yield filas, _remuestrear_filas(grilla, pesos_x[filas], pesos_y, metodo)
+
+
+def _validar_metodo(metodo: str) -> None:
+    if metodo not in METODOS_REMUESTREO:
+        raise ValueError(
+            f"Método de remuestreo inválido: {metodo}. Opciones válidas: {list(METODOS_REMUESTREO)}")
+
+
+def _remuestrear_filas(grilla: np.ndarray, pesos_x: np.ndarray, pesos_y: np.ndarray,
+                       metodo: str) -> np.ndarray:
+    valores = np.asarray(grilla, dtype=np.float64)
+    salida = pesos_x @ valores @ pesos_y.T
+
+    if metodo == "cercano":
+        return salida.astype(grilla.dtype)
+    if metodo == "bicubico":
+        np.clip(salida, valores.min(), valores.max(), out=salida)
+    return salida
@@ -0,0 +1,67 @@
+"""
+Cache LRU en memoria, acotado por cantidad de entradas (y opcionalmente
+por bytes) y seguro entre hilos.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class CacheLRU:
+    """
+    Cache de resultados derivados por clave, que descarta los menos usados
+
+    La fábrica se ejecuta fuera del lock: dos requests que piden la misma
+    clave a la vez pueden construirla ambos (se conserva la última), pero
+    un valor costoso no bloquea al resto de las claves.
+
+    Con max_bytes > 0 también se descartan entradas hasta que la suma de
+    tamano(valor) no supere ese límite; un valor más grande que el límite
+    se devuelve sin cachear.
+    """
+
+    def __init__(self, max_entradas: int, max_bytes: int = 0,
+                 tamano: Optional[Callable[[Any], int]] = None):
+        self.max_entradas = max(0, int(max_entradas))
+        self.max_bytes = max(0, int(max_bytes))
+        self._tamano = tamano or (lambda valor: 0)
+        self._entradas: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._tamanos: dict = {}
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: Hashable, fabrica: Callable[[], Any]) -> Any:
+        """Valor de la clave, construido con fabrica() si no está en el cache"""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return self._entradas[clave]
+
+        valor = fabrica()
+        tamano = self._tamano(valor) if self.max_bytes > 0 else 0
+
+        with self._lock:
+            if self.max_entradas > 0 and (self.max_bytes == 0 or tamano <= self.max_bytes):
+                self._descartar(clave)
+                self._entradas[clave] = valor
+                self._tamanos[clave] = tamano
+                self.bytes += tamano
+                while len(self._entradas) > self.max_entradas or (
+                        self.max_bytes > 0 and self.bytes > self.max_bytes):
+                    self._descartar(next(iter(self._entradas)))
+        return valor
+
+    def _descartar(self, clave: Hashable) -> None:
+        if clave in self._entradas:
+            del self._entradas[clave]
+            self.bytes -= self._tamanos.pop(clave)
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._tamanos.clear()
+            self.bytes = 0
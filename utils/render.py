@@ -0,0 +1,205 @@
+"""
+Renderizado de heatmaps y zonas poligonales a PNG y SVG sin dependencias.
+
+Las imágenes se rasterizan con NumPy como índices en una paleta (cada
+píxel es el índice de su color) y se escriben como PNG indexado (tipo de
+color 3) con zlib, así una imagen de pocos colores pesa unos pocos KB.
+
+Convención de ejes: el área crece hacia la derecha y la TV hacia arriba
+(la primera fila de la imagen es la TV máxima), igual que en los gráficos.
+"""
+
+import struct
+import zlib
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from utils.zonas_poligonales import get_zones_by_metric
+
+FORMATOS_RENDER = ("png", "svg")
+
+# Dominio (área, TV) de las zonas de utils.zonas_poligonales
+RANGO_AREA = (0.25, 12.0)
+RANGO_TV = (0.1, 0.9)
+
+COLOR_FONDO = "#FFFFFF"
+
+_FIRMA_PNG = b"\x89PNG\r\n\x1a\n"
+_NIVEL_ZLIB = 6
+
+
+def paleta_rgb(paleta: Sequence[str]) -> np.ndarray:
+    """Colores "#RRGGBB" como arreglo (n, 3) uint8"""
+    return np.array(
+        [[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in paleta], dtype=np.uint8
+    ).reshape(-1, 3)
+
+
+def _chunk_png(tipo: bytes, datos: bytes) -> bytes:
+    return (struct.pack(">I", len(datos)) + tipo + datos
+            + struct.pack(">I", zlib.crc32(tipo + datos) & 0xFFFFFFFF))
+
+
+def escribir_png(indices: np.ndarray, paleta: Sequence[str]) -> bytes:
+    """
+    PNG indexado de 8 bits a partir de un raster de índices de color
+
+    Args:
+        indices: Raster (alto, ancho) con el índice en la paleta de cada píxel
+        paleta: Colores "#RRGGBB" (hasta 256)
+
+    Returns:
+        Bytes del PNG
+
+    Raises:
+        ValueError: Si la paleta está vacía o tiene más de 256 colores
+    """
+    if not 0 < len(paleta) <= 256:
+        raise ValueError(f"La paleta debe tener entre 1 y 256 colores (tiene {len(paleta)})")
+
+    alto, ancho = indices.shape
+    # Cada fila lleva delante el byte de filtro (0 = sin filtro)
+    filas = np.zeros((alto, ancho + 1), dtype=np.uint8)
+    filas[:, 1:] = indices
+
+    return b"".join([
+        _FIRMA_PNG,
+        _chunk_png(b"IHDR", struct.pack(">IIBBBBB", ancho, alto, 8, 3, 0, 0, 0)),
+        _chunk_png(b"PLTE", paleta_rgb(paleta).tobytes()),
+        _chunk_png(b"IDAT", zlib.compress(filas.tobytes(), _NIVEL_ZLIB)),
+        _chunk_png(b"IEND", b""),
+    ])
+
+
+def raster_grilla(grilla: np.ndarray, ancho: int, alto: int) -> np.ndarray:
+    """
+    Escala una grilla (nx sobre el área, ny sobre la TV) a una imagen (alto, ancho)
+
+    Cada píxel toma la celda que lo contiene (vecino más cercano), así las
+    celdas se ven como bloques igual que en el heatmap de ECharts.
+    """
+    nx, ny = grilla.shape
+    columnas = np.arange(ancho) * nx // ancho
+    filas = ny - 1 - np.arange(alto) * ny // alto
+    return grilla[columnas[None, :], filas[:, None]]
+
+
+def _centros_pixeles(ancho: int, alto: int, x_rango: Tuple[float, float],
+                     y_rango: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+    x_min, x_max = x_rango
+    y_min, y_max = y_rango
+    px = x_min + (np.arange(ancho) + 0.5) * (x_max - x_min) / ancho
+    py = y_max - (np.arange(alto) + 0.5) * (y_max - y_min) / alto
+    return px, py
+
+
+def _mascara_poligono(poligono: Sequence[Tuple[float, float]],
+                      px: np.ndarray, py: np.ndarray) -> np.ndarray:
+    """Píxeles (alto, ancho) dentro del polígono, por la regla par-impar"""
+    dentro = np.zeros((py.size, px.size), dtype=bool)
+    vertices = np.asarray(poligono, dtype=np.float64)
+    for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        cruza = (y1 > py) != (y2 > py)
+        if not cruza.any() or y1 == y2:
+            continue
+        x_corte = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        dentro ^= cruza[:, None] & (px[None, :] < x_corte[:, None])
+    return dentro
+
+
+def _paleta_zonas(zonas: List[Dict[str, Any]], fondo: str) -> Tuple[List[str], List[int]]:
+    """Paleta (fondo primero) y el índice de color de cada zona"""
+    paleta = [fondo]
+    indices = []
+    for zona in zonas:
+        if zona["color"] not in paleta:
+            paleta.append(zona["color"])
+        indices.append(paleta.index(zona["color"]))
+    return paleta, indices
+
+
+def raster_zonas(zonas: List[Dict[str, Any]], ancho: int, alto: int,
+                 x_rango: Tuple[float, float] = RANGO_AREA,
+                 y_rango: Tuple[float, float] = RANGO_TV,
+                 fondo: str = COLOR_FONDO) -> Tuple[np.ndarray, List[str]]:
+    """
+    Rasteriza zonas poligonales ({"polygon", "color"}) en orden: las
+    últimas se pintan sobre las anteriores
+
+    Returns:
+        (raster de índices (alto, ancho) uint8, paleta)
+    """
+    paleta, indices_zona = _paleta_zonas(zonas, fondo)
+    px, py = _centros_pixeles(ancho, alto, x_rango, y_rango)
+    raster = np.zeros((alto, ancho), dtype=np.uint8)
+    for zona, indice in zip(zonas, indices_zona):
+        raster[_mascara_poligono(zona["polygon"], px, py)] = indice
+    return raster, paleta
+
+
+def _svg(ancho: int, alto: int, vista: Tuple[float, float], cuerpo: List[str]) -> bytes:
+    cabecera = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{ancho}" height="{alto}" '
+        f'viewBox="0 0 {vista[0]:g} {vista[1]:g}" preserveAspectRatio="none" '
+        f'shape-rendering="crispEdges">'
+    )
+    return "".join([cabecera, *cuerpo, "</svg>"]).encode("utf-8")
+
+
+def svg_grilla(grilla: np.ndarray, paleta: Sequence[str], ancho: int, alto: int) -> bytes:
+    """
+    SVG de una grilla de índices de color (nx sobre el área, ny sobre la TV)
+
+    Se dibuja un rectángulo por tramo horizontal de celdas del mismo color
+    (no uno por celda) en un viewBox de nx x ny unidades.
+    """
+    nx, ny = grilla.shape
+    cuerpo = []
+    for fila in range(ny):
+        valores = grilla[:, ny - 1 - fila]
+        cortes = np.flatnonzero(np.diff(valores)) + 1
+        inicios = np.concatenate(([0], cortes))
+        fines = np.concatenate((cortes, [nx]))
+        for inicio, fin in zip(inicios.tolist(), fines.tolist()):
+            cuerpo.append(
+                f'<rect x="{inicio}" y="{fila}" width="{fin - inicio}" height="1" '
+                f'fill="{paleta[valores[inicio]]}"/>'
+            )
+    return _svg(ancho, alto, (nx, ny), cuerpo)
+
+
+def svg_zonas(zonas: List[Dict[str, Any]], ancho: int, alto: int,
+              x_rango: Tuple[float, float] = RANGO_AREA,
+              y_rango: Tuple[float, float] = RANGO_TV,
+              fondo: str = COLOR_FONDO) -> bytes:
+    """SVG de zonas poligonales, en coordenadas de píxel de una imagen ancho x alto"""
+    x_min, x_max = x_rango
+    y_min, y_max = y_rango
+    cuerpo = [f'<rect width="{ancho}" height="{alto}" fill="{fondo}"/>']
+    for zona in zonas:
+        puntos = " ".join(
+            f"{(x - x_min) / (x_max - x_min) * ancho:.2f},{(y_max - y) / (y_max - y_min) * alto:.2f}"
+            for x, y in zona["polygon"]
+        )
+        cuerpo.append(f'<polygon points="{puntos}" fill="{zona["color"]}"/>')
+    return _svg(ancho, alto, (ancho, alto), cuerpo)
+
+
+def renderizar_zonas(metrica: str, formato: str, ancho: int, alto: int) -> bytes:
+    """
+    Imagen de las zonas poligonales de una métrica (ver utils.zonas_poligonales)
+
+    Raises:
+        ValueError: Si no hay zonas para la métrica o el formato no es válido
+    """
+    if formato not in FORMATOS_RENDER:
+        raise ValueError(f"Formato inválido: {formato}. Opciones válidas: {list(FORMATOS_RENDER)}")
+    zonas = get_zones_by_metric(metrica)
+    if not zonas:
+        raise ValueError(f"No hay zonas definidas para la métrica {metrica}")
+
+    if formato == "svg":
+        return svg_zonas(zonas, ancho, alto)
+    raster, paleta = raster_zonas(zonas, ancho, alto)
+    return escribir_png(raster, paleta)
@@ -0,0 +1,58 @@
+"""
+Utilidades para endpoints que leen el body y responden en streaming.
+"""
+
+from typing import AsyncIterator
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class StreamingBodyResponse(StreamingResponse):
+    """
+    StreamingResponse que permite seguir leyendo el body del request.
+
+    StreamingResponse escucha receive() para detectar desconexiones, lo que
+    consume los mensajes del body que el generador todavía necesita leer.
+    Acá el generador es el único consumidor de receive(); una desconexión
+    se manifiesta como ClientDisconnect al leer el body.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+        if self.background is not None:
+            await self.background()
+
+
+async def iterar_lineas(stream: AsyncIterator[bytes], max_bytes_linea: int) -> AsyncIterator[bytes]:
+    """
+    Divide un stream de bytes en líneas sin acumular el body completo
+
+    Args:
+        stream: Iterador asíncrono de fragmentos (p.ej. request.stream())
+        max_bytes_linea: Tamaño máximo aceptado para una línea
+
+    Yields:
+        Cada línea no vacía, sin el salto de línea final
+
+    Raises:
+        ValueError: Si una línea supera max_bytes_linea
+    """
+    pendiente = b""
+
+    async for fragmento in stream:
+        pendiente += fragmento
+        *lineas, pendiente = pendiente.split(b"\n")
+
+        for linea in lineas:
+            linea = linea.strip()
+            if linea:
+                yield linea
+
+        if len(pendiente) > max_bytes_linea:
+            raise ValueError(f"Línea supera el máximo de {max_bytes_linea} bytes")
+
+    pendiente = pendiente.strip()
+    if pendiente:
+        yield pendiente